@@ -31,6 +31,22 @@ class System(object):
         except OSError:
             sys.exit("The LOCAL_TMP directory does not seem to exist")
 
+    @staticmethod
+    def get_cache_dir():
+        if 'CACHE_DIR' in os.environ:
+            cache_dir = os.environ['CACHE_DIR']
+        elif 'GLOBAL_TMP' in os.environ:
+            cache_dir = os.path.join(os.environ['GLOBAL_TMP'],'cache')
+        else:
+            return None
+
+        if not os.path.exists(cache_dir):
+            try:
+                os.mkdir(cache_dir)
+            except OSError:
+                return None
+        return cache_dir
+
     @classmethod
     def set_log_dir(cls,name):
         if not os.path.exists(os.path.join(os.environ['GLOBAL_TMP'],'log')):
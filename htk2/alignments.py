@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+
+
+class StateAlignments(object):
+    # All segments of a STATE level MLF in one structured array, ordered by utterance. Segments of utterance i are
+    # segments[offsets[i]:offsets[i+1]], state ids index into states.
+    dtype = np.dtype([('utt', np.int32), ('start', np.int64), ('end', np.int64), ('state', np.int32)])
+    block_size = 64 << 20
+
+    def __init__(self):
+        self.utterances = []
+        self.states = []
+        self.state_ids = {}
+        self.segments = np.zeros(0, dtype=self.dtype)
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    @classmethod
+    def read_mlf(cls, mlf_file):
+        alignments = cls()
+        parts = []
+
+        with open(mlf_file, 'rb') as mlf_desc:
+            while True:
+                block = mlf_desc.read(cls.block_size)
+                if len(block) == 0: break
+                block += mlf_desc.readline()
+                if not block.endswith('\n'): block += '\n'
+                parts.append(alignments._parse_block(block))
+
+        if len(parts) > 0:
+            alignments.segments = np.concatenate(parts)
+        alignments.offsets = np.searchsorted(alignments.segments['utt'], np.arange(len(alignments.utterances) + 1)).astype(np.int64)
+        return alignments
+
+    def _parse_block(self, block):
+        buf = np.frombuffer(block, dtype=np.uint8)
+
+        # boundaries of every token and every line in the block
+        space = (buf == ord(' ')) | (buf == ord('\t')) | (buf == ord('\n')) | (buf == ord('\r'))
+        token_start = np.flatnonzero(~space & np.r_[True, space[:-1]])
+        token_end = np.flatnonzero(~space & np.r_[space[1:], True]) + 1
+
+        line_end = np.flatnonzero(buf == ord('\n'))
+        line_start = np.r_[0, line_end[:-1] + 1]
+        first_char = buf[line_start]
+        first_token = np.searchsorted(token_start, line_start)
+        num_tokens = np.searchsorted(token_start, line_end) - first_token
+
+        header = first_char == ord('"')
+        label = (first_char != ord('"')) & (first_char != ord('#')) & (first_char != ord('.')) & (num_tokens >= 3)
+
+        utt = np.cumsum(header) - 1 + len(self.utterances)
+        for i in first_token[header]:
+            name = block[token_start[i]:token_end[i]].strip('"')
+            self.utterances.append(os.path.splitext(os.path.basename(name))[0])
+
+        label &= utt >= 0
+        t = first_token[label]
+        names, inverse = np.unique(_fixed_width(buf, token_start[t + 2], token_end[t + 2]), return_inverse=True)
+        state_map = np.array([self._state_id(n) for n in names], dtype=np.int32)
+
+        segments = np.empty(len(t), dtype=self.dtype)
+        segments['utt'] = utt[label]
+        segments['start'] = _parse_int(buf, token_start[t], token_end[t])
+        segments['end'] = _parse_int(buf, token_start[t + 1], token_end[t + 1])
+        segments['state'] = state_map[inverse] if len(names) > 0 else []
+        return segments
+
+    def _state_id(self, state):
+        if state not in self.state_ids:
+            self.state_ids[state] = len(self.states)
+            self.states.append(state)
+        return self.state_ids[state]
+
+    def utterance(self, i):
+        return self.segments[self.offsets[i]:self.offsets[i+1]]
+
+    def durations(self, frame_period=100000):
+        return (self.segments['end'] - self.segments['start']) // frame_period
+
+    def state_occupancy(self, frame_period=100000):
+        # total number of frames aligned to every state
+        return np.bincount(self.segments['state'], weights=self.durations(frame_period), minlength=len(self.states)).astype(np.int64)
+
+    def duration_histogram(self, frame_period=100000, max_duration=50):
+        # histogram[state, d] is the number of segments of state with a duration of d frames, longer segments are
+        # counted in the last column
+        d = np.minimum(self.durations(frame_period), max_duration)
+        histogram = np.bincount(self.segments['state'].astype(np.int64) * (max_duration + 1) + d,
+                                minlength=len(self.states) * (max_duration + 1))
+        return histogram.reshape(len(self.states), max_duration + 1)
+
+    def save(self, file_name):
+        np.savez(file_name, segments=self.segments, offsets=self.offsets,
+                 utterances=np.array(self.utterances), states=np.array(self.states))
+
+    @classmethod
+    def load(cls, file_name):
+        data = np.load(file_name)
+        alignments = cls()
+        alignments.segments = data['segments']
+        alignments.offsets = data['offsets']
+        alignments.utterances = list(data['utterances'])
+        for state in data['states']:
+            alignments._state_id(state)
+        return alignments
+
+
+def _parse_int(buf, start, end):
+    # parses the unsigned decimal numbers buf[start[i]:end[i]] one digit column at a time
+    values = np.zeros(len(start), dtype=np.int64)
+    width = (end - start).max() if len(start) > 0 else 0
+    for k in xrange(width):
+        pos = start + k
+        active = pos < end
+        digits = buf[np.minimum(pos, len(buf) - 1)].astype(np.int64) - ord('0')
+        values = np.where(active, values * 10 + digits, values)
+    return values
+
+
+def _fixed_width(buf, start, end):
+    # the byte strings buf[start[i]:end[i]] as one fixed width string array
+    width = max((end - start).max() if len(start) > 0 else 0, 1)
+    pos = start[:, np.newaxis] + np.arange(width)
+    chars = np.where(pos < end[:, np.newaxis], buf[np.minimum(pos, len(buf) - 1)], 0).astype(np.uint8)
+    return chars.view('S%d' % width).ravel()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+import json
+from multiprocessing import Pool
+from optparse import OptionParser
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from htk2.external_sort import ExternalSorter
+from htk2.param_header import ParamHeader, parse_kind
+from htk2.units import HTK_dictionary, HTK_transcription, SCPFile
+
+PHONES = ['aa', 'ae', 'ah', 'ao', 'aw', 'ay', 'b', 'ch', 'd', 'dh', 'eh', 'er', 'ey', 'f', 'g', 'hh', 'ih', 'iy', 'jh',
+          'k', 'l', 'm', 'n', 'ng', 'ow', 'oy', 'p', 'r', 's', 'sh', 't', 'th', 'uh', 'uw', 'v', 'w', 'y', 'z', 'zh']
+
+LEVELS = {'word': HTK_transcription.WORD, 'phone': HTK_transcription.PHONE, 'state': HTK_transcription.STATE}
+
+
+def utterance_id(i):
+    return "s%03du%07d" % (i % 997, i)
+
+
+def gen_dictionary(file_name, num_words, seed=0):
+    rand = random.Random(seed)
+    with open(file_name, 'w') as dict_desc:
+        for w in xrange(num_words):
+            for v in xrange(1 if rand.random() < 0.9 else 2):
+                print("W%07d\t%s" % (w, " ".join(rand.choice(PHONES) for _ in xrange(rand.randint(2, 8)))), file=dict_desc)
+
+
+def gen_sentences(num_utterances, num_words, seed=0):
+    rand = random.Random(seed)
+    for i in xrange(num_utterances):
+        yield utterance_id(i), ["W%07d" % rand.randrange(num_words) for _ in xrange(rand.randint(5, 15))]
+
+
+def gen_mlf(file_name, num_utterances, level, num_words, seed=0):
+    rand = random.Random(seed)
+    with open(file_name, 'w') as mlf_desc:
+        print("#!MLF!#", file=mlf_desc)
+        for utt, words in gen_sentences(num_utterances, num_words, seed):
+            print("\"*/%s.lab\"" % utt, file=mlf_desc)
+            if level == 'word':
+                for word in words:
+                    print(word, file=mlf_desc)
+            else:
+                t = 0
+                for word in words:
+                    for p in xrange(rand.randint(2, 8)):
+                        phone = rand.choice(PHONES)
+                        if level == 'phone':
+                            print(phone, file=mlf_desc)
+                        else:
+                            for s in xrange(2, 5):
+                                d = rand.randint(1, 6) * 100000
+                                print("%d %d %s_s%d" % (t, t + d, phone, s), file=mlf_desc)
+                                t += d
+            print(".", file=mlf_desc)
+
+
+def gen_trn(file_name, num_utterances, num_words, seed=0):
+    with open(file_name, 'w') as trn_desc:
+        for utt, words in gen_sentences(num_utterances, num_words, seed):
+            print("%s (%s_%s)" % (" ".join(words), utt[:4], utt[4:]), file=trn_desc)
+
+
+def gen_scp(file_name, num_utterances, features_dir=None, seed=0):
+    # with features_dir, every listed file is created there as a bare header of 100 to 1000 frames, which is all that
+    # BALANCED splitting reads
+    rand = random.Random(seed)
+    kind = parse_kind('MFCC_0_D_A_Z')
+    with open(file_name, 'w') as scp_desc:
+        for i in xrange(num_utterances):
+            utt = utterance_id(i)
+            if features_dir is None:
+                print("/data/features/%s/%s.mfc" % (utt[:4], utt), file=scp_desc)
+                continue
+
+            feature_file = os.path.join(features_dir, utt[:4], utt + '.mfc')
+            if not os.path.exists(os.path.dirname(feature_file)):
+                os.makedirs(os.path.dirname(feature_file))
+            with open(feature_file, 'wb') as feature_desc:
+                feature_desc.write(ParamHeader(rand.randint(100, 1000), 100000, 39 * 4, kind).pack())
+            print(feature_file, file=scp_desc)
+
+
+class Benchmark(object):
+    # Runs in a fresh worker process, so ru_maxrss is the peak of this benchmark only. setup() is not timed.
+    def __init__(self, name, files, size, options, param=None):
+        self.name = name
+        self.param = param
+        self.files = files
+        self.size = size
+        self.options = options
+
+    def setup(self):
+        pass
+
+    def run(self):
+        raise NotImplementedError
+
+    def input_file(self):
+        return None
+
+    def output_file(self):
+        return os.path.join(self.files['dir'], 'out.' + self.name)
+
+    def __call__(self):
+        HTK_dictionary.use_cache = self.options.dict_cache
+        self.setup()
+        base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        start = time.time()
+        items = self.run()
+        seconds = time.time() - start
+
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        data_file = self.input_file() or self.output_file()
+        num_bytes = os.path.getsize(data_file) if data_file is not None and os.path.isfile(data_file) else 0
+
+        for f in os.listdir(self.files['dir']):
+            if f.startswith('out.'):
+                path = os.path.join(self.files['dir'], f)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+
+        return {'benchmark': self.name,
+                'size': self.size,
+                'items': items,
+                'seconds': seconds,
+                'items_per_second': items / seconds if seconds > 0 else None,
+                'bytes': num_bytes,
+                'mb_per_second': num_bytes / seconds / (1 << 20) if seconds > 0 else None,
+                'base_rss_kb': base_rss,
+                'peak_rss_kb': peak_rss}
+
+
+class ReadMLF(Benchmark):
+    def input_file(self):
+        return self.files['mlf_' + self.param]
+
+    def run(self):
+        tr = HTK_transcription(compact=self.options.compact)
+        tr.read_mlf(self.input_file(), LEVELS[self.param])
+        return len(tr.transcriptions[LEVELS[self.param]])
+
+
+class WriteMLF(Benchmark):
+    def setup(self):
+        self.tr = HTK_transcription(compact=self.options.compact)
+        self.tr.read_mlf(self.files['mlf_' + self.param], LEVELS[self.param])
+
+    def run(self):
+        self.tr.write_mlf(self.output_file(), LEVELS[self.param])
+        return len(self.tr.transcriptions[LEVELS[self.param]])
+
+
+class ReadTRN(Benchmark):
+    def input_file(self):
+        return self.files['trn']
+
+    def run(self):
+        tr = HTK_transcription(compact=self.options.compact)
+        tr.read_trn(self.input_file())
+        return len(tr.transcriptions[HTK_transcription.WORD])
+
+
+class WriteTRN(Benchmark):
+    def setup(self):
+        self.tr = HTK_transcription(compact=self.options.compact)
+        self.tr.read_trn(self.files['trn'])
+
+    def run(self):
+        self.tr.write_trn(self.output_file(), 4)
+        return len(self.tr.transcriptions[HTK_transcription.WORD])
+
+
+class ReadDict(Benchmark):
+    def input_file(self):
+        return self.files['dict']
+
+    def run(self):
+        d = HTK_dictionary()
+        d.read_dict(self.input_file())
+        d.word_in_dict('W0000000')
+        return self.files['num_words']
+
+
+class WriteDict(Benchmark):
+    def setup(self):
+        self.d = HTK_dictionary()
+        self.d.read_dict(self.files['dict'])
+
+    def run(self):
+        self.d.write_dict(self.output_file())
+        return self.files['num_words']
+
+
+class WordInDict(Benchmark):
+    def setup(self):
+        self.d = HTK_dictionary()
+        self.d.read_dict(self.files['dict'])
+        self.d.word_in_dict('W0000000')
+        self.words = [line.split()[:-1] for line in open(self.files['trn'])]
+
+    def input_file(self):
+        return self.files['trn']
+
+    def run(self):
+        n = 0
+        for words in self.words:
+            for word in words:
+                self.d.word_in_dict(word)
+                n += 1
+        return n
+
+
+class SplitSCP(Benchmark):
+    def setup(self):
+        # BALANCED caches the frame counts next to the list; this one runs without the cache
+        index_file = self.input_file() + '.nsamples'
+        if os.path.exists(index_file):
+            os.remove(index_file)
+
+    def input_file(self):
+        return self.files['scp']
+
+    def run(self):
+        split_dir = self.output_file()
+        os.mkdir(split_dir)
+        SCPFile(self.input_file()).split(self.options.num_parts, split_dir, 4, SCPFile.modes[self.param])
+        return self.size
+
+
+class SplitSCPCached(SplitSCP):
+    def setup(self):
+        SCPFile(self.input_file()).num_samples()
+
+
+BENCHMARKS = [('mlf_read_' + l, ReadMLF, l) for l in ('word', 'phone', 'state')] + \
+             [('mlf_write_' + l, WriteMLF, l) for l in ('word', 'phone', 'state')] + \
+             [('trn_read', ReadTRN, None), ('trn_write', WriteTRN, None),
+              ('dict_read', ReadDict, None), ('dict_write', WriteDict, None), ('dict_word_in_dict', WordInDict, None),
+              ('scp_split_round_robin', SplitSCP, 'round_robin'), ('scp_split_hashed', SplitSCP, 'hashed'),
+              ('scp_split_balanced', SplitSCP, 'balanced'), ('scp_split_balanced_cached', SplitSCPCached, 'balanced')]
+
+
+def generate_files(dir, size, num_words, levels, feature_headers=False):
+    files = {'dir': dir, 'num_words': num_words}
+
+    files['dict'] = os.path.join(dir, 'dict')
+    gen_dictionary(files['dict'], num_words)
+    for level in levels:
+        files['mlf_' + level] = os.path.join(dir, level + '.mlf')
+        gen_mlf(files['mlf_' + level], size, level, num_words)
+    files['trn'] = os.path.join(dir, 'words.trn')
+    gen_trn(files['trn'], size, num_words)
+    files['scp'] = os.path.join(dir, 'list.scp')
+    gen_scp(files['scp'], size, os.path.join(dir, 'features') if feature_headers else None)
+    return files
+
+
+def run_isolated(benchmark):
+    pool = Pool(1, maxtasksperchild=1)
+    try:
+        return pool.apply(benchmark)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options] result.json"
+    parser = OptionParser(usage=usage)
+    parser.add_option('--sizes', dest='sizes', default='10000,100000',
+                      help='comma separated numbers of utterances, e.g. 10000,100000,1000000,5000000')
+    parser.add_option('--benchmarks', dest='benchmarks', default=None,
+                      help='comma separated subset of: ' + ",".join(n for n, _, _ in BENCHMARKS))
+    parser.add_option('--num-words', dest='num_words', type='int', default=50000)
+    parser.add_option('--num-parts', dest='num_parts', type='int', default=20)
+    parser.add_option('--repeat', dest='repeat', type='int', default=1)
+    parser.add_option('--compact', dest='compact', action='store_true', default=False)
+    parser.add_option('--dict-cache', dest='dict_cache', action='store_true', default=False)
+    parser.add_option('--sort-in-memory', dest='sort_in_memory', type='int', default=None,
+                      help='number of records above which write_trn and SCPFile.split sort externally')
+    parser.add_option('--tmp-dir', dest='tmp_dir', default=None)
+
+    options, args = parser.parse_args()
+
+    if len(args) < 1:
+        sys.exit("Need a result file")
+
+    selected = BENCHMARKS
+    if options.benchmarks is not None:
+        names = options.benchmarks.split(',')
+        unknown = set(names) - set(n for n, _, _ in BENCHMARKS)
+        if len(unknown) > 0:
+            sys.exit("Unknown benchmarks: " + " ".join(sorted(unknown)))
+        selected = [b for b in BENCHMARKS if b[0] in names]
+
+    levels = [l for l in ('word', 'phone', 'state') if any(n.endswith('_' + l) for n, _, _ in selected)]
+
+    if options.sort_in_memory is not None:
+        ExternalSorter.max_in_memory = options.sort_in_memory
+
+    # sorted runs of big lists are spilled to LOCAL_TMP
+    if 'LOCAL_TMP' not in os.environ:
+        os.environ['LOCAL_TMP'] = options.tmp_dir or tempfile.gettempdir()
+
+    results = []
+    for size in [int(s) for s in options.sizes.split(',')]:
+        dir = tempfile.mkdtemp(prefix='benchmark_units.', dir=options.tmp_dir)
+        try:
+            print("Generating data for {0:d} utterances".format(size), file=sys.stderr)
+            files = generate_files(dir, size, options.num_words, levels,
+                                   any(n.startswith('scp_split_balanced') for n, _, _ in selected))
+
+            for name, cls, param in selected:
+                for r in xrange(options.repeat):
+                    result = run_isolated(cls(name, files, size, options, param))
+                    result['repeat'] = r
+                    results.append(result)
+                    print("{0:>25s} {1:>9d} {2:10.2f}s {3:12.0f} items/s {4:10d} kB peak".format(
+                        name, size, result['seconds'], result['items_per_second'] or 0, result['peak_rss_kb']), file=sys.stderr)
+        finally:
+            shutil.rmtree(dir)
+
+    with open(args[0], 'w') as result_desc:
+        json.dump({'revision': git_revision(),
+                   'python': sys.version.split()[0],
+                   'time': time.time(),
+                   'compact': options.compact,
+                   'dict_cache': options.dict_cache,
+                   'sort_in_memory': ExternalSorter.max_in_memory,
+                   'results': results}, result_desc, indent=1)
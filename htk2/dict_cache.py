@@ -0,0 +1,124 @@
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+
+class CompiledDictionary(object):
+    # Binary image of a parsed dictionary file. Layout (after the header): phone names, unescaped words and escaped
+    # words as newline separated blobs, followed by three int32 arrays: the word index of every pronunciation, the
+    # pronunciation offsets into the phone id array and the phone id array itself.
+    version = 1
+    magic = 'HTKDIC%02d' % version
+    header = struct.Struct('<8s7I')
+
+    def __init__(self, phones, words, escaped, pron_words, pron_offsets, pron_phones):
+        self.phones = phones
+        self.words = words
+        self.escaped = escaped
+        self.pron_words = pron_words
+        self.pron_offsets = pron_offsets
+        self.pron_phones = pron_phones
+
+    def pronunciations(self):
+        for i in xrange(len(self.pron_words)):
+            yield self.pron_words[i], tuple(self.pron_phones[self.pron_offsets[i]:self.pron_offsets[i+1]])
+
+    def entries(self):
+        # (word, escaped word, set of phone tuples) for every word
+        prons = [set() for _ in self.words]
+        phones = self.phones
+        for word_id, ids in self.pronunciations():
+            prons[word_id].add(tuple(phones[i] for i in ids))
+        for i, word in enumerate(self.words):
+            yield word, self.escaped[i], prons[i]
+
+    @classmethod
+    def compile(cls, dictionary, escape):
+        words = sorted(dictionary.iterkeys())
+        phone_ids = {}
+        phones = []
+
+        pron_words = array('i')
+        pron_offsets = array('i', [0])
+        pron_phones = array('i')
+
+        for word_id, word in enumerate(words):
+            for transcription in sorted(dictionary[word]):
+                for phone in transcription:
+                    if phone not in phone_ids:
+                        phone_ids[phone] = len(phones)
+                        phones.append(phone)
+                    pron_phones.append(phone_ids[phone])
+                pron_words.append(word_id)
+                pron_offsets.append(len(pron_phones))
+
+        return cls(phones, words, [escape(w) for w in words], pron_words, pron_offsets, pron_phones)
+
+    def save(self, file_name):
+        blobs = ["\n".join(self.phones), "\n".join(self.words), "\n".join(self.escaped)]
+
+        tmp_name = "{0:>s}.{1:d}.tmp".format(file_name, os.getpid())
+        with open(tmp_name, 'wb') as out_desc:
+            out_desc.write(self.header.pack(self.magic, len(self.phones), len(self.words), len(self.pron_words),
+                                            len(self.pron_phones), *[len(b) for b in blobs]))
+            for b in blobs:
+                out_desc.write(b)
+            for a in (self.pron_words, self.pron_offsets, self.pron_phones):
+                out_desc.write(a.tostring())
+        os.rename(tmp_name, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        with open(file_name, 'rb') as in_desc:
+            m = mmap.mmap(in_desc.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, n_phones, n_words, n_prons, n_pron_phones, l_phones, l_words, l_escaped = cls.header.unpack_from(m)
+            if magic != cls.magic:
+                raise ValueError("Not a compiled dictionary: %s" % file_name)
+
+            pos = cls.header.size
+            lists = []
+            for n, l in ((n_phones, l_phones), (n_words, l_words), (n_words, l_escaped)):
+                lists.append(m[pos:pos+l].split("\n") if n > 0 else [])
+                pos += l
+
+            arrays = []
+            for n in (n_prons, n_prons + 1, n_pron_phones):
+                a = array('i')
+                a.fromstring(m[pos:pos+n*a.itemsize])
+                arrays.append(a)
+                pos += n * a.itemsize
+        finally:
+            m.close()
+
+        return cls(*(lists + arrays))
+
+
+def content_hash(file_name):
+    h = hashlib.sha1()
+    h.update(CompiledDictionary.magic + sys.byteorder)
+    with open(file_name, 'rb') as in_desc:
+        for block in iter(lambda: in_desc.read(1 << 20), ''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cached_dictionary(file_name, cache_dir, parse, escape):
+    # Returns the compiled form of file_name, compiling it with parse (file name -> {word: set(phone tuples)}) when
+    # no image for the current file contents exists in cache_dir
+    cache_file = os.path.join(cache_dir, content_hash(file_name) + '.dict')
+    if os.path.exists(cache_file):
+        try:
+            return CompiledDictionary.load(cache_file)
+        except (ValueError, struct.error):
+            pass
+
+    compiled = CompiledDictionary.compile(parse(file_name), escape)
+    try:
+        compiled.save(cache_file)
+    except (IOError, OSError):
+        pass
+    return compiled
@@ -0,0 +1,149 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+from multiprocessing import Pool, cpu_count
+from optparse import OptionParser
+import sys
+import time
+
+import numpy as np
+
+from htk2.param_file import ParamHeader, kind_name, logical_file, num_statics, physical_file, read_scp_entry, \
+    segment, SUPPRESS_ENERGY
+
+ENERGY = 0x40
+C0 = 0x2000
+
+
+def energy_column(kind, vector_size):
+    # the column of the log energy (_E) or, without it, of C0 (_0); HTK stores them last among the statics, C0
+    # before the energy when there are both
+    if kind & ENERGY and not kind & SUPPRESS_ENERGY:
+        return num_statics(kind, vector_size) - 1
+    if kind & C0:
+        return num_statics(kind, vector_size) - (2 if kind & ENERGY else 1)
+    raise ValueError("{0:>s} has neither an energy nor a C0 coefficient".format(kind_name(kind)))
+
+
+def smooth(values, width):
+    # moving average over width frames, centred, with the window shrunk at the edges
+    if width <= 1 or len(values) == 0:
+        return np.asarray(values, dtype=np.float64)
+    sums = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    index = np.arange(len(values))
+    lo = np.maximum(index - width // 2, 0)
+    hi = np.minimum(index - width // 2 + width, len(values))
+    return (sums[hi] - sums[lo]) / (hi - lo)
+
+
+def speech_region(energy, threshold=0.3, smoothing=11, hangover=20):
+    # (first, last) frame, inclusive, of the speech in an utterance, None if nothing rises above the background.
+    # A frame is speech if its smoothed energy lies more than threshold of the way from the background level
+    # (10th percentile) to the speech level (90th percentile); every speech frame keeps hangover frames on either
+    # side so that soft onsets and word endings survive.
+    if len(energy) == 0:
+        return None
+    smoothed = smooth(energy, smoothing)
+    floor, peak = np.percentile(smoothed, [10, 90])
+    if peak <= floor:
+        return None
+
+    speech = np.flatnonzero(smoothed > floor + threshold * (peak - floor))
+    if len(speech) == 0:
+        return None
+    return max(speech[0] - hangover, 0), min(speech[-1] + hangover, len(energy) - 1)
+
+
+class _Endpointer(object):
+    def __init__(self, threshold, smoothing, hangover):
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self.hangover = hangover
+
+    def __call__(self, entries):
+        # (new scp line, frames, frames kept) for every entry
+        results = []
+        for entry in entries:
+            header = ParamHeader.read(physical_file(entry))
+            features = read_scp_entry(entry)
+            region = speech_region(features[:, energy_column(header.parm_kind, header.vector_size)],
+                                   self.threshold, self.smoothing, self.hangover)
+            if region is None or region == (0, len(features) - 1):
+                results.append((entry, len(features), len(features)))
+                continue
+
+            # frames of the original file, also for entries that already were a segment of it
+            offset = segment(entry)[0] if segment(entry) is not None else 0
+            line = "{0:>s}={1:>s}[{2:d},{3:d}]".format(logical_file(entry), physical_file(entry),
+                                                     offset + region[0], offset + region[1])
+            results.append((line, len(features), region[1] - region[0] + 1))
+        return results
+
+
+class EndpointStats(object):
+    def __init__(self):
+        self.files = 0
+        self.trimmed = 0
+        self.frames = 0
+        self.kept = 0
+
+    def add(self, frames, kept):
+        self.files += 1
+        self.frames += frames
+        self.kept += kept
+        if kept < frames:
+            self.trimmed += 1
+
+    @property
+    def removed(self):
+        return self.frames - self.kept
+
+    def __str__(self):
+        return "{0:d} files, {1:d} trimmed, {2:d} of {3:d} frames removed ({4:.1%})".format(
+            self.files, self.trimmed, self.removed, self.frames, float(self.removed) / max(self.frames, 1))
+
+
+def endpoint_scp(scp_file, output_scp, threshold=0.3, smoothing=11, hangover=20, num_processes=None, chunk_size=32):
+    # Writes output_scp with every utterance of scp_file restricted to its speech region, as a
+    # 'logical=physical[start,end]' line that HDecode, HVite and HERest read without copying any features.
+    # Utterances in which no speech is found are kept whole. output_scp may be scp_file.
+    entries = [line.strip() for line in open(scp_file) if len(line.strip()) > 0]
+    chunks = [entries[i:i + chunk_size] for i in xrange(0, len(entries), chunk_size)]
+
+    stats = EndpointStats()
+    lines = []
+    pool = Pool(num_processes if num_processes is not None else cpu_count())
+    try:
+        for results in pool.imap(_Endpointer(threshold, smoothing, hangover), chunks):
+            for line, frames, kept in results:
+                lines.append(line)
+                stats.add(frames, kept)
+    finally:
+        pool.close()
+        pool.join()
+
+    with open(output_scp, 'w') as scp_desc:
+        for line in lines:
+            print(line, file=scp_desc)
+    return stats
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options] list.scp endpointed.scp"
+    parser = OptionParser(usage=usage)
+    parser.add_option('-t', '--threshold', dest='threshold', type='float', default=0.3,
+                      help='fraction of the way from the background to the speech energy that counts as speech')
+    parser.add_option('-s', '--smoothing', dest='smoothing', type='int', default=11, help='frames averaged')
+    parser.add_option('--hangover', dest='hangover', type='int', default=20,
+                      help='frames kept before the first and after the last speech frame')
+    parser.add_option('-p', dest='processes', type='int', default=None)
+
+    options, args = parser.parse_args()
+
+    if len(args) != 2:
+        parser.print_usage(file=sys.stderr)
+        sys.exit(1)
+
+    start = time.time()
+    stats = endpoint_scp(args[0], args[1], options.threshold, options.smoothing, options.hangover, options.processes)
+    print("{0!s}, {1:.1f}s".format(stats, time.time() - start), file=sys.stderr)
@@ -0,0 +1,82 @@
+from __future__ import print_function
+
+import heapq
+import os
+import shutil
+from tempfile import mkdtemp
+
+from gridscripts.remote_run import System
+
+
+class ExternalSorter(object):
+    # Sorts records (strings without newlines) in memory up to max_in_memory records. Bigger inputs are cut into sorted
+    # runs in a local temp dir that are merged with a heap, at most max_runs runs at a time.
+    max_in_memory = 1000000
+    max_runs = 128
+
+    def __init__(self, max_in_memory=None, tmp_dir=None):
+        self.max_in_memory = max_in_memory if max_in_memory is not None else ExternalSorter.max_in_memory
+        self.tmp_dir = tmp_dir
+        self._run_dir = None
+        self._num_runs = 0
+
+    def sort(self, records):
+        runs = []
+        chunk = []
+        try:
+            for record in records:
+                chunk.append(record)
+                if len(chunk) > self.max_in_memory:
+                    chunk.sort()
+                    runs.append(self._write_run(chunk))
+                    chunk = []
+
+                    if len(runs) >= self.max_runs:
+                        runs = [self._write_run(self._merge(runs))]
+
+            chunk.sort()
+            if len(runs) == 0:
+                for record in chunk:
+                    yield record
+                return
+
+            runs.append(self._write_run(chunk))
+            chunk = None
+
+            for record in self._merge(runs):
+                yield record
+        finally:
+            if self._run_dir is not None:
+                shutil.rmtree(self._run_dir)
+                self._run_dir = None
+
+    def _write_run(self, records):
+        if self._run_dir is None:
+            if self.tmp_dir is None:
+                self._run_dir = System.get_local_temp_dir()
+            else:
+                self._run_dir = mkdtemp(dir=self.tmp_dir)
+
+        run_file = os.path.join(self._run_dir, 'run.%d' % self._num_runs)
+        self._num_runs += 1
+        with open(run_file, 'w') as run_desc:
+            for record in records:
+                print(record, file=run_desc)
+        return run_file
+
+    def _merge(self, runs):
+        for record in heapq.merge(*[_read_run(run_file) for run_file in runs]):
+            yield record
+
+
+def _read_run(run_file):
+    try:
+        with open(run_file) as run_desc:
+            for line in run_desc:
+                yield line[:-1]
+    finally:
+        os.remove(run_file)
+
+
+def sorted_records(records, max_in_memory=None, tmp_dir=None):
+    return ExternalSorter(max_in_memory, tmp_dir).sort(records)
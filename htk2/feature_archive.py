@@ -0,0 +1,216 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+from itertools import izip
+from multiprocessing import Pool, cpu_count
+from optparse import OptionParser
+import os
+import sys
+import time
+
+import numpy as np
+
+from htk2.feature_store import quantisation_error
+from htk2.param_file import COMPRESSED, ParamFile, logical_file, physical_file, read_scp_entry, segment, \
+    write_compressed, write_param_file
+from htk2.speaker_norm import speaker_groups
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _stored_frames(param, entry):
+    # the frames of an scp entry as stored in its file: int16 values for compressed files
+    frames = segment(entry)
+    return param.data[frames[0]:frames[1] + 1] if frames is not None else param.data
+
+
+def _pack(args):
+    # one archive of all utterances of a speaker; returns the new scp line of every packed entry
+    archive_file, entries = args
+    params = []
+    header = None
+    for entry in entries:
+        param = ParamFile(physical_file(entry))
+        if header is None:
+            header = param.header
+        elif (param.header.parm_kind, param.header.samp_period, param.header.vector_size) != \
+                (header.parm_kind, header.samp_period, header.vector_size):
+            raise ArchiveError("{0:>s} is not of the same kind as {1:>s}".format(entry, entries[0]))
+        params.append(param)
+
+    # Compressed utterances are copied as they are when they share their A and B vectors. Otherwise one archive can
+    # not hold them compressed, and it stores the decoded frames uncompressed, the values HTK reads from the
+    # original files, instead of compressing them again.
+    copy_compressed = header is not None and header.compressed and \
+        all(np.array_equal(p.scale, params[0].scale) and np.array_equal(p.offset, params[0].offset) for p in params)
+
+    blocks = []
+    lines = {}
+    start = 0
+    for entry, param in izip(entries, params):
+        features = _stored_frames(param, entry) if copy_compressed else read_scp_entry(entry)
+        # HTK segments can not be empty, such entries keep pointing to their own file
+        if len(features) == 0:
+            lines[entry] = entry.strip()
+            continue
+
+        blocks.append(features)
+        lines[entry] = "{0:>s}={1:>s}[{2:d},{3:d}]".format(logical_file(entry), archive_file, start, start + len(features) - 1)
+        start += len(features)
+
+    if len(blocks) > 0:
+        if copy_compressed:
+            write_compressed(archive_file, params[0].scale, params[0].offset, np.vstack(blocks), header.samp_period,
+                             header.parm_kind)
+        else:
+            write_param_file(archive_file, np.vstack(blocks), header.samp_period, header.parm_kind & ~COMPRESSED)
+    return lines
+
+
+def _unpacked_file(output_dir, entry):
+    return os.path.join(output_dir, os.path.basename(logical_file(entry)))
+
+
+def _unpack(args):
+    output_dir, entries = args
+    lines = {}
+    for entry in entries:
+        if segment(entry) is None:
+            lines[entry] = entry.strip()
+            continue
+        param = ParamFile(physical_file(entry))
+        output_file = _unpacked_file(output_dir, entry)
+        if param.header.compressed:
+            write_compressed(output_file, param.scale, param.offset, _stored_frames(param, entry),
+                             param.header.samp_period, param.header.parm_kind)
+        else:
+            write_param_file(output_file, read_scp_entry(entry), param.header.samp_period, param.header.parm_kind)
+        lines[entry] = output_file
+    return lines
+
+
+def _compare(args):
+    # largest relative difference between the utterances of two lists, None if the frame counts differ
+    errors = []
+    for original, packed in args:
+        a, b = read_scp_entry(original), read_scp_entry(packed)
+        errors.append((original, quantisation_error(a, b) if a.shape == b.shape else None))
+    return errors
+
+
+def _entries(scp_file):
+    return [line.strip() for line in open(scp_file) if len(line.strip()) > 0]
+
+
+def _run(function, jobs, num_processes):
+    pool = Pool(num_processes if num_processes is not None else cpu_count())
+    try:
+        return pool.map(function, jobs, 1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def pack(scp_file, output_dir, output_scp, num_speaker_chars, num_processes=None):
+    # Concatenates the utterances of every speaker into output_dir/<speaker>.<ext> and writes output_scp, in the
+    # order of scp_file, with 'logical=archive[start,end]' lines, so that HTK reads every utterance as a frame range
+    # of its archive. Logical names are the original names, so transcriptions and speaker masks keep matching.
+    entries = _entries(scp_file)
+    extension = os.path.splitext(physical_file(entries[0]))[1] if len(entries) > 0 else '.mfc'
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    jobs = [(os.path.join(os.path.abspath(output_dir), speaker + extension), group)
+            for speaker, group in sorted(speaker_groups(entries, num_speaker_chars).iteritems())]
+
+    lines = {}
+    for packed in _run(_pack, jobs, num_processes):
+        lines.update(packed)
+
+    with open(output_scp, 'w') as scp_desc:
+        for entry in entries:
+            print(lines[entry], file=scp_desc)
+    return len(jobs)
+
+
+def unpack(scp_file, output_dir, output_scp, num_processes=None):
+    # the opposite of pack: every segment becomes output_dir/<basename of its logical name> again; compressed
+    # archives are unpacked without decoding, so the files get the values and A and B vectors of the archive
+    entries = _entries(scp_file)
+
+    archives = {}
+    output_files = {}
+    for entry in entries:
+        if segment(entry) is not None:
+            output_file = _unpacked_file(output_dir, entry)
+            if output_file in output_files:
+                raise ArchiveError("{0:>s} and {1:>s} would both be unpacked to {2:>s}".format(
+                    output_files[output_file], entry, output_file))
+            output_files[output_file] = entry
+        archives.setdefault(physical_file(entry), []).append(entry)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    lines = {}
+    for unpacked in _run(_unpack, [(output_dir, group) for _, group in sorted(archives.iteritems())], num_processes):
+        lines.update(unpacked)
+
+    with open(output_scp, 'w') as scp_desc:
+        for entry in entries:
+            print(lines[entry], file=scp_desc)
+
+
+def verify(original_scp, packed_scp, max_error=0.0, num_processes=None, chunk_size=64):
+    # utterances of packed_scp that are missing, have a different number of frames, or differ by more than
+    # max_error (relative to the range of a column) from those of original_scp
+    packed = dict((os.path.splitext(os.path.basename(logical_file(e)))[0], e) for e in _entries(packed_scp))
+
+    failed = []
+    pairs = []
+    for entry in _entries(original_scp):
+        id = os.path.splitext(os.path.basename(logical_file(entry)))[0]
+        if id not in packed:
+            failed.append((entry, None))
+        else:
+            pairs.append((entry, packed[id]))
+
+    chunks = [pairs[i:i + chunk_size] for i in xrange(0, len(pairs), chunk_size)]
+    for errors in _run(_compare, chunks, num_processes):
+        failed.extend((entry, error) for entry, error in errors if error is None or error > max_error)
+    return failed
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options] pack list.scp archive_dir packed.scp\n" \
+            "       %prog [options] unpack packed.scp output_dir unpacked.scp\n" \
+            "       %prog [options] verify list.scp packed.scp"
+    parser = OptionParser(usage=usage)
+    parser.add_option('-n', '--num-speaker-chars', dest='num_speaker_chars', type='int', default=3)
+    parser.add_option('--max-error', dest='max_error', type='float', default=0.0,
+                      help='largest difference accepted by verify, relative to the range of a column')
+    parser.add_option('-p', dest='processes', type='int', default=None)
+
+    options, args = parser.parse_args()
+
+    if len(args) < 3 or args[0] not in ('pack', 'unpack', 'verify') or len(args) != (3 if args[0] == 'verify' else 4):
+        parser.print_usage(file=sys.stderr)
+        sys.exit(1)
+
+    start = time.time()
+    if args[0] == 'pack':
+        num_archives = pack(args[1], args[2], args[3], options.num_speaker_chars, options.processes)
+        print("{0:d} utterances in {1:d} archives, {2:.1f}s".format(len(_entries(args[1])), num_archives,
+                                                                    time.time() - start), file=sys.stderr)
+    elif args[0] == 'unpack':
+        unpack(args[1], args[2], args[3], options.processes)
+    else:
+        failed = verify(args[1], args[2], options.max_error, options.processes)
+        for entry, error in failed:
+            print("{0:>s} {1:>s}".format(entry, "missing or different length" if error is None else "error {0:e}".format(error)))
+        print("{0:d} utterances differ, {1:.1f}s".format(len(failed), time.time() - start), file=sys.stderr)
+        if len(failed) > 0:
+            sys.exit(1)
@@ -0,0 +1,150 @@
+from __future__ import print_function
+
+import math
+from multiprocessing import Pool, cpu_count
+import os
+import re
+
+import numpy as np
+
+from htk2.param_file import ParamHeader, num_derivatives, parse_kind, physical_file, read_scp_entry, static_kind, COMPRESSED, CRC, ZERO_MEAN
+
+
+class FeatureStats(object):
+    # Frame count, mean and sum of squared deviations from the mean. Two FeatureStats merge exactly (Chan et al.), so
+    # statistics can be gathered per file or per worker and combined in any order without losing precision.
+    def __init__(self, dim):
+        self.n = 0
+        self.mean = np.zeros(dim)
+        self.m2 = np.zeros(dim)
+
+    def add(self, frames):
+        if len(frames) == 0:
+            return
+        other = FeatureStats(frames.shape[1])
+        other.n = len(frames)
+        other.mean = frames.mean(axis=0, dtype=np.float64)
+        other.m2 = ((frames - other.mean) ** 2).sum(axis=0)
+        self.merge(other)
+
+    def merge(self, other):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (float(other.n) / n)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (float(self.n) * other.n / n)
+        self.n = n
+
+    @property
+    def variance(self):
+        return self.m2 / self.n
+
+
+def _file_stats(args):
+    files, target_kind = args
+    stats = None
+    for file in files:
+        frames = read_scp_entry(file, target_kind)
+        if stats is None:
+            stats = FeatureStats(frames.shape[1])
+        stats.add(frames)
+    return stats
+
+
+def scp_stats(files, num_processes=None, chunk_size=64, target_kind=None):
+    # statistics over all frames of all files, gathered in chunks of files in a process pool
+    chunks = [(files[i:i + chunk_size], target_kind) for i in xrange(0, len(files), chunk_size)]
+    pool = Pool(num_processes)
+    try:
+        total = None
+        for stats in pool.imap_unordered(_file_stats, chunks):
+            if total is None:
+                total = stats
+            else:
+                total.merge(stats)
+        return total
+    finally:
+        pool.close()
+        pool.join()
+
+
+def format_vector(v):
+    return " " + " ".join("{0:e}".format(x) for x in v)
+
+
+class NativeHCompV(object):
+    # Does what 'HCompV -m -f min_variance -M dir proto' does for a single stream, diagonal covariance prototype:
+    # every state of the prototype gets the global mean and variance of the training data, and dir/vFloors gets
+    # min_variance times the global variance as varFloor1. Only usable if the stored features are of the prototype's
+    # kind (apart from compression and checksums) or are its statics, from which the derivatives are computed on load,
+    # and if the configs do not make HTK normalise the features (speaker CMN/CVN), which the native path does not do.
+    normalising_settings = ('CMEANDIR', 'VARSCALEDIR', 'CMEANMASK', 'VARSCALEMASK', 'VARSCALEFN')
+
+    def __init__(self, htk_config, scp_file, proto_file, min_variance=None):
+        self.scp_file = scp_file
+        self.proto_file = proto_file
+        self.min_variance = min_variance if min_variance is not None else htk_config.min_variance
+        self.files = [f.strip() for f in open(scp_file) if len(f.strip()) > 0]
+        self.speaker_normalisation = htk_config.speaker_normalisation
+        self.config_files = htk_config.turn_to_config('-C', htk_config.config_file)[1::2]
+
+    def proto_kind(self):
+        m = re.search(r'<VecSize>\s+(\d+)\s+<([A-Za-z0-9_]+)>', open(self.proto_file).read(), re.IGNORECASE)
+        return int(m.group(1)), parse_kind(m.group(2))
+
+    def normalised(self):
+        if self.speaker_normalisation:
+            return True
+        for config_file in self.config_files:
+            for line in open(config_file):
+                m = re.match(r'^\s*(?:[A-Za-z]+\s*:\s*)?([A-Za-z]+)\s*=', line)
+                if m is not None and m.group(1).upper() in self.normalising_settings:
+                    return True
+        return False
+
+    def applicable(self):
+        if len(self.files) == 0 or self.normalised():
+            return False
+        vec_size, kind = self.proto_kind()
+        header = ParamHeader.read(physical_file(self.files[0]))
+        stored = header.parm_kind & ~(COMPRESSED | CRC)
+        if stored == kind:
+            return header.vector_size == vec_size
+
+        try:
+            return static_kind(kind) & ~ZERO_MEAN == stored & ~ZERO_MEAN and \
+                   header.vector_size * (1 + num_derivatives(kind)) == vec_size
+        except ValueError:
+            return False
+
+    def run(self, num_processes=None):
+        stats = scp_stats(self.files, num_processes if num_processes is not None else cpu_count(),
+                          target_kind=self.proto_kind()[1])
+        variance = stats.variance
+
+        lines = open(self.proto_file).read().split('\n')
+        gconst = len(variance) * math.log(2 * math.pi) + np.log(variance).sum()
+
+        with open(self.proto_file, 'w') as proto_desc:
+            replace = None
+            for line in lines:
+                if replace is not None:
+                    print(format_vector(replace), file=proto_desc)
+                    if replace is variance:
+                        print("<GConst> {0:e}".format(gconst), file=proto_desc)
+                    replace = None
+                    continue
+
+                print(line, file=proto_desc)
+                if re.match(r'\s*<Mean>', line, re.IGNORECASE):
+                    replace = stats.mean
+                elif re.match(r'\s*<Variance>', line, re.IGNORECASE):
+                    replace = variance
+
+        with open(os.path.join(os.path.dirname(self.proto_file), 'vFloors'), 'w') as vfloors_desc:
+            print("~v varFloor1", file=vfloors_desc)
+            print("<Variance> {0:d}".format(len(variance)), file=vfloors_desc)
+            print(format_vector(variance * self.min_variance), file=vfloors_desc)
+
+        return stats
@@ -0,0 +1,252 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+from multiprocessing import Pool, cpu_count
+from optparse import OptionParser
+import os
+import re
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from htk2.param_file import ParamFile, convert_features, kind_name, num_derivatives, num_statics, parse_kind, \
+    physical_file, replace_physical, static_kind, write_param_file, COMPRESSED, SUPPRESS_ENERGY
+
+
+def quantisation_error(original, decoded):
+    # largest error of a column relative to its range (or to its magnitude if it is constant)
+    if len(original) == 0:
+        return 0.0
+    original = np.asarray(original, dtype=np.float64)
+    span = original.max(axis=0) - original.min(axis=0)
+    span = np.where(span > 0, span, np.abs(original).max(axis=0))
+    span[span == 0] = 1.0
+    return float((np.abs(decoded - original).max(axis=0) / span).max())
+
+
+class _Converter(object):
+    def __init__(self, input_root, output_root, max_error):
+        self.input_root = input_root
+        self.output_root = output_root
+        self.max_error = max_error
+
+    def output_file(self, file):
+        return os.path.join(self.output_root, os.path.relpath(file, self.input_root))
+
+    def __call__(self, file):
+        output_file = self.output_file(file)
+        if not os.path.exists(os.path.dirname(output_file)):
+            try:
+                os.makedirs(os.path.dirname(output_file))
+            except OSError:
+                pass
+
+        param = ParamFile(file)
+        if not self.applicable(param.header):
+            shutil.copyfile(file, output_file)
+            return file, 0.0, False
+
+        error = self.convert(param, output_file)
+
+        # too far from the original: keep the file as it was
+        if error > self.max_error:
+            shutil.copyfile(file, output_file)
+            return file, error, False
+        return file, error, True
+
+
+class _Compressor(_Converter):
+    def applicable(self, header):
+        return not header.compressed and not header.waveform
+
+    def convert(self, param, output_file):
+        features = np.array(param.features())
+        write_param_file(output_file, features, param.header.samp_period, param.header.parm_kind | COMPRESSED)
+        return quantisation_error(features, ParamFile(output_file).features())
+
+
+class _Stripper(_Converter):
+    def applicable(self, header):
+        return not header.waveform and num_derivatives(header.parm_kind) > 0 and not header.parm_kind & SUPPRESS_ENERGY
+
+    def convert(self, param, output_file):
+        # the error is that of the derivatives HTK will compute on load against the stored ones
+        kind = param.header.parm_kind
+        features = np.array(param.features())
+        statics = features[:, :num_statics(kind, param.header.vector_size)]
+        write_param_file(output_file, statics, param.header.samp_period, static_kind(kind))
+
+        stored = ParamFile(output_file)
+        return quantisation_error(features, convert_features(stored.features(), stored.header.parm_kind, kind))
+
+
+class FeatureStoreConverter(object):
+    # Rewrites the feature files of scp lists under output_root, keeping their paths relative to input_root, with
+    # the files converted in a process pool. A file whose error after conversion, relative to the range of a column,
+    # exceeds max_error is copied unchanged. HTK reads either form, so only the scp lists and the TARGETKIND change.
+    converter = None
+    max_error = 1e-4
+
+    def __init__(self, scp_files, output_root, input_root=None, max_error=None):
+        self.scp_files = scp_files
+        self.output_root = output_root
+        self.max_error = max_error if max_error is not None else self.max_error
+
+        self.files = sorted(set(physical_file(line) for scp in scp_files for line in open(scp) if len(line.strip()) > 0))
+        if input_root is None:
+            input_root = os.path.dirname(os.path.commonprefix(self.files) + 'x')
+        self.input_root = input_root
+        self._converter = self.converter(self.input_root, self.output_root, self.max_error)
+
+        self.errors = {}
+        self.rejected = []
+
+    def run(self, num_processes=None):
+        pool = Pool(num_processes if num_processes is not None else cpu_count())
+        try:
+            for file, error, converted in pool.imap_unordered(self._converter, self.files, 16):
+                self.errors[file] = error
+                if not converted and error > 0:
+                    self.rejected.append(file)
+        finally:
+            pool.close()
+            pool.join()
+
+        return self.rejected
+
+    def output_file(self, file):
+        return self._converter.output_file(file)
+
+    def write_scp(self, scp_file, output_scp):
+        with open(output_scp, 'w') as scp_desc:
+            for line in open(scp_file):
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                print(replace_physical(line, self.output_file(physical_file(line))), file=scp_desc)
+
+    def target_kind(self):
+        # what the tools should see: the kind stored before the conversion, without _C
+        return ParamFile(self.files[0]).header.parm_kind & ~COMPRESSED
+
+    def write_config(self, output_config, config_file=None):
+        # the given config with its TARGETKIND without _C, or with the target kind if it has none
+        lines = [] if config_file is None else [l.rstrip('\n') for l in open(config_file)]
+        target = re.compile(r'^\s*TARGETKIND\s*=\s*(\S+)', re.IGNORECASE)
+
+        with open(output_config, 'w') as config_desc:
+            found = False
+            for line in lines:
+                m = target.match(line)
+                if m is not None:
+                    found = True
+                    line = "TARGETKIND = " + m.group(1).upper().replace('_C', '')
+                print(line, file=config_desc)
+            if not found:
+                print("TARGETKIND = " + kind_name(self.target_kind()), file=config_desc)
+
+    def bytes(self, files):
+        return sum(os.path.getsize(f) for f in files)
+
+
+class FeatureStoreCompressor(FeatureStoreConverter):
+    # Stores the features as HTK _C files: 16 bit values with a per column scale and offset. The error is the
+    # quantisation error. HTK decompresses _C files on load.
+    converter = _Compressor
+
+
+class FeatureStoreStripper(FeatureStoreConverter):
+    # Stores only the static coefficients of features with _D, _A or _T. The error is that of the derivatives
+    # computed from the stored statics (as HTK does with the default DELTAWINDOW and ACCWINDOW of 2) against the
+    # original ones. With a TARGETKIND that has the derivatives HTK computes them on load.
+    converter = _Stripper
+    max_error = 1e-3
+
+
+def split_target_kind(hcopy_config, output_hcopy_config, output_config):
+    # HCopy config that stores the statics of its TARGETKIND, and a config that makes the tools compute the rest
+    target = re.compile(r'^\s*TARGETKIND\s*=\s*(\S+)', re.IGNORECASE)
+    windows = re.compile(r'^\s*(DELTAWINDOW|ACCWINDOW)\s*=', re.IGNORECASE)
+
+    target_kind = None
+    with open(output_hcopy_config, 'w') as hcopy_desc:
+        for line in open(hcopy_config):
+            line = line.rstrip('\n')
+            m = target.match(line)
+            if m is not None:
+                target_kind = parse_kind(m.group(1))
+                line = "TARGETKIND = " + kind_name(static_kind(target_kind))
+            print(line, file=hcopy_desc)
+
+    if target_kind is None:
+        raise ValueError("{0:>s} has no TARGETKIND".format(hcopy_config))
+
+    with open(output_config, 'w') as config_desc:
+        print("TARGETKIND = " + kind_name(target_kind & ~COMPRESSED), file=config_desc)
+        for line in open(hcopy_config):
+            if windows.match(line):
+                print(line.strip(), file=config_desc)
+
+    return target_kind
+
+
+def _config_name(line):
+    # 'HPARM: TARGETKIND = MFCC_0' -> 'TARGETKIND', None for lines without a setting
+    m = re.match(r'^\s*(?:[A-Za-z]+\s*:\s*)?([A-Za-z]+)\s*=', line)
+    return m.group(1).upper() if m is not None else None
+
+
+def apply_train_config(config_file, train_config, output_config):
+    # config_file with every setting of train_config (as written by split_target_kind) in place of its own, so the
+    # training tools compute the derivatives that the stored features lack
+    train_lines = [line.strip() for line in open(train_config) if _config_name(line) is not None]
+    train_names = set(_config_name(line) for line in train_lines)
+
+    with open(output_config, 'w') as config_desc:
+        for line in open(config_file):
+            if _config_name(line) not in train_names:
+                print(line.rstrip('\n'), file=config_desc)
+        for line in train_lines:
+            print(line, file=config_desc)
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options] output_root list1.scp [list2.scp ...]"
+    parser = OptionParser(usage=usage)
+    parser.add_option('--input-root', dest='input_root', default=None,
+                      help='directory the paths below output_root are relative to (default: common prefix)')
+    parser.add_option('--statics', dest='statics', action='store_true', default=False,
+                      help='store only the static coefficients instead of compressing')
+    parser.add_option('--max-error', dest='max_error', type='float', default=None,
+                      help='largest error accepted, relative to the range of a column')
+    parser.add_option('-C', '--config', dest='config', default=None, help='HTK config to add the TARGETKIND to')
+    parser.add_option('-p', dest='processes', type='int', default=None)
+
+    options, args = parser.parse_args()
+
+    if len(args) < 2:
+        parser.print_usage(file=sys.stderr)
+        sys.exit(1)
+
+    output_root = args[0]
+    converter_class = FeatureStoreStripper if options.statics else FeatureStoreCompressor
+    converter = converter_class(args[1:], output_root, options.input_root, options.max_error)
+
+    start = time.time()
+    rejected = converter.run(options.processes)
+    seconds = time.time() - start
+
+    for scp in args[1:]:
+        converter.write_scp(scp, os.path.join(output_root, os.path.basename(scp)))
+    converter.write_config(os.path.join(output_root, 'config'), options.config)
+
+    for file in rejected:
+        print("{0:>s} kept unchanged, error {1:e}".format(file, converter.errors[file]), file=sys.stderr)
+
+    input_bytes = converter.bytes(converter.files)
+    output_bytes = converter.bytes(converter.output_file(f) for f in converter.files)
+    print("{0:d} files in {1:.1f}s, {2:d} -> {3:d} bytes ({4:.1%}), largest error {5:e}".format(
+        len(converter.files), seconds, input_bytes, output_bytes, float(output_bytes) / max(input_bytes, 1),
+        max(converter.errors.values() or [0.0])), file=sys.stderr)
@@ -30,11 +30,10 @@ PROTO = """~o <VecSize> 39 <MFCC_0_D_A_Z>
 MKMONO = """EX"""
 #IS sil sil"""
 
-TRANSP3 = """<TRANSP> 3
- 0.000000e+00 5.000000e-01 5.000000e-01
- 0.000000e+00 5.000000e-01 5.000000e-01
- 0.000000e+00 0.000000e+00 0.000000e+00
-<ENDHMM>"""
+# transitions of the sp model: its one emitting state can be skipped
+TRANSP3 = [[0.0, 0.5, 0.5],
+           [0.0, 0.5, 0.5],
+           [0.0, 0.0, 0.0]]
 
 SIL_HED = """AT 2 4 0.2 {sil.transP}
 AT 4 2 0.2 {sil.transP}
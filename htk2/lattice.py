@@ -0,0 +1,258 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+import glob
+import gzip
+from multiprocessing import Pool, cpu_count
+from optparse import OptionParser
+import math
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+# long field names of HTK Standard Lattice Format and their abbreviations
+FIELDS = {'NODES': 'N', 'LINKS': 'L', 'WORD': 'W', 'START': 'S', 'END': 'E', 'time': 't', 'var': 'v', 'div': 'd',
+          'acoustic': 'a', 'language': 'l', 'ngram': 'n'}
+NULL_WORD = '!NULL'
+
+_field = re.compile(r'([A-Za-z]+)=("(?:[^"\\]|\\.)*"|\S+)')
+_escape = re.compile(r'\\([0-7]{3}|.)')
+
+
+class LatticeError(Exception):
+    pass
+
+
+def unescape(word):
+    # HTK quotes words with spaces and escapes other characters as \c or as octal \ddd (e.g. \344 for an
+    # iso-8859-1 a umlaut); the result is the word as bytes
+    if len(word) > 1 and word[0] == word[-1] == '"':
+        word = word[1:-1]
+    if '\\' not in word:
+        return word
+    return _escape.sub(lambda m: chr(int(m.group(1), 8)) if len(m.group(1)) == 3 else m.group(1), word)
+
+
+class Lattice(object):
+    # An SLF lattice as arrays: one entry per node (word index, -1 for null nodes) and one per arc (start node,
+    # end node, word index, acoustic and language model log likelihood). Words on arcs take precedence over those
+    # of their end nodes, so both placements of the words give the same arc_word.
+    def __init__(self):
+        self.header = {}
+        self.words = []
+        self.node_word = None
+        self.arc_start = None
+        self.arc_end = None
+        self.arc_word = None
+        self.acoustic = None
+        self.language = None
+
+    @classmethod
+    def read(cls, file_name):
+        lattice = cls()
+        word_index = {}
+        node_words = {}
+        arcs = []
+
+        def index(word):
+            word = unescape(word)
+            if word == NULL_WORD:
+                return -1
+            if word not in word_index:
+                word_index[word] = len(lattice.words)
+                lattice.words.append(word)
+            return word_index[word]
+
+        open_function = gzip.open if file_name.endswith('.gz') else open
+        with open_function(file_name) as lattice_desc:
+            for line in lattice_desc:
+                if line.startswith('#'):
+                    continue
+                fields = dict((FIELDS.get(k, k), v) for k, v in _field.findall(line))
+                if 'I' in fields:
+                    if 'W' in fields:
+                        node_words[int(fields['I'])] = index(fields['W'])
+                elif 'J' in fields:
+                    arcs.append((int(fields['S']), int(fields['E']), index(fields['W']) if 'W' in fields else -2,
+                                 float(fields.get('a', 0.0)), float(fields.get('l', 0.0))))
+                else:
+                    lattice.header.update(fields)
+
+        if 'N' not in lattice.header or 'L' not in lattice.header:
+            raise LatticeError("{0:>s} has no N= and L= line".format(file_name))
+        num_nodes = int(lattice.header['N'])
+        if len(arcs) != int(lattice.header['L']):
+            raise LatticeError("{0:>s} has {1:d} of {2:d} arcs".format(file_name, len(arcs), int(lattice.header['L'])))
+
+        lattice.node_word = np.empty(num_nodes, dtype=np.int32)
+        lattice.node_word.fill(-1)
+        for node, word in node_words.iteritems():
+            lattice.node_word[node] = word
+
+        arcs = np.array(arcs, dtype=np.float64).reshape(-1, 5)
+        lattice.arc_start = arcs[:, 0].astype(np.int32)
+        lattice.arc_end = arcs[:, 1].astype(np.int32)
+        lattice.arc_word = arcs[:, 2].astype(np.int32)
+        lattice.arc_word = np.where(lattice.arc_word == -2, lattice.node_word[lattice.arc_end], lattice.arc_word)
+        lattice.acoustic = arcs[:, 3]
+        lattice.language = arcs[:, 4]
+
+        # scores in another log base than e
+        base = float(lattice.header.get('base', math.e))
+        if base > 0 and base != math.e:
+            lattice.acoustic *= math.log(base)
+            lattice.language *= math.log(base)
+        return lattice
+
+    @property
+    def num_nodes(self):
+        return len(self.node_word)
+
+    def levels(self):
+        # longest distance of every node from a node without predecessors, found one level at a time; all arcs
+        # into a node come from lower levels
+        n = self.num_nodes
+        in_degree = np.bincount(self.arc_end, minlength=n)
+        order = np.argsort(self.arc_start, kind='mergesort')
+        first = np.searchsorted(self.arc_start[order], np.arange(n + 1))
+
+        level = np.zeros(n, dtype=np.int32)
+        frontier = np.flatnonzero(in_degree == 0)
+        done = len(frontier)
+        depth = 0
+        while len(frontier) > 0:
+            depth += 1
+            counts = first[frontier + 1] - first[frontier]
+            if counts.sum() == 0:
+                break
+            # positions of all arcs leaving the frontier
+            offsets = np.repeat(first[frontier] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            ends = self.arc_end[order[offsets]]
+            in_degree -= np.bincount(ends, minlength=n)
+            frontier = np.unique(ends[in_degree[ends] == 0])
+            level[frontier] = depth
+            done += len(frontier)
+
+        if done != n:
+            raise LatticeError("Lattice has a cycle")
+        return level
+
+    def best_path(self, lm_scale=None, word_penalty=None):
+        # words of the path with the highest acscale * a + lm_scale * l + word_penalty per word, the lattice's
+        # lmscale and wdpenalty unless given; arcs are relaxed in batches, one level of end nodes at a time
+        if lm_scale is None:
+            lm_scale = float(self.header.get('lmscale', 1.0))
+        if word_penalty is None:
+            word_penalty = float(self.header.get('wdpenalty', 0.0))
+
+        n = self.num_nodes
+        if len(self.arc_start) == 0:
+            return []
+        ac_scale = float(self.header.get('acscale', 1.0))
+        weights = ac_scale * self.acoustic + lm_scale * self.language + word_penalty * (self.arc_word >= 0)
+
+        level = self.levels()
+        score = np.empty(n)
+        score.fill(-np.inf)
+        if 'start' in self.header:
+            score[int(self.header['start'])] = 0.0
+        else:
+            score[np.bincount(self.arc_end, minlength=n) == 0] = 0.0
+        back = np.empty(n, dtype=np.int64)
+        back.fill(-1)
+
+        order = np.argsort(level[self.arc_end], kind='mergesort')
+        bounds = np.flatnonzero(np.diff(level[self.arc_end][order])) + 1
+        for arcs in np.split(order, bounds):
+            ends = self.arc_end[arcs]
+            candidates = score[self.arc_start[arcs]] + weights[arcs]
+            np.maximum.at(score, ends, candidates)
+            winners = arcs[candidates == score[ends]]
+            back[self.arc_end[winners]] = winners
+
+        if 'end' in self.header:
+            node = int(self.header['end'])
+        else:
+            final = np.flatnonzero(np.bincount(self.arc_start, minlength=n) == 0)
+            node = final[np.argmax(score[final])]
+        if np.isinf(score[node]):
+            raise LatticeError("No path through the lattice")
+
+        words = []
+        while back[node] >= 0:
+            arc = back[node]
+            if self.arc_word[arc] >= 0:
+                words.append(self.words[self.arc_word[arc]])
+            node = self.arc_start[arc]
+        words.reverse()
+        return words
+
+
+def lattice_name(file_name):
+    name = os.path.basename(file_name)
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return os.path.splitext(name)[0]
+
+
+class _Decoder(object):
+    def __init__(self, lm_scale, word_penalty):
+        self.lm_scale = lm_scale
+        self.word_penalty = word_penalty
+
+    def __call__(self, file_name):
+        try:
+            return file_name, Lattice.read(file_name).best_path(self.lm_scale, self.word_penalty), None
+        except (IOError, ValueError, LatticeError) as e:
+            return file_name, None, str(e)
+
+
+def decode_dir(lat_dir, out_mlf, lm_scale=None, word_penalty=None, num_processes=None):
+    # best path of every lattice in lat_dir, written to out_mlf as '"*/<name>.rec"' entries in name order;
+    # returns the lattices that could not be decoded, with the reason
+    files = sorted(glob.glob(os.path.join(lat_dir, '*.lat.gz')) + glob.glob(os.path.join(lat_dir, '*.lat')))
+
+    failed = []
+    pool = Pool(num_processes if num_processes is not None else cpu_count())
+    try:
+        with open(out_mlf, 'w') as mlf_desc:
+            print("#!MLF!#", file=mlf_desc)
+            for file_name, words, error in pool.imap(_Decoder(lm_scale, word_penalty), files, 8):
+                if error is not None:
+                    failed.append((file_name, error))
+                    continue
+                print('"*/{0:>s}.rec"'.format(lattice_name(file_name)), file=mlf_desc)
+                for word in words:
+                    print(word, file=mlf_desc)
+                print(".", file=mlf_desc)
+    finally:
+        pool.close()
+        pool.join()
+    return failed
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options] lattice_dir out.mlf"
+    parser = OptionParser(usage=usage)
+    parser.add_option('-s', '--lm-scale', dest='lm_scale', type='float', default=None,
+                      help='language model scale (default: lmscale of the lattices)')
+    parser.add_option('-w', '--word-penalty', dest='word_penalty', type='float', default=None,
+                      help='word insertion penalty (default: wdpenalty of the lattices)')
+    parser.add_option('-p', dest='processes', type='int', default=None)
+
+    options, args = parser.parse_args()
+
+    if len(args) != 2:
+        parser.print_usage(file=sys.stderr)
+        sys.exit(1)
+
+    start = time.time()
+    failed = decode_dir(args[0], args[1], options.lm_scale, options.word_penalty, options.processes)
+    for file_name, error in failed:
+        print("{0:>s} FAILED {1:>s}".format(file_name, error), file=sys.stderr)
+    print("{0:d} failed, {1:.1f}s".format(len(failed), time.time() - start), file=sys.stderr)
+    if len(failed) > 0:
+        sys.exit(1)
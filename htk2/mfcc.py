@@ -0,0 +1,312 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+import math
+from multiprocessing import Pool, cpu_count
+from optparse import OptionParser
+import os
+import random
+import shutil
+from subprocess import Popen
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from htk2.feature_store import quantisation_error
+from htk2.param_file import BASE_KINDS, ParamFile, convert_features, kind_name, parse_kind, read_features, \
+    static_kind, write_param_file, COMPRESSED, CRC, ZERO_MEAN
+
+ENERGY = 0x40
+C0 = 0x2000
+
+
+def read_config(file_name):
+    # HTK config as a dict of upper case keys, without module prefixes ('HPARM: NUMCEPS' -> 'NUMCEPS')
+    config = {}
+    for line in open(file_name):
+        line = line.split('#', 1)[0].strip()
+        if '=' not in line:
+            continue
+        key, value = [s.strip() for s in line.split('=', 1)]
+        config[key.split(':')[-1].strip().upper()] = value.strip('"\'')
+    return config
+
+
+def _bool(value):
+    return value.upper() in ('T', 'TRUE')
+
+
+class MFCCExtractor(object):
+    # HCopy's MFCC and FBANK analysis (HSigP/HParm of HTK 3.4) on whole utterances at once: frames are cut with
+    # strides, windowed as a matrix and the filterbank, DCT and liftering are matrix products. Derivatives and _Z
+    # are added by param_file.convert_features. Supported keys: TARGETKIND, TARGETRATE, SOURCERATE, SOURCEFORMAT,
+    # WINDOWSIZE, NUMCHANS, NUMCEPS, CEPLIFTER, PREEMCOEF, USEHAMMING, USEPOWER, ZMEANSOURCE, LOFREQ, HIFREQ,
+    # RAWENERGY, ENORMALISE, ESCALE, SILFLOOR, DELTAWINDOW, ACCWINDOW and BYTEORDER.
+    def __init__(self, config):
+        self.target_kind = parse_kind(config.get('TARGETKIND', 'MFCC_0_D_A_Z'))
+        base = BASE_KINDS[self.target_kind & 0x3f]
+        if base not in ('MFCC', 'FBANK'):
+            raise ValueError("Only MFCC and FBANK features can be computed, not {0:>s}".format(base))
+        self.static_kind = static_kind(self.target_kind) & ~(COMPRESSED | CRC | ZERO_MEAN)
+
+        self.target_rate = float(config.get('TARGETRATE', 100000.0))
+        self.source_rate = float(config.get('SOURCERATE', 625.0))
+        self.source_format = config.get('SOURCEFORMAT', 'WAV').upper()
+        self.window_size = float(config.get('WINDOWSIZE', 256000.0))
+        self.num_chans = int(config.get('NUMCHANS', 20))
+        self.num_ceps = int(config.get('NUMCEPS', 12))
+        self.cep_lifter = int(config.get('CEPLIFTER', 22))
+        self.preem_coef = float(config.get('PREEMCOEF', 0.97))
+        self.use_hamming = _bool(config.get('USEHAMMING', 'T'))
+        self.use_power = _bool(config.get('USEPOWER', 'F'))
+        self.zmean_source = _bool(config.get('ZMEANSOURCE', 'F'))
+        self.lo_freq = float(config.get('LOFREQ', -1.0))
+        self.hi_freq = float(config.get('HIFREQ', -1.0))
+        self.raw_energy = _bool(config.get('RAWENERGY', 'T'))
+        self.enormalise = _bool(config.get('ENORMALISE', 'T'))
+        self.escale = float(config.get('ESCALE', 0.1))
+        self.sil_floor = float(config.get('SILFLOOR', 50.0))
+        self.delta_window = int(config.get('DELTAWINDOW', 2))
+        self.acc_window = int(config.get('ACCWINDOW', 2))
+        self.byte_order = config.get('BYTEORDER', 'VAX').upper()
+
+        self._analysis = {}
+
+    def read_waveform(self, file_name):
+        # samples as float64 and the sample period in 100ns units
+        if self.source_format == 'WAV':
+            wav = wave.open(file_name, 'rb')
+            try:
+                if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+                    raise ValueError("{0:>s}: only 16 bit mono wav files are supported".format(file_name))
+                data = np.fromstring(wav.readframes(wav.getnframes()), dtype='<i2')
+                return data.astype(np.float64), 1.0e7 / wav.getframerate()
+            finally:
+                wav.close()
+        elif self.source_format == 'HTK':
+            param = ParamFile(file_name)
+            return param.features().astype(np.float64), float(param.header.samp_period)
+        elif self.source_format == 'NOHEAD':
+            dtype = '<i2' if self.byte_order == 'VAX' else '>i2'
+            return np.fromfile(file_name, dtype=dtype).astype(np.float64), self.source_rate
+        raise ValueError("Unsupported SOURCEFORMAT {0:>s}".format(self.source_format))
+
+    def _mel(self, k, fres):
+        return 1127.0 * np.log(1.0 + (k - 1) * fres)
+
+    def analysis(self, source_rate):
+        # frame size and shift, window, filterbank and DCT for a sample period, as HTK's InitFBank sets them up
+        if source_rate in self._analysis:
+            return self._analysis[source_rate]
+
+        frame_size = int(self.window_size / source_rate)
+        frame_rate = int(self.target_rate / source_rate)
+        fft_n = 2
+        while fft_n < frame_size:
+            fft_n *= 2
+        n_by_2 = fft_n // 2
+        fres = 1.0e7 / (source_rate * fft_n * 700.0)
+
+        klo, khi = 2, n_by_2
+        mlo, mhi = 0.0, self._mel(n_by_2 + 1, fres)
+        if self.lo_freq >= 0.0:
+            mlo = 1127.0 * math.log(1 + self.lo_freq / 700.0)
+            klo = int((self.lo_freq * source_rate * 1.0e-7 * fft_n) + 2.5)
+            klo = max(klo, 2)
+        if self.hi_freq >= 0.0:
+            mhi = 1127.0 * math.log(1 + self.hi_freq / 700.0)
+            khi = int((self.hi_freq * source_rate * 1.0e-7 * fft_n) + 0.5)
+            khi = min(khi, n_by_2)
+
+        # centre frequencies cf[1..num_chans], with cf[num_chans + 1] = mhi
+        max_chan = self.num_chans + 1
+        cf = np.zeros(max_chan + 1)
+        cf[1:max_chan + 1] = np.arange(1, max_chan + 1) / float(max_chan) * (mhi - mlo) + mlo
+
+        weights = np.zeros((n_by_2, self.num_chans))
+        for k in xrange(klo, khi + 1):
+            melk = self._mel(k, fres)
+            chan = 1
+            while chan <= max_chan and cf[chan] < melk:
+                chan += 1
+            chan -= 1
+            if chan > 0:
+                lo_wt = (cf[chan + 1] - melk) / (cf[chan + 1] - cf[chan])
+            else:
+                lo_wt = (cf[1] - melk) / (cf[1] - mlo)
+            # spectrum bin k (1 based, k = 1 is DC) adds lo_wt to channel chan and the rest to chan + 1
+            if chan > 0:
+                weights[k - 1, chan - 1] += lo_wt
+            if chan < self.num_chans:
+                weights[k - 1, chan] += 1.0 - lo_wt
+
+        window = np.ones(frame_size)
+        if self.use_hamming:
+            window = 0.54 - 0.46 * np.cos(2 * math.pi * np.arange(frame_size) / (frame_size - 1))
+
+        # c_j = sqrt(2 / num_chans) * sum_k fbank_k * cos(pi * j / num_chans * (k - 0.5)), liftered
+        k = np.arange(1, self.num_chans + 1) - 0.5
+        j = np.arange(1, self.num_ceps + 1)
+        dct = math.sqrt(2.0 / self.num_chans) * np.cos(math.pi / self.num_chans * np.outer(k, j))
+        if self.cep_lifter > 0:
+            dct *= 1.0 + self.cep_lifter / 2.0 * np.sin(math.pi * j / self.cep_lifter)
+
+        self._analysis[source_rate] = (frame_size, frame_rate, fft_n, window, weights, dct)
+        return self._analysis[source_rate]
+
+    def frames(self, samples, frame_size, frame_rate):
+        num_frames = (len(samples) - frame_size) // frame_rate + 1 if len(samples) >= frame_size else 0
+        index = np.arange(frame_size)[None, :] + frame_rate * np.arange(num_frames)[:, None]
+        return samples[index]
+
+    def statics(self, samples, source_rate):
+        frame_size, frame_rate, fft_n, window, weights, dct = self.analysis(source_rate)
+        frames = self.frames(samples, frame_size, frame_rate)
+        if self.zmean_source:
+            frames = frames - frames.mean(axis=1)[:, None]
+
+        energy = None
+        if self.target_kind & ENERGY and self.raw_energy:
+            energy = (frames * frames).sum(axis=1)
+
+        if self.preem_coef > 0.0:
+            emphasised = frames.copy()
+            emphasised[:, 1:] -= self.preem_coef * frames[:, :-1]
+            emphasised[:, 0] *= 1.0 - self.preem_coef
+            frames = emphasised
+        frames = frames * window
+
+        if self.target_kind & ENERGY and not self.raw_energy:
+            energy = (frames * frames).sum(axis=1)
+
+        spectrum = np.abs(np.fft.rfft(frames, fft_n)[:, :fft_n // 2])
+        if self.use_power:
+            spectrum = spectrum * spectrum
+        fbank = np.log(np.maximum(np.dot(spectrum, weights), 1.0))
+
+        if BASE_KINDS[self.target_kind & 0x3f] == 'FBANK':
+            columns = [fbank]
+        else:
+            columns = [np.dot(fbank, dct)]
+            if self.target_kind & C0:
+                columns.append(fbank.sum(axis=1)[:, None] * math.sqrt(2.0 / self.num_chans))
+
+        if energy is not None:
+            energy = np.log(np.maximum(energy, 1.0e-5))
+            if self.enormalise and len(energy) > 0:
+                max_energy = energy.max()
+                energy = np.maximum(energy, max_energy - self.sil_floor * math.log(10.0) / 10.0)
+                energy = 1.0 - (max_energy - energy) * self.escale
+            columns.append(energy[:, None])
+
+        return np.hstack(columns) if len(frames) > 0 else np.zeros((0, sum(c.shape[1] for c in columns)))
+
+    def features(self, file_name):
+        samples, source_rate = self.read_waveform(file_name)
+        statics = self.statics(samples, source_rate)
+        return convert_features(statics, self.static_kind, self.target_kind & ~(COMPRESSED | CRC),
+                                self.delta_window, self.acc_window)
+
+    def extract(self, input_file, output_file):
+        features = self.features(input_file)
+        write_param_file(output_file, features, int(self.target_rate), self.target_kind)
+        return len(features)
+
+
+class _Extract(object):
+    def __init__(self, config):
+        self.config = config
+
+    def __call__(self, pairs):
+        extractor = MFCCExtractor(self.config)
+        num_frames = 0
+        for input_file, output_file in pairs:
+            if not os.path.exists(os.path.dirname(output_file) or '.'):
+                try:
+                    os.makedirs(os.path.dirname(output_file))
+                except OSError:
+                    pass
+            num_frames += extractor.extract(input_file, output_file)
+        return len(pairs), num_frames
+
+
+def read_pairs(scp_file):
+    # 'input output' lines, as HCopy -S takes them
+    return [tuple(line.split(None, 1)) for line in (l.strip() for l in open(scp_file)) if len(line) > 0]
+
+
+def extract_scp(config_file, pairs, num_processes=None, chunk_size=32):
+    # computes the features of (input, output) pairs in a process pool; returns files, frames and seconds
+    num_processes = num_processes if num_processes is not None else cpu_count()
+    chunks = [pairs[i:i + chunk_size] for i in xrange(0, len(pairs), chunk_size)]
+
+    start = time.time()
+    pool = Pool(num_processes)
+    try:
+        num_files = num_frames = 0
+        for files, frames in pool.imap_unordered(_Extract(read_config(config_file)), chunks):
+            num_files += files
+            num_frames += frames
+    finally:
+        pool.close()
+        pool.join()
+    return num_files, num_frames, time.time() - start
+
+
+def compare_with_hcopy(config_file, pairs, tmp_dir=None):
+    # largest error (relative to the range of a column) between these features and HCopy's for every input file
+    extractor = MFCCExtractor(read_config(config_file))
+    dir = tempfile.mkdtemp(dir=tmp_dir)
+    try:
+        errors = []
+        for i, (input_file, _) in enumerate(pairs):
+            hcopy_file = os.path.join(dir, '{0:d}.htk'.format(i))
+            Popen(['HCopy', '-C', config_file, input_file, hcopy_file]).wait()
+            if not os.path.exists(hcopy_file):
+                errors.append((input_file, None))
+                continue
+            ours, theirs = extractor.features(input_file), read_features(hcopy_file)
+            errors.append((input_file, quantisation_error(theirs, ours) if ours.shape == theirs.shape else None))
+        return errors
+    finally:
+        shutil.rmtree(dir)
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options] -C config.hcopy [-S wav2mfc.scp | input output]"
+    parser = OptionParser(usage=usage)
+    parser.add_option('-C', dest='config', default='config.hcopy')
+    parser.add_option('-S', dest='scp', default=None)
+    parser.add_option('-p', dest='processes', type='int', default=None)
+    parser.add_option('--compare', dest='compare', type='int', default=0,
+                      help='compare this many randomly chosen files with the output of HCopy')
+    parser.add_option('--tolerance', dest='tolerance', type='float', default=1e-3,
+                      help='largest relative difference to HCopy accepted by --compare')
+
+    options, args = parser.parse_args()
+
+    if options.scp is not None:
+        pairs = read_pairs(options.scp)
+    elif len(args) == 2:
+        pairs = [(args[0], args[1])]
+    else:
+        parser.print_usage(file=sys.stderr)
+        sys.exit(1)
+
+    num_processes = options.processes if options.processes is not None else cpu_count()
+    num_files, num_frames, seconds = extract_scp(options.config, pairs, num_processes)
+    print("{0:d} files, {1:d} frames of {2:>s} in {3:.1f}s: {4:.1f} files/s per core".format(
+        num_files, num_frames, kind_name(MFCCExtractor(read_config(options.config)).target_kind), seconds,
+        num_files / seconds / num_processes if seconds > 0 else 0), file=sys.stderr)
+
+    if options.compare > 0:
+        failed = 0
+        for input_file, error in compare_with_hcopy(options.config, random.sample(pairs, min(options.compare, len(pairs)))):
+            if error is None or error > options.tolerance:
+                failed += 1
+            print("{0:>s} {1:>s}".format(input_file, "no HCopy output or other length" if error is None else "{0:e}".format(error)))
+        if failed > 0:
+            sys.exit("{0:d} files differ from HCopy".format(failed))
@@ -0,0 +1,448 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+import copy
+from optparse import OptionParser
+import re
+import struct
+import sys
+
+import numpy as np
+
+
+class MMFError(Exception): pass
+
+
+class MacroRef(object):
+    # a use of a shared macro, e.g. ~s "silst" inside an HMM
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+
+    def __repr__(self):
+        return "~{0:>s} \"{1:>s}\"".format(self.kind, self.name)
+
+
+class MixPdf(object):
+    def __init__(self, mean, variance, gconst=None, rclass=None):
+        self.mean = mean            # np.array or MacroRef('u', ...)
+        self.variance = variance    # np.array or MacroRef('v', ...)
+        self.gconst = gconst
+        self.rclass = rclass
+
+
+class Mixture(object):
+    def __init__(self, weight, pdf):
+        self.weight = weight
+        self.pdf = pdf              # MixPdf or MacroRef('m', ...)
+
+
+class State(object):
+    def __init__(self, mixtures, num_mixes=None):
+        self.mixtures = mixtures
+        self.num_mixes = num_mixes  # None if the state was written as a single pdf without <NUMMIXES>/<MIXTURE>
+
+
+class TransP(object):
+    def __init__(self, matrix):
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+
+
+class HMM(object):
+    def __init__(self, num_states, states, transp, options=None):
+        self.num_states = num_states
+        self.states = states        # emitting state number -> State or MacroRef('s', ...)
+        self.transp = transp        # TransP or MacroRef('t', ...)
+        self.options = options if options is not None else []
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+
+class MMF(object):
+    # The macros of one or more MMF files, in definition order. ~o options are kept as their tokens, macros of kinds
+    # that are not modelled here are kept as raw text and written back unchanged.
+    kinds = 'hsmuvt'
+
+    def __init__(self):
+        self.options = []
+        self.macros = dict((kind, {}) for kind in self.kinds)
+        self.order = []
+        self.raw = []
+
+    @property
+    def hmms(self):
+        return self.macros['h']
+
+    def add(self, kind, name, obj):
+        if name not in self.macros[kind]:
+            self.order.append((kind, name))
+        self.macros[kind][name] = obj
+
+    def add_hmm(self, name, hmm):
+        self.add('h', name, hmm)
+
+    def resolve(self, obj):
+        while isinstance(obj, MacroRef):
+            obj = self.macros[obj.kind][obj.name]
+        return obj
+
+    @classmethod
+    def read(cls, *file_names):
+        # text and binary (HERest/HHEd -B) files are told apart by the null bytes every binary MMF contains
+        mmf = cls()
+        for file_name in file_names:
+            with open(file_name, 'rb') as file_desc:
+                text = file_desc.read()
+            if '\0' in text:
+                _BinaryParser(text, mmf).parse()
+            else:
+                _Parser(text, mmf).parse()
+        return mmf
+
+    def write(self, file_name):
+        with open(file_name, 'w') as file_desc:
+            _Writer(file_desc).write(self)
+
+
+_token = re.compile(r'<[^>]*>|~[A-Za-z]|"(?:[^"\\]|\\.)*"|[^\s<>"~]+')
+
+
+def _find(text, c, start):
+    i = text.find(c, start)
+    return i if i >= 0 else len(text)
+
+
+class _Parser(object):
+    binary = False
+
+    def __init__(self, text, mmf):
+        self.text = text
+        self.mmf = mmf
+        self._tokens = _token.finditer(text)
+        self._next = next(self._tokens, None)
+
+    def peek(self):
+        if self._next is None:
+            return None
+        t = self._next.group(0)
+        return t.upper() if t.startswith('<') else t
+
+    def position(self):
+        return self._next.start() if self._next is not None else len(self.text)
+
+    def next(self):
+        if self._next is None:
+            raise MMFError("Unexpected end of MMF")
+        t = self._next.group(0)
+        self._next = next(self._tokens, None)
+        return t.upper() if t.startswith('<') else t
+
+    def expect(self, keyword):
+        t = self.next()
+        if t != keyword:
+            raise MMFError("Expected {0:>s}, got {1:>s}".format(keyword, t))
+
+    def name(self):
+        t = self.next()
+        return t[1:-1] if t.startswith('"') else t
+
+    def option(self):
+        return [self.next()]
+
+    def int_value(self):
+        return int(self.next())
+
+    def float_value(self):
+        return float(self.next())
+
+    def vector(self, n):
+        # the numbers run up to the next keyword or macro, parse them in one go and restart the tokenizer behind them
+        start = self.position()
+        end = min(_find(self.text, '<', start), _find(self.text, '~', start))
+        values = np.fromstring(self.text[start:end], sep=' ')
+        if len(values) != n:
+            raise MMFError("Expected {0:d} values, got {1:d}".format(n, len(values)))
+        self._tokens = _token.finditer(self.text, end)
+        self._next = next(self._tokens, None)
+        return values
+
+    def ref_or(self, kind, parse):
+        if self.peek() == '~' + kind:
+            self.next()
+            return MacroRef(kind, self.name())
+        return parse()
+
+    def parse(self):
+        while self.peek() is not None:
+            start = self.position()
+            t = self.next()
+            if not t.startswith('~'):
+                raise MMFError("Expected a macro, got {0:>s}".format(t))
+            kind = t[1].lower()
+
+            if kind == 'o':
+                while self.peek() is not None and not self.peek().startswith('~'):
+                    self.mmf.options.extend(self.option())
+            elif kind in MMF.kinds:
+                name = self.name()
+                parse = {'h': self.hmm, 's': self.state, 'm': self.mixpdf, 'u': self.mean, 'v': self.variance,
+                         't': self.transp}[kind]
+                self.mmf.add(kind, name, parse())
+            else:
+                # macros which are not modelled are kept as text up to the next macro
+                if self.binary:
+                    raise MMFError("Macros of type ~{0:>s} are not supported in binary MMFs".format(kind))
+                while self.peek() is not None and not self.peek().startswith('~'):
+                    self.next()
+                self.mmf.order.append(('raw', len(self.mmf.raw)))
+                self.mmf.raw.append(self.text[start:self.position()].strip())
+
+    def hmm(self):
+        self.expect('<BEGINHMM>')
+        options = []
+        while self.peek() != '<NUMSTATES>':
+            options.extend(self.option())
+        self.next()
+        num_states = self.int_value()
+
+        states = {}
+        while self.peek() == '<STATE>':
+            self.next()
+            i = self.int_value()
+            states[i] = self.ref_or('s', self.state)
+
+        transp = self.ref_or('t', self.transp)
+        self.expect('<ENDHMM>')
+        return HMM(num_states, states, transp, options)
+
+    def state(self):
+        num_mixes = None
+        if self.peek() == '<NUMMIXES>':
+            self.next()
+            num_mixes = self.int_value()
+
+        if self.peek() != '<MIXTURE>':
+            return State([Mixture(1.0, self.ref_or('m', self.mixpdf))], num_mixes)
+
+        mixtures = []
+        while self.peek() == '<MIXTURE>':
+            self.next()
+            self.int_value()
+            weight = self.float_value()
+            mixtures.append(Mixture(weight, self.ref_or('m', self.mixpdf)))
+        return State(mixtures, num_mixes if num_mixes is not None else len(mixtures))
+
+    def mixpdf(self):
+        rclass = None
+        if self.peek() == '<RCLASS>':
+            self.next()
+            rclass = self.int_value()
+
+        mean = self.ref_or('u', self.mean)
+        variance = self.ref_or('v', self.variance)
+
+        gconst = None
+        if self.peek() == '<GCONST>':
+            self.next()
+            gconst = self.float_value()
+        return MixPdf(mean, variance, gconst, rclass)
+
+    def mean(self):
+        self.expect('<MEAN>')
+        return self.vector(self.int_value())
+
+    def variance(self):
+        t = self.next()
+        if t != '<VARIANCE>':
+            raise MMFError("Only diagonal covariances are supported, got {0:>s}".format(t))
+        return self.vector(self.int_value())
+
+    def transp(self):
+        self.expect('<TRANSP>')
+        n = self.int_value()
+        return TransP(self.vector(n * n).reshape(n, n))
+
+
+# Keyword symbols of binary MMFs. HTK writes a keyword as ':' followed by one byte, the keyword's position in the Symbol
+# enum of HModel.h (HTK 3.4), which is what this table assumes. The table holds the keywords of text MMFs for those
+# positions (the enum's own names differ for the durations: NDUR is <NULLD>, PDUR <POISSOND>, GDUR <GAMMAD> and
+# GENDUR <GEND>). Counts and indices follow as big-endian int16, weights, gconsts and vector elements as big-endian
+# float32; macro types and names stay text.
+BINARY_SYMBOLS = ['BEGINHMM', 'USEHMM', 'ENDHMM', 'NUMMIXES', 'NUMSTATES', 'STREAMINFO', 'VECSIZE', 'NULLD',
+                  'POISSOND', 'GAMMAD', 'RELD', 'GEND', 'DIAGC', 'FULLC', 'XFORMC', 'STATE', 'TMIX', 'MIXTURE',
+                  'STREAM', 'SWEIGHTS', 'MEAN', 'VARIANCE', 'INVCOVAR', 'XFORM', 'GCONST', 'DURATION', 'INVDIAGC',
+                  'TRANSP', 'DPROB', 'LLTC', 'LLTCOVAR', 'PROJSIZE', 'RCLASS', 'REGTREE', 'NODE', 'TNODE',
+                  'HMMSETID', 'PARMKIND']
+
+
+class _BinaryParser(_Parser):
+    binary = True
+    whitespace = ' \t\r\n'
+
+    def __init__(self, text, mmf):
+        self.text = text
+        self.mmf = mmf
+        self.pos = 0
+        self._token = None
+
+    def _scan(self):
+        # the token at self.pos, only looked at when the parser asks for a token (binary numbers are read directly)
+        if self._token is not None:
+            return self._token
+
+        text, p = self.text, self.pos
+        while p < len(text) and text[p] in self.whitespace:
+            p += 1
+
+        if p >= len(text):
+            self._token = (None, p, p)
+        elif text[p] == ':' and p + 1 < len(text):
+            code = ord(text[p + 1])
+            t = '<' + BINARY_SYMBOLS[code] + '>' if code < len(BINARY_SYMBOLS) else ':' + text[p + 1]
+            self._token = (t, p, p + 2)
+        elif text[p] == '~':
+            self._token = (text[p:p + 2], p, p + 2)
+        elif text[p] == '<':
+            end = _find(text, '>', p) + 1
+            self._token = (text[p:end].upper(), p, end)
+        elif text[p] == '"':
+            end = p + 1
+            while end < len(text) and text[end] != '"':
+                end += 2 if text[end] == '\\' else 1
+            self._token = (text[p:end + 1], p, end + 1)
+        else:
+            end = p
+            while end < len(text) and text[end] not in self.whitespace and text[end] not in '<~:':
+                end += 1
+            self._token = (text[p:end], p, end)
+        return self._token
+
+    def peek(self):
+        return self._scan()[0]
+
+    def position(self):
+        return self._scan()[1]
+
+    def next(self):
+        t, start, end = self._scan()
+        if t is None:
+            raise MMFError("Unexpected end of MMF")
+        self.pos = end
+        self._token = None
+        return t
+
+    def _unpack(self, format, size):
+        if self.pos + size > len(self.text):
+            raise MMFError("Unexpected end of MMF")
+        value = struct.unpack_from(format, self.text, self.pos)[0]
+        self.pos += size
+        self._token = None
+        return value
+
+    def int_value(self):
+        return self._unpack('>h', 2)
+
+    def float_value(self):
+        return self._unpack('>f', 4)
+
+    def vector(self, n):
+        if self.pos + 4 * n > len(self.text):
+            raise MMFError("Unexpected end of MMF")
+        values = np.frombuffer(self.text, dtype='>f4', count=n, offset=self.pos).astype(np.float64)
+        self.pos += 4 * n
+        self._token = None
+        return values
+
+    def option(self):
+        t = self.next()
+        if t == '<STREAMINFO>':
+            n = self.int_value()
+            return [t, str(n)] + [str(self.int_value()) for _ in xrange(n)]
+        elif t == '<VECSIZE>':
+            return [t, str(self.int_value())]
+        return [t]
+
+
+class _Writer(object):
+    def __init__(self, file_desc):
+        self.out = file_desc
+
+    def write(self, mmf):
+        if len(mmf.options) > 0:
+            print("~o", file=self.out)
+            print(" ".join(mmf.options), file=self.out)
+
+        for kind, name in mmf.order:
+            if kind == 'raw':
+                print(mmf.raw[name], file=self.out)
+                continue
+
+            print("~{0:>s} \"{1:>s}\"".format(kind, name), file=self.out)
+            obj = mmf.macros[kind][name]
+            {'h': self.hmm, 's': self.state, 'm': self.mixpdf, 'u': self.mean, 'v': self.variance,
+             't': self.transp}[kind](obj)
+
+    def vector(self, v):
+        print((" %e" * len(v)) % tuple(v), file=self.out)
+
+    def ref_or(self, obj, write):
+        if isinstance(obj, MacroRef):
+            print(repr(obj), file=self.out)
+        else:
+            write(obj)
+
+    def hmm(self, hmm):
+        print("<BEGINHMM>", file=self.out)
+        if len(hmm.options) > 0:
+            print(" ".join(hmm.options), file=self.out)
+        print("<NUMSTATES> {0:d}".format(hmm.num_states), file=self.out)
+        for i in sorted(hmm.states.iterkeys()):
+            print("<STATE> {0:d}".format(i), file=self.out)
+            self.ref_or(hmm.states[i], self.state)
+        self.ref_or(hmm.transp, self.transp)
+        print("<ENDHMM>", file=self.out)
+
+    def state(self, state):
+        if state.num_mixes is None and len(state.mixtures) == 1:
+            self.ref_or(state.mixtures[0].pdf, self.mixpdf)
+            return
+
+        print("<NUMMIXES> {0:d}".format(state.num_mixes if state.num_mixes is not None else len(state.mixtures)), file=self.out)
+        for i, mixture in enumerate(state.mixtures):
+            print("<MIXTURE> {0:d} {1:e}".format(i + 1, mixture.weight), file=self.out)
+            self.ref_or(mixture.pdf, self.mixpdf)
+
+    def mixpdf(self, pdf):
+        if pdf.rclass is not None:
+            print("<RCLASS> {0:d}".format(pdf.rclass), file=self.out)
+        self.ref_or(pdf.mean, self.mean)
+        self.ref_or(pdf.variance, self.variance)
+        if pdf.gconst is not None:
+            print("<GCONST> {0:e}".format(pdf.gconst), file=self.out)
+
+    def mean(self, mean):
+        print("<MEAN> {0:d}".format(len(mean)), file=self.out)
+        self.vector(mean)
+
+    def variance(self, variance):
+        print("<VARIANCE> {0:d}".format(len(variance)), file=self.out)
+        self.vector(variance)
+
+    def transp(self, transp):
+        n = transp.matrix.shape[0]
+        print("<TRANSP> {0:d}".format(n), file=self.out)
+        for row in transp.matrix:
+            self.vector(row)
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog input_mmf [input_mmf ...] output_mmf"
+    parser = OptionParser(usage=usage, description="Writes (binary) MMFs as one text MMF")
+
+    options, args = parser.parse_args()
+
+    if len(args) < 2:
+        sys.exit("Need at least an input and an output MMF")
+
+    MMF.read(*args[:-1]).write(args[-1])
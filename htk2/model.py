@@ -1,5 +1,6 @@
 from __future__ import print_function
 
+import copy
 import glob
 from multiprocessing.pool import Pool
 import os
@@ -7,8 +8,9 @@ import re
 import shutil
 
 from gridscripts.remote_run import System
+from htk2.scp_entry import logical_file, physical_file, replace_physical
 from htk2.tools import HCompV,HERest,HHEd,HLEd,HVite, Copier
-from htk2.units import HTK_dictionary,HTK_transcription
+from htk2.units import HTK_dictionary,HTK_transcription,iter_mlf,write_mlf_iter
 import htk_file_strings
 
 
@@ -65,32 +67,23 @@ class HTK_model(object):
         for f in glob.iglob(self.model_dir + '/' + self.name + '.*'): os.remove(f)
         os.mkdir(self.train_files_dir)
 
-        # handle dictionary
-        dic = HTK_dictionary()
         if isinstance(dict,basestring):
-            dic.read_dict(dict)
-        elif all(isinstance(d,basestring) for d in dict):
-            for d in dict:
-                dic.read_dict(d)
-        else:
+            dict = [dict]
+        elif not all(isinstance(d,basestring) for d in dict):
             raise TypeError
-        dic.write_dict(self.training_dict)
 
-        self.phones = dic.get_phones()
+        word_mlf = word_mlf.strip().split(',')
+        scp_list = scp_list.strip().split(',')
 
+        pool = Pool()
 
-        # handle transcription
-        trans = HTK_transcription()
-#        if isinstance(word_mlf,basestring):
-#            trans.read_mlf(word_mlf, HTK_transcription.WORD)
-#        elif all(isinstance(w,basestring) for w in word_mlf):
-#            for w in word_mlf:
-#                trans.read_mlf(w, HTK_transcription.WORD)
-#        else:
-#            raise TypeError
-        word_mlf = word_mlf.strip().split(',')
-        for w in word_mlf:
-            trans.read_mlf(w,HTK_transcription.WORD)
+        # handle dictionary
+        dic = HTK_dictionary()
+        for d in pool.map(DictionaryReader(), dict):
+            dic.update(d)
+        dic.write_dict(self.training_dict)
+
+        self.phones = dic.get_phones()
 
 
         self.id = 1
@@ -101,35 +94,62 @@ class HTK_model(object):
                 print(p, file=phones_desc)
 
 
-        # handle scp files
-        scp_list = scp_list.strip().split(',')
-#        if isinstance(scp_list,basestring):
-#            scp_list = [scp_list]
+        # handle transcriptions, every word mlf is filtered by its own worker
+        scp_ids = set()
+        for scp in scp_list:
+            for file in open(scp):
+                scp_ids.add(os.path.splitext(os.path.basename(logical_file(file)))[0])
 
-        real_trans = HTK_transcription()
-        real_trans.transcriptions[real_trans.WORD] = {}
+        tmp_dir = System.get_global_temp_dir()
+        filtered_mlfs = [os.path.join(tmp_dir, 'word.{0:d}.mlf'.format(i)) for i in xrange(len(word_mlf))]
+        results = pool.map(MLFFilter(dic.known_words(), scp_ids), zip(word_mlf, filtered_mlfs))
+        pool.close()
+        pool.join()
+
+        source, missing = last_transcriptions(results)
+
+        def merged_transcriptions():
+            for i, filtered_mlf in enumerate(filtered_mlfs):
+                seen = {}
+                for id, words in iter_mlf(filtered_mlf, HTK_transcription.WORD):
+                    if id in source and source[id][0] == i:
+                        seen[id] = seen.get(id, 0) + 1
+                        if seen[id] == source[id][1]:
+                            yield id, words
+
+        write_mlf_iter(self.training_word_mlf, merged_transcriptions(), target=HTK_transcription.WORD)
+        shutil.rmtree(tmp_dir)
 
         with open(self.training_scp, 'w') as scp_desc:
             for scp in scp_list:
                 for file in open(scp):
-                    id = os.path.splitext(os.path.basename(file.strip()))[0]
-                    if not file.startswith('/'):
-                        file = os.path.join(os.path.dirname(scp),file.strip())
-
-                    ok = True
-
-                    for word in trans.transcriptions[HTK_transcription.WORD][id]:
-                        if not dic.word_in_dict(word):
-                            print("%s skipped, because has missing word %s" % (file.strip(), word))
-                            ok = False
-                            break        
-                    if ok:
+                    id = os.path.splitext(os.path.basename(logical_file(file)))[0]
+                    if not physical_file(file).startswith('/'):
+                        file = replace_physical(file, os.path.join(os.path.dirname(scp),physical_file(file)))
+
+                    if id in source:
                         print(file.strip(),file=scp_desc)
-                        real_trans.transcriptions[real_trans.WORD][id] = trans.transcriptions[real_trans.WORD][id]
+                    elif id in missing:
+                        print("%s skipped, because has missing word %s" % (file.strip(), missing[id]))
+                    else:
+                        print("%s skipped, because has no transcription" % file.strip())
+
+        if self.htk_config.speaker_normalisation:
+            self.normalise_speakers()
 
-        real_trans.write_mlf(self.training_word_mlf,target=HTK_transcription.WORD)
         self.expand_word_transcription()
 
+    def normalise_speakers(self):
+        from htk2.speaker_norm import SpeakerNormalisation
+        num_speaker_chars = self.htk_config.num_speaker_chars
+        if num_speaker_chars < 1:
+            num_speaker_chars = self.training_files_speaker_name_chars
+
+        norm = SpeakerNormalisation(self.htk_config, self.training_scp, os.path.join(self.train_files_dir, 'speaker_norm'),
+                                    num_speaker_chars)
+        norm.run()
+        self.htk_config.add_config_file(norm.config_file())
+
     def transfer_files_local(self):
         if not hasattr(self,'training_scp_orig'):
             self.training_scp_orig = self.training_scp
@@ -137,16 +157,17 @@ class HTK_model(object):
 
             self.training_scp = os.path.join(tmp_dir,'training_scp_local.scp')
 
-            files = []
+            # segments of an archive share one copy of it
+            files = set()
             with open(self.training_scp, 'w') as scp_desc:
 
                 for file in open(self.training_scp_orig):
                     file = file.strip()
-                    files.append(file)
-                    print(os.path.join(tmp_dir,os.path.basename(file)),file=scp_desc)
+                    files.add(physical_file(file))
+                    print(replace_physical(file, os.path.join(tmp_dir,os.path.basename(physical_file(file)))),file=scp_desc)
 
             pool = Pool()
-            pool.map(Copier(tmp_dir),files)
+            pool.map(Copier(tmp_dir),sorted(files))
             pool.close()
             pool.join()
 
@@ -154,7 +175,7 @@ class HTK_model(object):
     def clean_files_local(self):
         if hasattr(self,'training_scp_orig'):
             line = open(self.training_scp).readline().strip()
-            shutil.rmtree(os.path.dirname(line))
+            shutil.rmtree(os.path.dirname(physical_file(line)))
 
             self.training_scp = self.training_scp_orig
             delattr(self,'training_scp_orig')
@@ -201,30 +222,35 @@ class HTK_model(object):
         with open(proto_file, 'w') as proto_desc:
             print(htk_file_strings.PROTO, file=proto_desc)
 
-        HCompV(self.htk_config, self.training_scp, proto_file).run()
+        native = None
+        if self.htk_config.native_flat_start:
+            from htk2.feature_stats import NativeHCompV
+            native = NativeHCompV(self.htk_config, self.training_scp, proto_file)
+            if not native.applicable():
+                print("Features are not stored as the prototype kind or are normalised by the configs, falling back to HCompV")
+                native = None
+
+        if native is not None:
+            native.run()
+        else:
+            HCompV(self.htk_config, self.training_scp, proto_file).run()
 
 
+        from htk2.mmf import MMF
         out_model = self._get_model_name_id() + ".mmf"
 
-        model_def = ""
-        phone_def = ""
-        in_model_def = True
-
-        for line in open(proto_file):
-            if line[0:2] == '~h': in_model_def = False
-            if in_model_def: model_def += line
-            else: phone_def += line
-
-        #Write model file
-        with open(out_model, 'w') as model_desc:
-            print(model_def, file=model_desc)
-            for line in open(vFloors):
-                print(line.strip(), file=model_desc)
-
-            #Write the hmmdefs  (replacing for each monophone, proto with the monophone)
-            for line in open( self._get_model_name_id() + '.hmmlist'):
-                print(phone_def.replace('proto', line.rstrip()), file=model_desc)
-                
+        proto = MMF.read(proto_file, vFloors)
+        model = MMF()
+        model.options = proto.options
+        for name, variance in proto.macros['v'].iteritems():
+            model.add('v', name, variance)
+
+        #One copy of the prototype for each monophone
+        for line in open( self._get_model_name_id() + '.hmmlist'):
+            if len(line.strip()) > 0:
+                model.add_hmm(line.strip(), proto.hmms['proto'].copy())
+        model.write(out_model)
+
         shutil.rmtree(tmp_dir)
         
     def re_estimate(self,stats=False):
@@ -235,7 +261,8 @@ class HTK_model(object):
             stats = None
         shutil.copyfile(self._get_model_name_id(1)+'.hmmlist',self._get_model_name_id()+'.hmmlist')
         HERest(self.htk_config, self.training_scp,self._get_model_name_id(1)+'.mmf',self._get_model_name_id()+'.hmmlist',
-               self.training_phone_mlf,output_hmm_model=self._get_model_name_id()+'.mmf',stats=stats).run()
+               self.training_phone_mlf,output_hmm_model=self._get_model_name_id()+'.mmf',stats=stats,
+               binary=self.htk_config.binary_models).run()
 
 
     def introduce_short_pause_model(self):
@@ -248,28 +275,10 @@ class HTK_model(object):
                 print(p,file=phone_out)
 
         #copy sil state 3 to sp
-        in_sil = False
-        in_state3 = False
-
-        state = ""
-
-        with open(self._get_model_name_id()+'.mmf', 'w') as model_desc:
-            for line in open(self._get_model_name_id(1)+'.mmf'):
-                print(line, file=model_desc)
-
-                if line.startswith('~h'):
-                    if line.startswith('~h "sil"'): in_sil = True
-                    else: in_sil = False
-                elif line.startswith('<STATE>'):
-                    if line.startswith('<STATE> 3'): in_state3 = True
-                    else: in_state3 = False
-                elif in_sil and in_state3:
-                    state += line
-
-            print(  "~h \"sp\" <BEGINHMM> <NUMSTATES> 3", file=model_desc)
-            print( "<STATE> 2", file=model_desc)
-            print(  state, file=model_desc)
-            print( htk_file_strings.TRANSP3, file=model_desc)
+        from htk2.mmf import HMM, MMF, TransP
+        model = MMF.read(self._get_model_name_id(1)+'.mmf')
+        model.add_hmm('sp', HMM(3, {2: copy.deepcopy(model.hmms['sil'].states[3])}, TransP(htk_file_strings.TRANSP3)))
+        model.write(self._get_model_name_id()+'.mmf')
 
         self.id += 1
         shutil.copyfile(self._get_model_name_id(1)+'.hmmlist',self._get_model_name_id()+'.hmmlist')
@@ -278,7 +287,7 @@ class HTK_model(object):
         tmp_dir = System.get_global_temp_dir()
         with open(os.path.join(tmp_dir,'sil.hed'), 'w') as sil_desc:
             print( htk_file_strings.SIL_HED, file = sil_desc)
-        HHEd(self.htk_config,self._get_model_name_id(1)+'.mmf', self._get_model_name_id()+'.mmf',self._get_model_name_id()+'.hmmlist',script=os.path.join(tmp_dir,'sil.hed')).run()
+        HHEd(self.htk_config,self._get_model_name_id(1)+'.mmf', self._get_model_name_id()+'.mmf',self._get_model_name_id()+'.hmmlist',script=os.path.join(tmp_dir,'sil.hed'),binary=self.htk_config.binary_models).run()
         shutil.rmtree(tmp_dir)
 
         self.expand_word_transcription(True)
@@ -300,7 +309,7 @@ class HTK_model(object):
 
         self._make_tri_hed(self._get_model_name_id() + '.hmmlist',self._get_model_name_id(1) + '.hmmlist',tri_hed)
 
-        HHEd(self.htk_config,self._get_model_name_id(1)+'.mmf',self._get_model_name_id()+'.mmf',self._get_model_name_id(1)+'.hmmlist',script=tri_hed).run()
+        HHEd(self.htk_config,self._get_model_name_id(1)+'.mmf',self._get_model_name_id()+'.mmf',self._get_model_name_id(1)+'.hmmlist',script=tri_hed,binary=self.htk_config.binary_models).run()
         
         shutil.rmtree(tmp_dir)    
 
@@ -316,7 +325,7 @@ class HTK_model(object):
                             self.htk_config.tying_threshold,self.htk_config.required_occupation,self._get_model_name_id(1) + '.stats',
                             full_list,self._get_model_name_id() + '.hmmlist', os.path.join(tmp_dir,'trees'))
 
-        HHEd(self.htk_config,self._get_model_name_id(1) + '.mmf',self._get_model_name_id(0) + '.mmf',self._get_model_name_id(1) + '.hmmlist',script=tree_hed).run()
+        HHEd(self.htk_config,self._get_model_name_id(1) + '.mmf',self._get_model_name_id(0) + '.mmf',self._get_model_name_id(1) + '.hmmlist',script=tree_hed,binary=self.htk_config.binary_models).run()
 
         shutil.rmtree(tmp_dir)
 
@@ -330,7 +339,7 @@ class HTK_model(object):
             print("MU {0:d} {{sil.state[2-4].stream[1].mix}}".format(2 *num_mixes),file=hed)
 
         shutil.copyfile(self._get_model_name_id(1) + '.hmmlist',self._get_model_name_id() + '.hmmlist')
-        HHEd(self.htk_config,self._get_model_name_id(1) + '.mmf',self._get_model_name_id(0) + '.mmf',self._get_model_name_id() + '.hmmlist',script=hed_file).run()
+        HHEd(self.htk_config,self._get_model_name_id(1) + '.mmf',self._get_model_name_id(0) + '.mmf',self._get_model_name_id() + '.hmmlist',script=hed_file,binary=self.htk_config.binary_models).run()
         shutil.rmtree(tmp_dir)
 
     def split_mixtures_variably(self,power, num_iterations):
@@ -344,12 +353,18 @@ class HTK_model(object):
 
         shutil.copyfile(self._get_model_name_id(1) + '.hmmlist',self._get_model_name_id() + '.hmmlist')
         
-        HHEd(self.htk_config,self._get_model_name_id(1) + '.mmf',self._get_model_name_id(0) + '.mmf',self._get_model_name_id() + '.hmmlist',script=hed_file).run()
+        HHEd(self.htk_config,self._get_model_name_id(1) + '.mmf',self._get_model_name_id(0) + '.mmf',self._get_model_name_id() + '.hmmlist',script=hed_file,binary=self.htk_config.binary_models).run()
         shutil.rmtree(tmp_dir)
 
 #    def estimate_transform(self):
 #        pass
 
+    def export_text(self, output_model=None):
+        # writes the current (possibly binary) model as text, by default in place
+        if output_model is None:
+            output_model = self._get_model_name_id() + '.mmf'
+        HHEd(self.htk_config,self._get_model_name_id() + '.mmf',output_model,self._get_model_name_id() + '.hmmlist').run()
+
 
     def clean_up(self,keep_versions = None):
         if keep_versions is None:
@@ -440,3 +455,54 @@ class HTK_model(object):
                             print ("{0:>s}-{1:>s}+{2:>s}".format(phone1, phone2, phone3), file=flist)
             print ('sp', file=flist)
             print ('sil', file=flist)
+
+
+class DictionaryReader(object):
+    def __call__(self,dict_file):
+        dic = HTK_dictionary()
+        dic.read_dict(dict_file)
+        return dic
+
+
+class MLFFilter(object):
+    # Streams a word mlf to a new mlf, keeping the transcriptions of utterances in scp_ids that only contain known
+    # words. Returns for every utterance of scp_ids in the mlf the number of transcriptions kept and, if its last
+    # transcription was rejected, the first missing word of it (None otherwise).
+    def __init__(self,known_words,scp_ids):
+        self.known_words = known_words
+        self.scp_ids = scp_ids
+
+    def __call__(self,files):
+        mlf_file, out_mlf = files
+        status = {}
+
+        def filter_transcriptions():
+            for id, words in iter_mlf(mlf_file, HTK_transcription.WORD):
+                if id not in self.scp_ids: continue
+
+                count = status[id][0] if id in status else 0
+                if self.known_words.issuperset(words):
+                    status[id] = (count + 1, None)
+                    yield id, words
+                else:
+                    status[id] = (count, next(w for w in words if w not in self.known_words))
+
+        write_mlf_iter(out_mlf, filter_transcriptions(), target=HTK_transcription.WORD)
+        return status
+
+
+def last_transcriptions(results):
+    # As when the mlfs are read one after the other, the last transcription of an utterance counts. From the
+    # MLFFilter results of the mlfs, in order, returns which mlf provides every utterance (index of the mlf and of the
+    # transcription of the utterance in its filtered mlf, counted from 1) and the missing word of the rejected ones.
+    source = {}
+    missing = {}
+    for i, status in enumerate(results):
+        for id, (count, word) in status.iteritems():
+            if word is None:
+                source[id] = (i, count)
+                missing.pop(id, None)
+            else:
+                source.pop(id, None)
+                missing[id] = word
+    return source, missing
@@ -0,0 +1,222 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+import binascii
+from multiprocessing.pool import ThreadPool
+from optparse import OptionParser
+import os
+import struct
+import sys
+
+import numpy as np
+
+# the kinds, headers and scp line helpers live in numpy-free modules and are imported from here as before
+from htk2.param_header import BASE_KINDS, BASE_MASK, COMPRESSED, COMPRESSED_EXTRA_ROWS, CRC, DERIVATIVES, \
+    QUALIFIERS, SUPPRESS_ENERGY, ZERO_MEAN, ParamHeader, kind_name, parse_kind
+from htk2.scp_entry import logical_file, physical_file, replace_physical, segment
+
+
+class ParamFile(object):
+    # An HTK parameter file. data is a read-only memmap of the stored payload: float32 frames, int16 samples for
+    # WAVEFORM, or the int16 values of a compressed file (decoded by features()). For _K files the trailing CRC is
+    # read into crc; it is assumed to be the CRC-CCITT (binascii.crc_hqx, initial value 0) of the payload bytes
+    # between header and checksum.
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.header = ParamHeader.read(file_name)
+
+        offset = ParamHeader.layout.size
+        dim = self.header.vector_size
+
+        self.scale = None
+        self.offset = None
+        if self.header.compressed:
+            ab = np.memmap(file_name, dtype='>f4', mode='r', offset=offset, shape=(2, dim))
+            self.scale, self.offset = np.array(ab[0]), np.array(ab[1])
+            offset += ab.nbytes
+
+        dtype = '>i2' if self.header.compressed or self.header.waveform else '>f4'
+        shape = (self.header.num_frames,) if self.header.waveform else (self.header.num_frames, dim)
+        self.data = np.memmap(file_name, dtype=dtype, mode='r', offset=offset, shape=shape) if self.header.num_frames > 0 else np.zeros(shape, dtype=dtype)
+
+        self.crc = None
+        if self.header.has_crc:
+            with open(file_name, 'rb') as file_desc:
+                file_desc.seek(offset + self.data.nbytes)
+                self.crc = struct.unpack('>H', file_desc.read(2))[0]
+
+    def features(self):
+        # float32 frames; a view on the file unless the file is compressed
+        if self.header.compressed:
+            return ((self.data.astype(np.float32) + self.offset) / self.scale).astype(np.float32)
+        return self.data
+
+    def check_crc(self):
+        if self.crc is None:
+            return True
+        with open(self.file_name, 'rb') as file_desc:
+            file_desc.seek(ParamHeader.layout.size)
+            payload = file_desc.read(os.path.getsize(self.file_name) - ParamHeader.layout.size - 2)
+        return binascii.crc_hqx(payload, 0) == self.crc
+
+
+def read_features(file_name):
+    return ParamFile(file_name).features()
+
+
+def compress(features):
+    # HTK compression: x = (s + B) / A with A = 2 * 32767 / (max - min) and B = (max + min) * 32767 / (max - min)
+    features = np.asarray(features, dtype=np.float64)
+    xmax, xmin = features.max(axis=0), features.min(axis=0)
+    span = xmax - xmin
+
+    constant = span == 0
+    span[constant] = 1.0
+    scale = 2 * 32767. / span
+    offset = (xmax + xmin) * 32767. / span
+
+    # constant columns: map the value to +-32767 (or 0) instead
+    magnitude = np.where(xmax[constant] != 0, np.abs(xmax[constant]), 1.0)
+    scale[constant] = 32767. / magnitude
+    offset[constant] = 0.0
+
+    values = np.clip(np.round(features * scale - offset), -32767, 32767).astype('>i2')
+    return scale.astype('>f4'), offset.astype('>f4'), values
+
+
+def write_param_file(file_name, features, samp_period, parm_kind):
+    if isinstance(parm_kind, basestring):
+        parm_kind = parse_kind(parm_kind)
+    header = ParamHeader(0, samp_period, 0, parm_kind)
+
+    if header.waveform:
+        payload = [np.asarray(features).astype('>i2')]
+        header.num_samples = len(payload[0])
+        header.samp_size = 2
+    elif header.compressed:
+        scale, offset, values = compress(np.atleast_2d(features))
+        write_compressed(file_name, scale, offset, values, samp_period, parm_kind)
+        return
+    else:
+        payload = [np.atleast_2d(np.asarray(features, dtype='>f4'))]
+        header.num_samples = payload[0].shape[0]
+        header.samp_size = payload[0].shape[1] * 4
+
+    _write_payload(file_name, header, payload)
+
+
+def write_compressed(file_name, scale, offset, values, samp_period, parm_kind):
+    # a compressed file from its stored form, the A and B vectors and the int16 values, e.g. those of a ParamFile
+    values = np.atleast_2d(np.asarray(values, dtype='>i2'))
+    header = ParamHeader(values.shape[0] + COMPRESSED_EXTRA_ROWS, samp_period, values.shape[1] * 2,
+                         parm_kind | COMPRESSED)
+    _write_payload(file_name, header, [np.asarray(scale, dtype='>f4'), np.asarray(offset, dtype='>f4'), values])
+
+
+def _write_payload(file_name, header, payload):
+    data = "".join(a.tostring() for a in payload)
+    with open(file_name, 'wb') as file_desc:
+        file_desc.write(header.pack())
+        file_desc.write(data)
+        if header.has_crc:
+            file_desc.write(struct.pack('>H', binascii.crc_hqx(data, 0)))
+
+
+def num_derivatives(kind):
+    return sum(1 for bit in DERIVATIVES if kind & bit)
+
+
+def static_kind(kind):
+    # the kind to store so that kind can be computed from it on load (_Z stays, HTK applies it again harmlessly)
+    if kind & SUPPRESS_ENERGY:
+        raise ValueError("{0:>s} has no stored form without derivatives".format(kind_name(kind)))
+    for bit in DERIVATIVES:
+        kind &= ~bit
+    return kind
+
+
+def num_statics(kind, vector_size):
+    if kind & SUPPRESS_ENERGY:
+        raise ValueError("{0:>s} has no stored form without derivatives".format(kind_name(kind)))
+    return vector_size // (1 + num_derivatives(kind))
+
+
+def regression(features, window=2):
+    # HTK's DELTAWINDOW/ACCWINDOW regression formula, the first and last frame repeated at the edges
+    features = np.asarray(features, dtype=np.float64)
+    padded = np.concatenate([features[:1].repeat(window, axis=0), features, features[-1:].repeat(window, axis=0)])
+    n = len(features)
+    delta = np.zeros(features.shape)
+    for theta in xrange(1, window + 1):
+        delta += theta * (padded[window + theta:window + theta + n] - padded[window - theta:window - theta + n])
+    return delta / (2 * sum(theta * theta for theta in xrange(1, window + 1)))
+
+
+def convert_features(features, kind, target_kind, delta_window=2, acc_window=2):
+    # statics of kind -> target_kind by appending _D, _A and _T coefficients and applying _Z, as HParm does when the
+    # TARGETKIND asks for more than is stored
+    if kind & ~(COMPRESSED | CRC) == target_kind & ~(COMPRESSED | CRC):
+        return features
+    if static_kind(target_kind) & ~(COMPRESSED | CRC | ZERO_MEAN) != kind & ~(COMPRESSED | CRC | ZERO_MEAN) or \
+            num_derivatives(kind) > 0:
+        raise ValueError("Cannot compute {0:>s} from {1:>s}".format(kind_name(target_kind), kind_name(kind)))
+
+    statics = np.asarray(features, dtype=np.float64)
+    if target_kind & ZERO_MEAN and not kind & ZERO_MEAN and len(statics) > 0:
+        statics = statics - statics.mean(axis=0)
+
+    blocks = [statics]
+    for bit, window in zip(DERIVATIVES, (delta_window, acc_window, acc_window)):
+        if not target_kind & bit:
+            break
+        blocks.append(regression(blocks[-1], window) if len(statics) > 0 else np.zeros(statics.shape))
+    return np.hstack(blocks).astype(np.float32)
+
+
+def read_scp_entry(scp_entry, target_kind=None):
+    # features of an scp line, limited to the frames s..e (inclusive) for 'logical=physical[s,e]' entries and
+    # converted to target_kind if that has derivatives that are not stored
+    param = ParamFile(physical_file(scp_entry))
+    features = param.features()
+    frames = segment(scp_entry)
+    if frames is not None:
+        features = features[frames[0]:frames[1] + 1]
+    if target_kind is not None:
+        features = convert_features(features, param.header.parm_kind, target_kind)
+    return features
+
+
+def scan_headers(scp_file, num_threads=16):
+    files = [physical_file(f) for f in open(scp_file) if len(f.strip()) > 0]
+    pool = ThreadPool(num_threads)
+    try:
+        return zip(files, pool.map(ParamHeader.read, files))
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options] [files]"
+    parser = OptionParser(usage=usage)
+    parser.add_option('-S', dest='scp_file', default=None, help='list of files to scan')
+    parser.add_option('--threads', dest='threads', type='int', default=16)
+    parser.add_option('--check-crc', dest='check_crc', action='store_true', default=False)
+
+    options, args = parser.parse_args()
+
+    if options.scp_file is not None:
+        headers = scan_headers(options.scp_file, options.threads)
+    else:
+        headers = [(f, ParamHeader.read(f)) for f in args]
+
+    total = 0
+    for file, header in headers:
+        total += header.num_frames
+        status = ""
+        if options.check_crc and header.has_crc:
+            status = " crc ok" if ParamFile(file).check_crc() else " crc FAILED"
+        print("{0:>s} {1:d} {2:d} {3:d} {4:>s}{5:>s}".format(file, header.num_frames, header.samp_period,
+                                                          header.vector_size, header.kind_name, status))
+
+    print("{0:d} files, {1:d} frames".format(len(headers), total), file=sys.stderr)
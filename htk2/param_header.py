@@ -0,0 +1,84 @@
+# HTK parameter kinds and file headers, without numpy, so that tools that only look at headers do not need it
+import re
+import struct
+
+BASE_KINDS = ['WAVEFORM', 'LPC', 'LPREFC', 'LPCEPSTRA', 'LPDELCEP', 'IREFC', 'MFCC', 'FBANK', 'MELSPEC', 'USER',
+              'DISCRETE', 'PLP']
+
+QUALIFIERS = [('_E', 0x40), ('_N', 0x80), ('_D', 0x100), ('_A', 0x200), ('_C', 0x400), ('_Z', 0x800), ('_K', 0x1000),
+              ('_0', 0x2000), ('_V', 0x4000), ('_T', 0x8000)]
+
+BASE_MASK = 0x3f
+ZERO_MEAN = 0x800
+COMPRESSED = 0x400
+CRC = 0x1000
+DERIVATIVES = [0x100, 0x200, 0x8000]    # _D, _A, _T
+SUPPRESS_ENERGY = 0x80
+
+# number of int16 rows taken by the float32 A and B vectors in front of compressed data
+COMPRESSED_EXTRA_ROWS = 4
+
+
+def parse_kind(name):
+    # 'MFCC_0_D_A_Z' -> 6 | _0 | _D | _A | _Z
+    base = re.match('[A-Z]+', name.upper()).group(0)
+    kind = BASE_KINDS.index(base)
+    for qualifier in re.findall('_[A-Z0-9]', name.upper()[len(base):]):
+        kind |= dict(QUALIFIERS)[qualifier]
+    return kind
+
+
+def kind_name(kind):
+    return BASE_KINDS[kind & BASE_MASK] + "".join(q for q, bit in QUALIFIERS if kind & bit)
+
+
+class ParamHeader(object):
+    layout = struct.Struct('>iihH')
+
+    def __init__(self, num_samples, samp_period, samp_size, parm_kind):
+        self.num_samples = num_samples
+        self.samp_period = samp_period
+        self.samp_size = samp_size
+        self.parm_kind = parm_kind
+
+    @classmethod
+    def read(cls, file_name):
+        with open(file_name, 'rb') as file_desc:
+            return cls.unpack(file_desc.read(cls.layout.size))
+
+    @classmethod
+    def unpack(cls, data):
+        return cls(*cls.layout.unpack(data))
+
+    def pack(self):
+        return self.layout.pack(self.num_samples, self.samp_period, self.samp_size, self.parm_kind)
+
+    @property
+    def compressed(self):
+        return bool(self.parm_kind & COMPRESSED)
+
+    @property
+    def has_crc(self):
+        return bool(self.parm_kind & CRC)
+
+    @property
+    def waveform(self):
+        return self.parm_kind & BASE_MASK == 0
+
+    @property
+    def kind_name(self):
+        return kind_name(self.parm_kind)
+
+    @property
+    def num_frames(self):
+        return self.num_samples - COMPRESSED_EXTRA_ROWS if self.compressed else self.num_samples
+
+    @property
+    def vector_size(self):
+        if self.waveform:
+            return 1
+        return self.samp_size // 2 if self.compressed else self.samp_size // 4
+
+    def __repr__(self):
+        return "ParamHeader({0:d} frames, {1:d} x {2:>s}, period {3:d})".format(self.num_frames, self.vector_size,
+                                                                                self.kind_name, self.samp_period)
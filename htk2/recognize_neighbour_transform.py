@@ -7,7 +7,7 @@ from gridscripts.remote_run import System
 
 from os import symlink, mkdir
 from os.path import join, basename,splitext
-from htk2.units import HTK_transcription
+from htk2.units import HTK_transcription, write_mlf_iter
 
 from random import shuffle
 
@@ -71,7 +71,9 @@ for line in open(t_scp):
     transform_files[sp].append(line.strip())
 
 mlf = HTK_transcription()
-mlf.read_mlf(t_mlf,target=HTK_transcription.WORD)
+mlf.open_mlf(t_mlf,target=HTK_transcription.WORD)
+
+aliases = {}
 
 
 #trans_mlf = HTK_transcription()
@@ -89,13 +91,21 @@ with open(transform_scp, 'w') as transform_desc:
 
         for t in t_files:
             f = splitext(basename(t))[0]
-            mlf.transcriptions[HTK_transcription.WORD]["%s_%s"%(sp,f)] = mlf.transcriptions[HTK_transcription.WORD][f]
+            if f not in aliases:
+                aliases[f] = []
+            aliases[f].append("%s_%s"%(sp,f))
 
             new_f = join(file_dir,"%s_%s"%(sp,basename(t)))
             symlink(t,new_f)
             print >> transform_desc, new_f
 
-mlf.write_mlf(transform_mlf,target=HTK_transcription.WORD)
+def alias_transcriptions():
+    for f in aliases.keys():
+        words = mlf.transcriptions[HTK_transcription.WORD][f]
+        for a in aliases[f]:
+            yield a, words
+
+write_mlf_iter(transform_mlf,alias_transcriptions(),target=HTK_transcription.WORD)
 
     
 
@@ -6,6 +6,7 @@ import os
 from random import shuffle
 from os.path import basename
 import shutil
+from htk2.scp_entry import logical_file, physical_file, replace_physical
 from htk2.tools import HDecode, HERest, HHEd, HVite
 from gridscripts.remote_run import System
 from htk2.units import HTK_transcription, HTK_dictionary
@@ -50,7 +51,7 @@ class HTK_recognizer(object):
                 real_scp = os.path.join(name,'%s_list.scp'%s)
                 with open(real_scp, 'w') as scp_desc:
                     for line in open(scp.replace('?' * num_scp_speaker_chars, s)):
-                        print(os.path.join(os.path.dirname(scp), line.strip()),file=scp_desc)
+                        print(replace_physical(line, os.path.join(os.path.dirname(scp), physical_file(line))),file=scp_desc)
                 self.split_scp_models.append(
                     (s,real_scp,model.replace('?' * num_scp_speaker_chars, s))
                 )
@@ -58,7 +59,7 @@ class HTK_recognizer(object):
             self.scp = os.path.join(name,'list.scp')
             with open(self.scp, 'w') as scp_desc:
                 for line in open(scp):
-                    print(os.path.join(os.path.dirname(scp), line.strip()),file=scp_desc)
+                    print(replace_physical(line, os.path.join(os.path.dirname(scp), physical_file(line))),file=scp_desc)
 
         self.dict = dictionary
 
@@ -84,6 +85,32 @@ class HTK_recognizer(object):
         self.id = 0
         System.set_log_dir(os.path.basename(name))
 
+        if htk_config.endpointing:
+            self.endpoint()
+
+        if htk_config.speaker_normalisation:
+            self.normalise_speakers()
+
+    def endpoint(self):
+        from htk2.endpoint import endpoint_scp
+        scp_files = [self.scp] if self.scp is not None else [scp for _, scp, _ in self.split_scp_models]
+        for scp in scp_files:
+            stats = endpoint_scp(scp, scp, self.htk_config.endpoint_threshold)
+            print("Endpointing {0:>s}: {1!s}".format(os.path.basename(scp), stats))
+
+    def normalise_speakers(self):
+        from htk2.speaker_norm import SpeakerNormalisation
+        scp_files = [self.scp] if self.scp is not None else [scp for _, scp, _ in self.split_scp_models]
+        norm_scp = os.path.join(self.name, 'speaker_norm.scp')
+        with open(norm_scp, 'w') as norm_desc:
+            for scp in scp_files:
+                for line in open(scp):
+                    print(line.strip(), file=norm_desc)
+
+        norm = SpeakerNormalisation(self.htk_config, norm_scp, os.path.join(self.name, 'speaker_norm'))
+        norm.run()
+        self.htk_config.add_config_file(norm.config_file())
+
         
     def clear_adaptations(self):
         self.adaptations = []
@@ -126,20 +153,25 @@ class HTK_recognizer(object):
             with open(tmp_scp_file,'w') as tmp_desc:
                 smap = {}
                 for line in open(scp_file):
-                    if basename(line)[:num_speaker_chars] not in smap:
-                        smap[basename(line)[:num_speaker_chars]] = []
-                    smap[basename(line)[:num_speaker_chars]].append(line.strip())
+                    speaker = basename(logical_file(line))[:num_speaker_chars]
+                    if speaker not in smap:
+                        smap[speaker] = []
+                    smap[speaker].append(line.strip())
 
                 for sp,f in smap.iteritems():
                     shuffle(f)
                     for line in f:
 
                     #for line in open(scp_file):
-                        if not line.startswith('/'):
-                            print(os.path.join(os.path.dirname(scp_file), line.strip()),file=tmp_desc)
+                        if not physical_file(line).startswith('/'):
+                            print(replace_physical(line, os.path.join(os.path.dirname(scp_file), physical_file(line))),file=tmp_desc)
                         else:
                             print(line.strip(),file=tmp_desc)
 
+            if self.htk_config.endpointing:
+                from htk2.endpoint import endpoint_scp
+                endpoint_scp(tmp_scp_file, tmp_scp_file, self.htk_config.endpoint_threshold)
+
             tmp_config = os.path.join(tmp_dir,'hvite_config')
             with open(tmp_config,'w') as tmp_desc:
                 print(htk_file_strings.HVITE_CONFIG, file=tmp_desc)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+import math
+from multiprocessing import Pool, cpu_count
+from optparse import OptionParser
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from htk2.mmf import MMF
+from htk2.param_file import BASE_KINDS, logical_file, parse_kind, read_scp_entry
+
+
+def model_kind(mmf):
+    # the parameter kind in the ~o options, e.g. <MFCC_0_D_A_Z>
+    for token in mmf.options:
+        m = re.match(r'<([A-Z]+)((?:_[A-Z0-9])*)>$', token.upper())
+        if m is not None and m.group(1) in BASE_KINDS:
+            return parse_kind(m.group(1) + m.group(2))
+    return None
+
+
+class GMMScorer(object):
+    # Log likelihoods of frames under every distinct emitting state of a diagonal covariance MMF. All Gaussians of
+    # all states are laid out once as matrices, state after state, with everything that does not depend on the frame
+    # (log weight, gconst and the mean terms) folded into one constant per Gaussian:
+    #   log w N(x) = c - 0.5 * sum(x^2 / var) + sum(x * mean / var)
+    # so a block of frames is scored with two matrix products, and the mixtures of a state are summed with a
+    # log-sum-exp over its range of columns.
+    max_block_elements = 1 << 22
+
+    def __init__(self, mmf):
+        self.kind = model_kind(mmf)
+        self.state_names = []
+
+        seen = {}
+        means, inv_variances, constants, starts = [], [], [], []
+        for hmm_name in sorted(mmf.hmms):
+            hmm = mmf.resolve(mmf.hmms[hmm_name])
+            for i in sorted(hmm.states):
+                state = mmf.resolve(hmm.states[i])
+                mixtures = [mixture for mixture in state.mixtures if mixture.weight > 0]
+                if id(state) in seen or len(mixtures) == 0:
+                    continue
+                seen[id(state)] = len(self.state_names)
+                self.state_names.append("{0:>s}.state[{1:d}]".format(hmm_name, i))
+
+                starts.append(len(constants))
+                for mixture in mixtures:
+                    pdf = mmf.resolve(mixture.pdf)
+                    mean = np.asarray(mmf.resolve(pdf.mean), dtype=np.float64)
+                    variance = np.asarray(mmf.resolve(pdf.variance), dtype=np.float64)
+                    gconst = pdf.gconst
+                    if gconst is None:
+                        gconst = len(variance) * math.log(2 * math.pi) + np.log(variance).sum()
+
+                    means.append(mean)
+                    inv_variances.append(1.0 / variance)
+                    constants.append(math.log(mixture.weight) - 0.5 * gconst)
+
+        if len(constants) == 0:
+            raise ValueError("No Gaussians in the model")
+
+        means = np.array(means)
+        inv_variances = np.array(inv_variances)
+        self.starts = np.array(starts)
+        self.state_of = np.repeat(np.arange(len(starts)), np.diff(np.append(self.starts, len(constants))))
+
+        self.square_weights = -0.5 * inv_variances.T
+        self.linear_weights = (means * inv_variances).T
+        self.constants = np.array(constants) - 0.5 * (means * means * inv_variances).sum(axis=1)
+
+    @property
+    def vector_size(self):
+        return self.linear_weights.shape[0]
+
+    @property
+    def num_gaussians(self):
+        return len(self.constants)
+
+    def gaussian_loglik(self, frames):
+        frames = np.asarray(frames, dtype=np.float64)
+        return np.dot(frames * frames, self.square_weights) + np.dot(frames, self.linear_weights) + self.constants
+
+    def state_loglik(self, frames):
+        # frames x states, computed in blocks of frames so that frames x Gaussians stays small
+        frames = np.asarray(frames, dtype=np.float64)
+        result = np.empty((len(frames), len(self.starts)))
+        block = max(1, self.max_block_elements // self.num_gaussians)
+        for b in xrange(0, len(frames), block):
+            ll = self.gaussian_loglik(frames[b:b + block])
+            top = np.maximum.reduceat(ll, self.starts, axis=1)
+            with np.errstate(invalid='ignore'):
+                sums = np.add.reduceat(np.exp(ll - top[:, self.state_of]), self.starts, axis=1)
+            result[b:b + block] = top + np.log(sums)
+        return result
+
+    def frame_loglik(self, frames):
+        # likelihood of the best state for every frame
+        if len(frames) == 0:
+            return np.zeros(0)
+        return self.state_loglik(frames).max(axis=1)
+
+
+_scorer = None
+
+
+def _load_scorer(mmf_files):
+    global _scorer
+    _scorer = GMMScorer(MMF.read(*mmf_files))
+
+
+def _score(entries):
+    results = []
+    for entry in entries:
+        try:
+            frames = read_scp_entry(entry, _scorer.kind)
+            if frames.shape[1] != _scorer.vector_size:
+                raise ValueError("{0:d} coefficients, model has {1:d}".format(frames.shape[1], _scorer.vector_size))
+            ll = _scorer.frame_loglik(frames)
+            results.append((entry, len(frames), float(ll.mean()) if len(ll) > 0 else float('nan'), None))
+        except (IOError, ValueError) as e:
+            results.append((entry, 0, float('nan'), str(e)))
+    return results
+
+
+def score_scp(mmf_files, scp_file, num_processes=None, chunk_size=16):
+    # (entry, frames, mean frame log likelihood, error) for every line of scp_file, in order. Every worker reads the
+    # model once.
+    entries = [line.strip() for line in open(scp_file) if len(line.strip()) > 0]
+    chunks = [entries[i:i + chunk_size] for i in xrange(0, len(entries), chunk_size)]
+
+    pool = Pool(num_processes if num_processes is not None else cpu_count(), _load_scorer, (mmf_files,))
+    try:
+        for results in pool.imap(_score, chunks):
+            for result in results:
+                yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options] list.scp model.mmf [macros ...]"
+    parser = OptionParser(usage=usage)
+    parser.add_option('-p', dest='processes', type='int', default=None)
+    parser.add_option('-t', '--threshold', dest='threshold', type='float', default=None,
+                      help='only list utterances with a mean frame log likelihood below this (and failures)')
+    parser.add_option('--chunk-size', dest='chunk_size', type='int', default=16)
+
+    options, args = parser.parse_args()
+
+    if len(args) < 2:
+        parser.print_usage(file=sys.stderr)
+        sys.exit(1)
+
+    start = time.time()
+    num_files = num_frames = num_listed = 0
+    for entry, frames, loglik, error in score_scp(args[1:], args[0], options.processes, options.chunk_size):
+        num_files += 1
+        num_frames += frames
+        name = os.path.splitext(os.path.basename(logical_file(entry)))[0]
+        if error is not None:
+            print("{0:>s} FAILED {1:>s}".format(name, error))
+        elif options.threshold is None or not loglik >= options.threshold:
+            print("{0:>s} {1:d} {2:.4f}".format(name, frames, loglik))
+        else:
+            continue
+        num_listed += 1
+
+    seconds = time.time() - start
+    print("{0:d} files, {1:d} frames, {2:d} listed, {3:.1f}s ({4:.0f} frames/s)".format(
+        num_files, num_frames, num_listed, seconds, num_frames / seconds if seconds > 0 else 0), file=sys.stderr)
@@ -0,0 +1,30 @@
+# 'logical=physical[s,e]' scp lines
+import re
+
+
+def physical_file(scp_entry):
+    # 'logical=physical[s,e]' -> 'physical'
+    file = scp_entry.strip().split('=', 1)[-1]
+    if file.endswith(']') and '[' in file:
+        file = file[:file.rindex('[')]
+    return file
+
+
+def logical_file(scp_entry):
+    # 'logical=physical[s,e]' -> 'logical'; a plain entry is its own logical name
+    if '=' in scp_entry:
+        return scp_entry.strip().split('=', 1)[0]
+    return physical_file(scp_entry)
+
+
+def segment(scp_entry):
+    # 'logical=physical[s,e]' -> (s, e), both inclusive; None for a whole file
+    m = re.search(r'\[(\d+),(\d+)\]$', scp_entry.strip())
+    if m is None:
+        return None
+    return int(m.group(1)), int(m.group(2))
+
+
+def replace_physical(scp_entry, physical):
+    head, file, tail = scp_entry.strip().rpartition(physical_file(scp_entry))
+    return head + physical + tail
@@ -0,0 +1,138 @@
+#!/usr/bin/env python2.6
+from __future__ import print_function
+
+from multiprocessing import Pool, cpu_count
+from optparse import OptionParser
+import os
+import re
+import sys
+
+from htk2.feature_stats import FeatureStats, format_vector
+from htk2.param_file import ParamHeader, convert_features, kind_name, logical_file, parse_kind, physical_file, \
+    read_scp_entry, COMPRESSED, CRC
+from htk2.tools import htk_config
+
+MEANS = 1
+VARIANCES = 2
+
+
+def speaker_groups(files, num_speaker_chars):
+    # scp lines grouped by the first num_speaker_chars characters of the logical file name
+    groups = {}
+    for file in files:
+        speaker = os.path.basename(logical_file(file))[:num_speaker_chars]
+        groups.setdefault(speaker, []).append(file)
+    return groups
+
+
+def config_settings(config_files):
+    # settings of HTK configs by name ('HPARM: TARGETKIND = MFCC_0' -> 'TARGETKIND'), later files overriding earlier
+    settings = {}
+    for config_file in config_files:
+        for line in open(config_file):
+            m = re.match(r'^\s*(?:[A-Za-z]+\s*:\s*)?([A-Za-z]+)\s*=\s*(\S+)', line)
+            if m is not None:
+                settings[m.group(1).upper()] = m.group(2).strip('"\'')
+    return settings
+
+
+def _speaker_stats(args):
+    speaker, files, kind, target_kind, delta_window, acc_window = args
+    stats = None
+    for file in files:
+        frames = convert_features(read_scp_entry(file), kind, target_kind, delta_window, acc_window)
+        if stats is None:
+            stats = FeatureStats(frames.shape[1])
+        stats.add(frames)
+    return speaker, stats
+
+
+class SpeakerNormalisation(object):
+    # Does what running 'HCompV -c dir -k mask -q mv' once per speaker does: dir/cmn/<speaker> gets the mean and
+    # dir/cvn/<speaker> the variance of the speaker's features, and dir/globalvar the variance over all speakers.
+    # config_file() then gives the CMEANDIR/VARSCALEDIR entries that make every HTK tool apply them. HTK applies them
+    # to the features of its TARGETKIND, so the statistics are those of the features converted to the TARGETKIND of
+    # the htk_config configs (with their DELTAWINDOW and ACCWINDOW), or of the stored features if there is none.
+    def __init__(self, htk_config, scp_file, output_dir, num_speaker_chars=None, level=None):
+        self.output_dir = output_dir
+        self.num_speaker_chars = num_speaker_chars if num_speaker_chars is not None else htk_config.num_speaker_chars
+        self.level = level if level is not None else htk_config.speaker_normalisation
+        self.files = [f.strip() for f in open(scp_file) if len(f.strip()) > 0]
+        self.settings = config_settings(htk_config.turn_to_config('-C', htk_config.config_file)[1::2])
+
+        if self.num_speaker_chars < 1:
+            raise ValueError("Speaker normalisation needs num_speaker_chars")
+
+    def mask(self):
+        return "*/" + ('%' * self.num_speaker_chars) + "*.*"
+
+    def run(self, num_processes=None):
+        kind = ParamHeader.read(physical_file(self.files[0])).parm_kind & ~(COMPRESSED | CRC)
+        target_kind = parse_kind(self.settings['TARGETKIND']) & ~(COMPRESSED | CRC) if 'TARGETKIND' in self.settings \
+            else kind
+        delta_window = int(self.settings.get('DELTAWINDOW', 2))
+        acc_window = int(self.settings.get('ACCWINDOW', 2))
+        groups = speaker_groups(self.files, self.num_speaker_chars)
+        jobs = [(speaker, files, kind, target_kind, delta_window, acc_window) for speaker, files in groups.iteritems()]
+
+        for sub_dir in ('cmn', 'cvn'):
+            if not os.path.exists(os.path.join(self.output_dir, sub_dir)):
+                os.makedirs(os.path.join(self.output_dir, sub_dir))
+
+        pool = Pool(num_processes if num_processes is not None else cpu_count())
+        try:
+            total = None
+            for speaker, stats in pool.imap_unordered(_speaker_stats, jobs):
+                self._write(os.path.join(self.output_dir, 'cmn', speaker), kind_name(target_kind), 'MEAN', stats.mean)
+                self._write(os.path.join(self.output_dir, 'cvn', speaker), kind_name(target_kind), 'VARIANCE',
+                            stats.variance)
+                if total is None:
+                    total = FeatureStats(len(stats.mean))
+                total.merge(stats)
+        finally:
+            pool.close()
+            pool.join()
+
+        with open(os.path.join(self.output_dir, 'globalvar'), 'w') as var_desc:
+            print("<VARSCALE> {0:d}".format(len(total.variance)), file=var_desc)
+            print(format_vector(total.variance), file=var_desc)
+
+        return len(groups)
+
+    @staticmethod
+    def _write(file_name, kind, tag, vector):
+        with open(file_name, 'w') as norm_desc:
+            print("<CEPSNORM> <{0:>s}>".format(kind), file=norm_desc)
+            print("<{0:>s}> {1:d}".format(tag, len(vector)), file=norm_desc)
+            print(format_vector(vector), file=norm_desc)
+
+    def config_file(self):
+        config_file = os.path.join(self.output_dir, 'speaker_norm.config')
+        with open(config_file, 'w') as config_desc:
+            print("CMEANDIR = {0:>s}".format(os.path.join(self.output_dir, 'cmn')), file=config_desc)
+            print("CMEANMASK = {0:>s}".format(self.mask()), file=config_desc)
+            if self.level >= VARIANCES:
+                print("VARSCALEDIR = {0:>s}".format(os.path.join(self.output_dir, 'cvn')), file=config_desc)
+                print("VARSCALEMASK = {0:>s}".format(self.mask()), file=config_desc)
+                print("VARSCALEFN = {0:>s}".format(os.path.join(self.output_dir, 'globalvar')), file=config_desc)
+        return config_file
+
+
+if __name__ == "__main__":
+    usage = "usage: %prog [options] list.scp output_dir"
+    parser = OptionParser(usage=usage)
+    parser.add_option('-C', dest='config_files', action='append', default=[],
+                      help='HTK config whose TARGETKIND the statistics are computed for')
+    parser.add_option('-n', '--num-speaker-chars', dest='num_speaker_chars', type='int', default=3)
+    parser.add_option('--means-only', dest='level', action='store_const', const=MEANS, default=VARIANCES)
+    parser.add_option('-p', dest='processes', type='int', default=None)
+
+    options, args = parser.parse_args()
+
+    if len(args) != 2:
+        parser.print_usage(file=sys.stderr)
+        sys.exit(1)
+
+    norm = SpeakerNormalisation(htk_config(options.config_files), args[0], args[1], options.num_speaker_chars, options.level)
+    num_speakers = norm.run(options.processes)
+    print("{0:d} speakers, config in {1:>s}".format(num_speakers, norm.config_file()), file=sys.stderr)
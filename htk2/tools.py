@@ -1,10 +1,14 @@
+from __future__ import print_function
 from itertools import izip
 
+import hashlib
 import os
 import shutil
+import sys
 
 from gridscripts.remote_run import JobFailedException, System, SplittableJob,Task,BashJob
-from units import HTK_transcription, SCPFile
+from htk2.scp_entry import logical_file, physical_file
+from units import HTK_transcription, SCPFile, merge_mlfs
 
 __author__ = 'peter'
 
@@ -22,6 +26,7 @@ class htk_config(object):
         'max_pruning': (int,None),
         'num_speaker_chars': (int,-1),
         'min_variance': (float,0.05),       #HCompV
+        'native_flat_start': (int, 0),      #HCompV statistics computed in a process pool instead of by HCompV
         'tying_rules': (str,'/share/puhe/peter/rules/phonetic_rules._en'),  #tying
         'tying_threshold': (int, 1000),                                     #tying
         'required_occupation': (int, 200),                                  #tying
@@ -29,6 +34,11 @@ class htk_config(object):
         'ps_power': (float,None),           #training with variable number of mixtures
         'ps_iterations': (int, None),       #training with variable number of mixtures
         'split_threshold': (int, 1000),
+        'split_mode': (str, 'balanced'),    #round_robin, balanced or hashed (hashed reuses unchanged task outputs)
+        'binary_models': (int, 0),          #HERest and HHEd write the intermediate models as binary MMFs
+        'speaker_normalisation': (int, 0),  #per-speaker normalisation: 1 means (CMN), 2 means and variances (CVN)
+        'endpointing': (int, 0),            #recognition and adaptation lists trimmed to the speech found in C0 or energy
+        'endpoint_threshold': (float, 0.3), #endpointing
 
     }
 
@@ -73,6 +83,19 @@ class htk_config(object):
         else:
             return self.beam*2.0/3.0
 
+    def add_config_file(self, config_file):
+        # a new list every time, the caller's list is left alone
+        if self.config_file is None:
+            config_files = []
+        elif isinstance(self.config_file, basestring):
+            config_files = [self.config_file]
+        else:
+            config_files = list(self.config_file)
+
+        if config_file not in config_files:
+            config_files.append(config_file)
+        self.config_file = config_files[0] if len(config_files) == 1 else config_files
+
     def get_flags(self, extra_config_file = None):
         flags = []
         flags.extend(self.debug_flags)
@@ -98,11 +121,82 @@ class htk_config(object):
 
 
 
+class ShardCache(object):
+    # Keeps the output of every task under a key made of the task's scp contents and the job command, so an unchanged
+    # shard of a re-run job can be copied instead of recomputed. The key includes size and mtime of every file in the
+    # command, of every file under a directory in it (HTK_recognizer recreates its transform directories at the same
+    # path), of the files and directories named in the -C configs (CMEANDIR, VARSCALEDIR) and of the feature files.
+    def __init__(self, cache_dir, base_command):
+        self.cache_dir = os.path.join(cache_dir, 'shards')
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        h = hashlib.sha1()
+        for flag, arg in izip([None] + list(base_command), base_command):
+            h.update(str(arg) + '\0')
+            self._hash_path(h, str(arg))
+            if flag == '-C' and os.path.isfile(str(arg)):
+                for path in self._config_paths(str(arg)):
+                    h.update(path + '\0')
+                    self._hash_path(h, path)
+        self.command_key = h.hexdigest()
+
+    @staticmethod
+    def _hash_path(h, path):
+        if os.path.isfile(path):
+            st = os.stat(path)
+            h.update("%d %r\0" % (st.st_size, st.st_mtime))
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    st = os.stat(os.path.join(root, name))
+                    h.update("%s %d %r\0" % (os.path.join(root, name), st.st_size, st.st_mtime))
+
+    @staticmethod
+    def _config_paths(config_file):
+        # values of an HTK config that are existing files or directories
+        for line in open(config_file):
+            if '=' in line and not line.strip().startswith('#'):
+                value = line.split('=', 1)[1].strip().strip('"\'')
+                if len(value) > 0 and os.path.exists(value):
+                    yield value
+
+    @classmethod
+    def for_job(cls, htk_config, base_command):
+        cache_dir = System.get_cache_dir()
+        if htk_config.split_mode != 'hashed' or cache_dir is None:
+            return None
+        return cls(cache_dir, base_command)
+
+    def _cache_file(self, scp_file):
+        h = hashlib.sha1(self.command_key)
+        with open(scp_file) as scp_desc:
+            h.update(scp_desc.read())
+        features = set(physical_file(line) for line in open(scp_file) if len(line.strip()) > 0)
+        for file in sorted(features):
+            self._hash_path(h, file)
+        return os.path.join(self.cache_dir, h.hexdigest())
+
+    def fetch(self, scp_file, output_file):
+        cache_file = self._cache_file(scp_file)
+        if not os.path.exists(cache_file):
+            return False
+        shutil.copyfile(cache_file, output_file)
+        return True
+
+    def store(self, scp_file, output_file):
+        cache_file = self._cache_file(scp_file)
+        tmp_file = "%s.%d.tmp" % (cache_file, os.getpid())
+        shutil.copyfile(output_file, tmp_file)
+        os.rename(tmp_file, cache_file)
+
+
 class HERest(SplittableJob):
     def __init__(self, htk_config, scp_file, hmm_model, hmm_list, input_mlf, config_file = None, input_adaptation = None,
                  parent_adaptation = None, output_adaptation = None, output_hmm_model=None, pruning = None,
                  prune_threshold = None, num_speaker_chars=None, min_examples=None, mix_weight_floor=None, max_adap_sentences = None,
-                stats= None):
+                stats= None, binary=False):
         super(HERest,self).__init__()
 
         base_command = ["HERest"]
@@ -115,6 +209,8 @@ class HERest(SplittableJob):
         # Output dependent flags
         if output_hmm_model is not None:
             base_command.extend(htk_config.turn_to_config('-M', self.acc_tmp_dir))
+            if binary:
+                base_command.append('-B')
 
             #base_command.extend(htk_config.turn_to_config('-M', os.path.dirname(output_hmm_model)))
 
@@ -181,11 +277,13 @@ class HERest(SplittableJob):
         self.scp_file = scp_file
         self.num_speaker_chars = num_speaker_chars
         self.stats = stats
+        self.split_mode = SCPFile.modes[htk_config.split_mode]
 
     def _split_to_tasks(self):
         self.scp_tmp_dir = System.get_global_temp_dir()
         scp_files = SCPFile(self.scp_file).split(self.max_num_tasks,self.scp_tmp_dir,
-                                                 self.num_speaker_chars if self.num_speaker_chars is not None else -1)
+                                                 self.num_speaker_chars if self.num_speaker_chars is not None else -1,
+                                                 self.split_mode)
 
         for i, scp_file in enumerate(scp_files):
             self.tasks.append(HERestTask(self,i+1,scp_file))
@@ -261,7 +359,7 @@ class HERestTask(Task,BashJob):
         if self.parent.output_adaptation is None:
             return []
 
-        speakers = set(os.path.basename(s)[:self.parent.num_speaker_chars] for s in open(self.scp_file))
+        speakers = set(os.path.basename(logical_file(s))[:self.parent.num_speaker_chars] for s in open(self.scp_file))
         output_dir, output_extension = self.parent.output_adaptation
 
         return [os.path.join(output_dir, s + '.'+ output_extension) for s in speakers]
@@ -327,11 +425,15 @@ class HDecode(SplittableJob):
 
         self.htk_config = htk_config
 
+        # lattices are written next to the output mlf by HDecode itself and can not be restored from the cache
+        self.shard_cache = ShardCache.for_job(htk_config, base_command) if lattice_extension is None else None
+
 
 
     def _split_to_tasks(self):
         self.tmp_dir = System.get_global_temp_dir()
-        scp_files = SCPFile(self.scp_file).split(self.max_num_tasks,self.tmp_dir, -1)
+        scp_files = SCPFile(self.scp_file).split(self.max_num_tasks,self.tmp_dir, -1, SCPFile.modes[self.htk_config.split_mode],
+                                                 keep_order=True)
 #                                                 self.num_speaker_chars if self.num_speaker_chars is not None else -1)
 
         mlf_files = [scp_file + '.mlf' for scp_file in scp_files]
@@ -346,12 +448,13 @@ class HDecode(SplittableJob):
         if not all(task._test_success() for task in self.tasks):
             raise JobFailedException
 
-        tr = HTK_transcription()
-        for task in self.tasks:
-            tr.read_mlf(task.output_mlf,target=HTK_transcription.WORD)
-
-        tr.write_mlf(self.output_mlf,target=HTK_transcription.WORD)
-        tr.write_trn(os.path.splitext(self.output_mlf)[0] + '.trn',speaker_name_width=self.trn_speaker_chars if self.trn_speaker_chars > 0 else self.htk_config.num_speaker_chars)
+        missing = merge_mlfs(self.scp_file, [task.output_mlf for task in self.tasks], self.output_mlf,
+                             target=HTK_transcription.WORD, trn_file=os.path.splitext(self.output_mlf)[0] + '.trn',
+                             speaker_name_width=self.trn_speaker_chars if self.trn_speaker_chars > 0 else self.htk_config.num_speaker_chars,
+                             manifest_file=self.output_mlf + '.manifest')
+        if len(missing) > 0:
+            print("HDecode produced no output for {0:d} utterances: {1:>s}".format(len(missing), " ".join(missing)), file=sys.stderr)
+            raise JobFailedException
 
         if self.cleaning:
             for task in self.tasks:
@@ -374,8 +477,19 @@ class HDecodeTask(Task,BashJob):
             os.remove(self.scp_file)
         os.remove(self.output_mlf)
 
+    def _run(self):
+        cache = self.parent.shard_cache
+        if cache is not None and cache.fetch(self.scp_file, self.output_mlf):
+            return
+
+        super(HDecodeTask,self)._run()
+
+        if cache is not None and self._test_success():
+            cache.store(self.scp_file, self.output_mlf)
+
     def _test_success(self):
-        return os.path.exists(self.output_mlf) and len([a for a in open(self.output_mlf) if a.startswith('"/')]) >= len([a for a in open(self.scp_file)])
+        # completeness is checked per utterance while merging
+        return os.path.exists(self.output_mlf)
 
 
 class HVite(SplittableJob):
@@ -424,10 +538,12 @@ class HVite(SplittableJob):
         self.scp_file = scp_file
         self.output_mlf = output_transcriptions
         self.base_command = base_command
+        self.shard_cache = ShardCache.for_job(htk_config, base_command)
 
     def _split_to_tasks(self):
         self.tmp_dir = System.get_global_temp_dir()
-        scp_files = SCPFile(self.scp_file).split(self.max_num_tasks,self.tmp_dir, -1)
+        scp_files = SCPFile(self.scp_file).split(self.max_num_tasks,self.tmp_dir, -1, SCPFile.modes[self.htk_config.split_mode],
+                                                 keep_order=True)
 
         mlf_files = [scp_file + '.mlf' for scp_file in scp_files]
 
@@ -440,11 +556,11 @@ class HVite(SplittableJob):
         if not all(task._test_success() for task in self.tasks):
             raise JobFailedException
 
-        tr = HTK_transcription()
-        for task in self.tasks:
-            tr.read_mlf(task.output_mlf)
-
-        tr.write_mlf(self.output_mlf)
+        missing = merge_mlfs(self.scp_file, [task.output_mlf for task in self.tasks], self.output_mlf,
+                             manifest_file=self.output_mlf + '.manifest')
+        if len(missing) > 0:
+            print("HVite produced no output for {0:d} utterances: {1:>s}".format(len(missing), " ".join(missing)), file=sys.stderr)
+            raise JobFailedException
         
         if self.cleaning:
             for task in self.tasks:
@@ -468,8 +584,19 @@ class HViteTask(Task,BashJob):
             os.remove(self.scp_file)
         os.remove(self.output_mlf)
 
+    def _run(self):
+        cache = self.parent.shard_cache
+        if cache is not None and cache.fetch(self.scp_file, self.output_mlf):
+            return
+
+        super(HViteTask,self)._run()
+
+        if cache is not None and self._test_success():
+            cache.store(self.scp_file, self.output_mlf)
+
     def _test_success(self):
-        return os.path.exists(self.output_mlf) and len([a for a in open(self.output_mlf) if a.startswith('"')]) == len([a for a in open(self.scp_file)])
+        # completeness is checked per utterance while merging
+        return os.path.exists(self.output_mlf)
 
 
     
@@ -14,6 +14,8 @@ parser = OptionParser(usage=usage)
 parser.add_option('-c', '--config', dest="config")
 parser.add_option('--no-local', dest='local_allowed', default=True, action="store_false")
 parser.add_option('--no-cleaning', dest='cleaning', default=True, action="store_false")
+parser.add_option('--feature-config', dest='feature_config', default=None,
+                  help='HTK config for the stored features, e.g. the config.train of create_mfccs.py --static-only')
 htk_config = htk_config(debug_flags=['-A','-V','-D','-T','1'])
 htk_config.add_options_to_optparse(parser)
 
@@ -22,6 +24,8 @@ options, args = parser.parse_args()
 if options.config is not None:
     htk_config.load_config_vals(options.config)
 htk_config.load_object_vals(options)
+if options.feature_config is not None:
+    htk_config.add_config_file(os.path.abspath(options.feature_config))
 
 
 
@@ -81,6 +85,9 @@ if htk_config.ps_power is not None and htk_config.ps_iterations is not None:
 
     for _ in xrange(2): model.re_estimate(stats=True)
 
+if htk_config.binary_models:
+    model.export_text()
+
 model.clean_files_local()
 if options.cleaning:
     model.clean_up()
@@ -1,57 +1,136 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+from array import array
+import bisect
+import collections
+import hashlib
+import heapq
+from itertools import izip
+import mmap
+from multiprocessing.pool import ThreadPool
 import os
 import re
 import sys
 
+from gridscripts.remote_run import System
+from htk2.dict_cache import cached_dictionary
+from htk2.external_sort import sorted_records
+from htk2.param_header import ParamHeader
+from htk2.scp_entry import logical_file, physical_file, segment
+
 
 class HTK_dictionary(object):
     fixed_values = {'<s>':set(['sil']), '</s>':set(['sil'])}
+    use_cache = True
 
     def __init__(self):
-        self.dictionary = {}
+        self._dictionary = {}
+        self._compiled = []
+        self._escaped = {}
+        self._index = None
         self.unquoted_list = None
 
+    @property
+    def dictionary(self):
+        # compiled dictionaries are only merged in when the full word -> transcriptions mapping is needed
+        while len(self._compiled) > 0:
+            for word, escaped, transcriptions in self._compiled.pop(0).entries():
+                self._escaped[word] = escaped
+                if word not in self._dictionary:
+                    self._dictionary[word] = transcriptions
+                else:
+                    self._dictionary[word].update(transcriptions)
+        return self._dictionary
+
     def write_dict(self,file_name,hvite=True):
         self.dictionary.update(self.fixed_values)
 
         with open(file_name,'w') as file_desc:
             for word in sorted(self.dictionary.iterkeys()):
-                for transcription in self.dictionary[word]:
+                escaped = self._escape_cached(word)
+                for transcription in sorted(self.dictionary[word]):
                     if word.startswith('<'):
                         print("{0:s}\t{1:s}".format(word,transcription),file=file_desc)
                     elif hvite:
-                        print("{0:s}\t{1:s} sp".format(self._escape(word)," ".join(transcription)),file=file_desc)
-                        print("{0:s}\t{1:s} sil".format(self._escape(word)," ".join(transcription)),file=file_desc)
+                        print("{0:s}\t{1:s} sp".format(escaped," ".join(transcription)),file=file_desc)
+                        print("{0:s}\t{1:s} sil".format(escaped," ".join(transcription)),file=file_desc)
                     else:
-                        print("{0:s}\t{1:s}".format(self._escape(word)," ".join(transcription)),file=file_desc)
+                        print("{0:s}\t{1:s}".format(escaped," ".join(transcription)),file=file_desc)
 
     def read_dict(self,file_name):
+        cache_dir = System.get_cache_dir() if self.use_cache else None
+        if cache_dir is not None:
+            self._compiled.append(cached_dictionary(file_name, cache_dir, self._parse_dict, self._escape))
+        else:
+            self._read_dict_text(file_name)
+        self.unquoted_list = None
+        self._index = None
+
+    def _read_dict_text(self,file_name):
         for line in open(file_name):
             parts = line.split()
             self._add_transcription(self._unescape(parts[0]),parts[1:])
+
+    @classmethod
+    def _parse_dict(cls,file_name):
+        d = cls()
+        d._read_dict_text(file_name)
+        return d.dictionary
+
+    def update(self,other):
+        self._compiled.extend(other._compiled)
+        for word, transcriptions in other._dictionary.iteritems():
+            if word not in self._dictionary:
+                self._dictionary[word] = set()
+            self._dictionary[word].update(transcriptions)
+        self._escaped.update(other._escaped)
         self.unquoted_list = None
+        self._index = None
 
     def word_in_dict(self,word):
+        return word in self.known_words()
+
+    def known_words(self):
         if self.unquoted_list is None:
-            self.unquoted_list = set(self._escape(s) for s in self.dictionary.iterkeys())
+            self.unquoted_list = set(self._escape_cached(s) for s in self._dictionary.iterkeys())
+            for c in self._compiled:
+                self.unquoted_list.update(c.escaped)
             for k in self.fixed_values.iterkeys():
                 self.unquoted_list.add(k)
 
-        return word in self.unquoted_list
+        return self.unquoted_list
+
+    def get_index(self):
+        if self._index is None:
+            self._index = PronunciationIndex(self)
+        return self._index
 
+    def oov_words(self,words):
+        return set(words) - self.known_words()
 
+    def filter_sentences(self,sentences,batch_size=100000):
+        return self.get_index().filter_sentences(sentences, batch_size)
 
     def get_phones(self):
         phones = set()
-        for word in self.dictionary.iterkeys():
-            for trans in self.dictionary[word]:
+        for c in self._compiled:
+            phones.update(c.phones)
+        for word in self._dictionary.iterkeys():
+            for trans in self._dictionary[word]:
                 for t in trans:
                     phones.add(t)
         return phones
 
+    def _escape_cached(self,word):
+        try:
+            return self._escaped[word]
+        except KeyError:
+            self._escaped[word] = self._escape(word)
+            return self._escaped[word]
+
     def _add_transcription(self,word,transcription):
+        self._index = None
         try:
             if word not in self.dictionary:
                 self.dictionary[word] = set()
@@ -74,13 +153,73 @@ class HTK_dictionary(object):
         else: return word
 
 
+class PronunciationIndex(object):
+    # Lookup structures over the escaped words of a dictionary, built once:
+    #  - words: the sorted word list, a flattened trie in which every prefix owns a contiguous range of word ids
+    #  - phone_words: phone -> sorted array of ids of the words that use the phone in any pronunciation
+    #  - phones: the phone set
+    def __init__(self, dictionary):
+        # every dictionary word; the fixed sentence boundaries (kept as plain 'sil' strings) are added to the vocabulary
+        entries = sorted((dictionary._escape_cached(w), t) for w, t in dictionary.dictionary.iteritems()
+                         if w not in dictionary.fixed_values)
+        self.words = [w for w, _ in entries]
+        self.vocabulary = frozenset(self.words) | frozenset(dictionary.fixed_values)
+
+        phone_words = {}
+        for word_id, (_, transcriptions) in enumerate(entries):
+            for phone in set(p for t in transcriptions for p in t):
+                if phone not in phone_words:
+                    phone_words[phone] = array('i')
+                phone_words[phone].append(word_id)
+        self.phone_words = phone_words
+        self.phones = frozenset(phone_words)
+
+    def prefix_range(self, prefix):
+        begin = bisect.bisect_left(self.words, prefix)
+
+        # the first string after all strings that start with prefix
+        successor = prefix.rstrip('\xff')
+        if len(successor) == 0:
+            return begin, len(self.words)
+        successor = successor[:-1] + chr(ord(successor[-1]) + 1)
+        return begin, bisect.bisect_left(self.words, successor, begin)
+
+    def has_prefix(self, prefix):
+        begin, end = self.prefix_range(prefix)
+        return end > begin
+
+    def words_with_prefix(self, prefix):
+        begin, end = self.prefix_range(prefix)
+        return self.words[begin:end]
+
+    def words_with_phone(self, phone):
+        return [self.words[i] for i in self.phone_words.get(phone, [])]
+
+    def filter_sentences(self, sentences, batch_size=100000):
+        # Yields (sentence, oov words) for every sentence. Each batch is checked against the vocabulary with a single
+        # set difference, after which every sentence only needs a test against the (small) oov set of its batch.
+        sentences = iter(sentences)
+        while True:
+            batch = [s for _, s in izip(xrange(batch_size), sentences)]
+            if len(batch) == 0: break
+
+            tokens = [s.split() for s in batch]
+            oov = set().union(*tokens) - self.vocabulary
+            for sentence, words in izip(batch, tokens):
+                if oov.isdisjoint(words):
+                    yield sentence, ()
+                else:
+                    yield sentence, [w for w in words if w in oov]
+
+
 class HTK_transcription(object):
     WORD = 0
     PHONE = 1
     STATE = 2
 
-    def __init__(self):
+    def __init__(self, compact=False):
         self.transcriptions = {}
+        self.symbols = SymbolTable() if compact else None
 
 
 #    def expand_words_to_phones(self,model,use_sp,use_triphones):
@@ -96,42 +235,23 @@ class HTK_transcription(object):
 
 
     def read_mlf(self, mlf_file, target=PHONE):
-        cur_file_name = None
-        cur_transcription = []
-
         if target not in self.transcriptions:
-            self.transcriptions[target] = {}
-
-        for line in open(mlf_file):
-            if line.startswith("#"): continue
-            elif line.startswith("\"") and len(line) > 1 and line[1] in "/*":
-                cur_file_name = os.path.splitext(os.path.basename(line.strip()[1:-1]))[0]
-                cur_transcription = []
-            elif line.startswith("."):
-                self.transcriptions[target][cur_file_name] = cur_transcription
-            else:
-                if target < HTK_transcription.STATE:
-                    cur_transcription.append(line.split()[0])
-                else:
-                    start,end,state = line.split()[:3]
-                    cur_transcription.append((int(start),int(end),state))
+            self.transcriptions[target] = self._new_store(target)
 
-    def write_mlf(self, mlf_file, target=PHONE, extension="lab"):
-        with open(mlf_file, 'w') as mlf_desc:
-            print("#!MLF!#",file=mlf_desc)
+        for file_name, transcription in iter_mlf(mlf_file, target):
+            self.transcriptions[target][file_name] = transcription
 
-            for file_name in self.transcriptions[target].iterkeys():
-                print("\"*/{0:>s}.{1:>s}\"".format(file_name,extension),file=mlf_desc)
+    def open_mlf(self, mlf_file, target=PHONE):
+        self.transcriptions[target] = IndexedMLF(mlf_file, target)
 
-                for part in self.transcriptions[target][file_name]:
-                    print(part,file=mlf_desc)
-                print(".",file=mlf_desc)
+    def write_mlf(self, mlf_file, target=PHONE, extension="lab"):
+        write_mlf_iter(mlf_file, self.transcriptions[target].iteritems(), target, extension)
 
     def read_trn(self, trn_file):
         target = HTK_transcription.WORD
 
         if target not in self.transcriptions:
-            self.transcriptions[target] = {}
+            self.transcriptions[target] = self._new_store(target)
 
         for line in open(trn_file):
             parts = line.split()
@@ -141,38 +261,431 @@ class HTK_transcription(object):
         target = HTK_transcription.WORD
 
         with open(trn_file, 'w') as trn_desc:
-            for file_name in sorted(self.transcriptions[target].iterkeys()):
+            for file_name in sorted_records(self.transcriptions[target].iterkeys()):
                 disp_name = file_name
                 if speaker_name_width > 0:
                     disp_name = file_name[:speaker_name_width] + '_' + file_name[speaker_name_width:]
                 print("{0:>s} ({1:>s})".format(" ".join(t for t in self.transcriptions[target][file_name] if not t.startswith('<')), disp_name), file=trn_desc)
 
+    def _new_store(self, target):
+        if self.symbols is None:
+            return {}
+        return CompactTranscriptions(self.symbols, target)
+
+
+class SymbolTable(object):
+    def __init__(self):
+        self.symbols = []
+        self.ids = {}
+
+    def add(self, symbol):
+        try:
+            return self.ids[symbol]
+        except KeyError:
+            self.ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            return self.ids[symbol]
+
+    def __getitem__(self, id):
+        return self.symbols[id]
+
+    def __contains__(self, symbol):
+        return symbol in self.ids
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+class CompactTranscriptions(collections.MutableMapping):
+    # Dict-like store that keeps all labels of all utterances in flat arrays of symbol ids. Utterance i owns
+    # labels[offsets[i]:offsets[i+1]]; for STATE targets starts and ends run parallel to labels. Overwriting or
+    # deleting an utterance only updates the index, the old labels stay in the arrays.
+    def __init__(self, symbols, target=HTK_transcription.WORD):
+        self.symbols = symbols
+        self.target = target
+
+        self.index = {}
+        self.offsets = array('l', [0])
+        self.labels = array('i')
+        self.starts = array('l')
+        self.ends = array('l')
+
+    def __getitem__(self, file_name):
+        i = self.index[file_name]
+        begin, end = self.offsets[i], self.offsets[i+1]
+
+        if self.target < HTK_transcription.STATE:
+            return [self.symbols[l] for l in self.labels[begin:end]]
+        else:
+            return [(self.starts[j], self.ends[j], self.symbols[self.labels[j]]) for j in xrange(begin, end)]
+
+    def __setitem__(self, file_name, transcription):
+        if self.target < HTK_transcription.STATE:
+            self.labels.extend(self.symbols.add(l) for l in transcription)
+        else:
+            for start, end, state in transcription:
+                self.starts.append(start)
+                self.ends.append(end)
+                self.labels.append(self.symbols.add(state))
+
+        self.index[file_name] = len(self.offsets) - 1
+        self.offsets.append(len(self.labels))
+
+    def __delitem__(self, file_name):
+        del self.index[file_name]
+
+    def __contains__(self, file_name):
+        return file_name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+def iter_mlf(mlf_file, target=HTK_transcription.PHONE):
+    cur_file_name = None
+    cur_transcription = []
+
+    for line in open(mlf_file):
+        if line.startswith("#"): continue
+        elif line.startswith("\"") and len(line) > 1 and line[1] in "/*":
+            cur_file_name = os.path.splitext(os.path.basename(line.strip()[1:-1]))[0]
+            cur_transcription = []
+        elif line.startswith("."):
+            yield cur_file_name, cur_transcription
+        else:
+            cur_transcription.append(_parse_label(line, target))
+
+
+def _parse_label(line, target):
+    if target < HTK_transcription.STATE:
+        return line.split()[0]
+    else:
+        start,end,state = line.split()[:3]
+        return int(start),int(end),state
+
+
+def write_mlf_iter(mlf_file, transcriptions, target=HTK_transcription.PHONE, extension="lab"):
+    with open(mlf_file, 'w') as mlf_desc:
+        print("#!MLF!#",file=mlf_desc)
+
+        for file_name, transcription in transcriptions:
+            print("\"*/{0:>s}.{1:>s}\"".format(file_name,extension),file=mlf_desc)
+
+            for part in transcription:
+                if target < HTK_transcription.STATE:
+                    print(part,file=mlf_desc)
+                else:
+                    print("{0:d} {1:d} {2:>s}".format(*part),file=mlf_desc)
+            print(".",file=mlf_desc)
+
+
+def merge_mlfs(scp_file, mlf_files, output_mlf, target=HTK_transcription.PHONE, trn_file=None, speaker_name_width=-1,
+               manifest_file=None):
+    # Merges task MLFs whose entries are each in the order of scp_file into one MLF (and trn) in that order, keeping
+    # only the current entry of every input in memory. Returns the utterances of scp_file that none of the inputs had.
+    iters = [iter_mlf(mlf_file, target) for mlf_file in mlf_files]
+    heads = {}
+
+    def advance(i):
+        for file_name, transcription in iters[i]:
+            heads[file_name] = (i, transcription)
+            return
+
+    for i in xrange(len(iters)):
+        advance(i)
+
+    missing = []
+    trn_desc = open(trn_file, 'w') if trn_file is not None else None
+    manifest_desc = open(manifest_file, 'w') if manifest_file is not None else None
+
+    def merged():
+        for line in open(scp_file):
+            line = line.strip()
+            if len(line) == 0: continue
+            file_name = os.path.splitext(os.path.basename(line.split('=')[0]))[0]
+
+            if file_name not in heads:
+                missing.append(file_name)
+                if manifest_desc is not None:
+                    print("{0:>s} missing".format(file_name), file=manifest_desc)
+                continue
+
+            i, transcription = heads.pop(file_name)
+            advance(i)
+
+            if manifest_desc is not None:
+                print("{0:>s} {1:d}".format(file_name, i + 1), file=manifest_desc)
+            if trn_desc is not None:
+                disp_name = file_name
+                if speaker_name_width > 0:
+                    disp_name = file_name[:speaker_name_width] + '_' + file_name[speaker_name_width:]
+                print("{0:>s} ({1:>s})".format(" ".join(t for t in transcription if not t.startswith('<')), disp_name), file=trn_desc)
+
+            yield file_name, transcription
+
+    try:
+        write_mlf_iter(output_mlf, merged(), target)
+    finally:
+        if trn_desc is not None: trn_desc.close()
+        if manifest_desc is not None: manifest_desc.close()
+
+    return missing
+
+
+class MLFIndex(object):
+    # Maps utterance ids to the byte offset and length of their entry (header line up to and including the closing
+    # '.') in an MLF. The index is stored next to the MLF and rebuilt when the size or the full precision mtime of the
+    # MLF changes.
+    extension = '.idx'
+
+    def __init__(self, mlf_file):
+        self.mlf_file = mlf_file
+        self.index_file = mlf_file + self.extension
+        self.entries = {}
+
+        stat = os.stat(mlf_file)
+        self.signature = "{0:d} {1!r}".format(stat.st_size, stat.st_mtime)
+
+        if not self._load():
+            self._build()
+            self._save()
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return False
+
+        with open(self.index_file) as index_desc:
+            if index_desc.readline().strip() != self.signature:
+                return False
+            for line in index_desc:
+                file_name, offset, length = line.split()
+                self.entries[file_name] = (int(offset), int(length))
+        return True
+
+    def _build(self):
+        offset = 0
+        cur_file_name = None
+        cur_offset = 0
+
+        with open(self.mlf_file, 'rb') as mlf_desc:
+            for line in mlf_desc:
+                if line.startswith("\"") and len(line) > 1 and line[1] in "/*":
+                    cur_file_name = os.path.splitext(os.path.basename(line.strip()[1:-1]))[0]
+                    cur_offset = offset
+                elif line.startswith(".") and cur_file_name is not None:
+                    self.entries[cur_file_name] = (cur_offset, offset + len(line) - cur_offset)
+                    cur_file_name = None
+                offset += len(line)
+
+    def _save(self):
+        # written next to the index and renamed, so an interrupted write never leaves a truncated index behind
+        tmp_file = "{0:>s}.{1:d}.tmp".format(self.index_file, os.getpid())
+        try:
+            with open(tmp_file, 'w') as index_desc:
+                print(self.signature, file=index_desc)
+                for file_name, entry in self.entries.iteritems():
+                    print("{0:>s} {1:d} {2:d}".format(file_name, entry[0], entry[1]), file=index_desc)
+            os.rename(tmp_file, self.index_file)
+        except (IOError, OSError):
+            # read-only location, keep the index in memory only
+            pass
+
+
+class IndexedMLF(collections.Mapping):
+    # Read-only, dict-like view on an MLF that decodes a single utterance from a memory map on every lookup
+    def __init__(self, mlf_file, target=HTK_transcription.PHONE):
+        self.target = target
+        self.index = MLFIndex(mlf_file)
+
+        with open(mlf_file, 'rb') as mlf_desc:
+            self.map = mmap.mmap(mlf_desc.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(mlf_desc.fileno()).st_size > 0 else ''
+
+    def __getitem__(self, file_name):
+        offset, length = self.index.entries[file_name]
+        lines = self.map[offset:offset+length].splitlines()
+        return [_parse_label(line, self.target) for line in lines[1:-1] if not line.startswith("#")]
+
+    def __contains__(self, file_name):
+        return file_name in self.index.entries
+
+    def __iter__(self):
+        return iter(self.index.entries)
+
+    def __len__(self):
+        return len(self.index.entries)
+
 
 class SCPFile(object):
+    ROUND_ROBIN = 0
+    BALANCED = 1
+    HASHED = 2
+
+    modes = {'round_robin': ROUND_ROBIN, 'balanced': BALANCED, 'hashed': HASHED}
+
+    num_scan_threads = 16
+    index_version = '#!NSAMPLES 2'
+
     def __init__(self,file):
         self.file = file
 
-    def split(self,num_parts,dir,prefix_length=-1):
-        parts = []
-        for i in xrange(num_parts): parts.append([])
+    def split(self,num_parts,dir,prefix_length=-1,mode=ROUND_ROBIN,keep_order=False):
+        # Every part is sorted, which keeps the utterances of a speaker together, unless keep_order is set: then the
+        # parts keep the order of the original list, so that task outputs can be merged back in that order.
+        if mode == SCPFile.HASHED:
+            return self._split_hashed(num_parts,dir,prefix_length,keep_order)
+
+        # groups are formed on the sorted list, which is sorted externally if it is too big for memory. Only the
+        # group of every line and the weight of every group are kept in memory.
+        num_samples = self.num_samples() if mode == SCPFile.BALANCED else None
+
+        group_of = array('i', [0]) * sum(1 for _ in self._entries())
+        weights = array('l')
+        prev_file = None
+
+        for record in sorted_records("{0:>s}\t{1:d}".format(file, i) for i, file in enumerate(self._entries())):
+            file, _, i = record.rpartition('\t')
+            name = os.path.basename(logical_file(file))
+            if prefix_length < 0 or prev_file is None or name[:prefix_length] != prev_file[:prefix_length]:
+                weights.append(0)
+            weights[-1] += num_samples[file] if num_samples is not None else 1
+            group_of[int(i)] = len(weights) - 1
+            prev_file = name
+
+        part_of_group = array('i', [0]) * len(weights)
+        if mode == SCPFile.BALANCED:
+            # longest processing time first: hand the longest remaining group to the part with the least frames
+            loads = [(0, i) for i in xrange(num_parts)]
+            for weight, g in sorted(((w, g) for g, w in enumerate(weights)), reverse=True):
+                load, i = heapq.heappop(loads)
+                part_of_group[g] = i
+                heapq.heappush(loads, (load + weight, i))
+        else:
+            for g in xrange(len(weights)):
+                part_of_group[g] = g % num_parts
+
+        used_parts = dict((part, i) for i, part in enumerate(sorted(set(part_of_group))))
+
+        scp_files = [os.path.join(dir, 'scp.%d'% (i+1)) for i in xrange(len(used_parts))]
+        scp_descs = [open(scp_file, 'w') for scp_file in scp_files]
+        try:
+            for i, file in enumerate(self._entries()):
+                print(file, file=scp_descs[used_parts[part_of_group[group_of[i]]]])
+        finally:
+            for scp_desc in scp_descs:
+                scp_desc.close()
+
+        if not keep_order:
+            self._sort_parts(scp_files)
+        return scp_files
+
+    @staticmethod
+    def _sort_parts(scp_files):
+        for scp_file in scp_files:
+            sorted_file = scp_file + '.sorted'
+            with open(sorted_file, 'w') as scp_desc:
+                for file in sorted_records(line.strip() for line in open(scp_file)):
+                    print(file, file=scp_desc)
+            os.rename(sorted_file, scp_file)
+
+    def _entries(self):
+        for file in open(self.file):
+            file = file.strip()
+            if len(file) > 0:
+                yield file
+
+    def _split_hashed(self,num_parts,dir,prefix_length,keep_order):
+        # Every utterance (or speaker, if prefix_length > 0) always goes to the same part, independent of the rest of
+        # the list, so unchanged parts of a modified list keep their exact contents.
+        scp_files = [os.path.join(dir, 'scp.%d'% (i+1)) for i in xrange(num_parts)]
+        sizes = [0] * num_parts
+
+        scp_descs = [open(scp_file, 'w') for scp_file in scp_files]
+        try:
+            for file in open(self.file):
+                file = file.strip()
+                if len(file) == 0: continue
 
-        prev_file = ""
-        cur_index = -1
+                if prefix_length > 0:
+                    key = os.path.basename(logical_file(file))[:prefix_length]
+                else:
+                    key = os.path.splitext(os.path.basename(logical_file(file)))[0]
 
-        for file in sorted(f.strip() for f in open(self.file)):
-            if prefix_length < 0 or os.path.basename(file)[:prefix_length] != prev_file[:prefix_length]:
-                cur_index = (cur_index + 1) % len(parts)
-            parts[cur_index].append(file)
-            prev_file = os.path.basename(file)
+                i = _jump_hash(int(hashlib.md5(key).hexdigest()[:16], 16), num_parts)
+                print(file, file=scp_descs[i])
+                sizes[i] += 1
+        finally:
+            for scp_desc in scp_descs:
+                scp_desc.close()
 
-        scp_files = []
         for i in xrange(num_parts):
-            if len(parts[i]) > 0:
-                scp_file = 'scp.%d'% (i+1)
-                with open(os.path.join(dir, scp_file), 'w') as scp_desc:
-                    for file in parts[i]:
-                        print(file, file=scp_desc)
-                scp_files.append(os.path.join(dir, scp_file))
-            else:
-                break
+            if sizes[i] == 0:
+                os.remove(scp_files[i])
+        scp_files = [scp_files[i] for i in xrange(num_parts) if sizes[i] > 0]
+
+        if not keep_order:
+            self._sort_parts(scp_files)
         return scp_files
+
+    def num_samples(self):
+        # Frames of every file in the list, cached next to the scp together with the mtime of every feature file, so
+        # that only files that are new or were regenerated since the last call have their header read again
+        index_file = self.file + '.nsamples'
+
+        cached = {}
+        if os.path.exists(index_file):
+            with open(index_file) as index_desc:
+                if index_desc.readline().strip() == self.index_version:
+                    for line in index_desc:
+                        n, mtime, file = line.rstrip('\n').split(' ', 2)
+                        cached[file] = (int(n), mtime)
+
+        files = sorted(set(self._entries()))
+        pool = ThreadPool(self.num_scan_threads)
+        try:
+            counts = pool.map(lambda file: self._cached_num_samples(file, cached.get(file)), files)
+        finally:
+            pool.close()
+            pool.join()
+
+        try:
+            tmp_file = "{0:>s}.{1:d}.tmp".format(index_file, os.getpid())
+            with open(tmp_file, 'w') as index_desc:
+                print(self.index_version, file=index_desc)
+                for file, (n, mtime) in izip(files, counts):
+                    print("{0:d} {1:>s} {2:>s}".format(n, mtime, file), file=index_desc)
+            os.rename(tmp_file, index_file)
+        except (IOError, OSError):
+            pass
+        return dict((file, n) for file, (n, _) in izip(files, counts))
+
+    @classmethod
+    def _cached_num_samples(cls,file,cached):
+        # (frames, mtime of the feature file); segments are counted from the scp line and need no mtime
+        if segment(file) is not None:
+            return cls.read_num_samples(file), '-'
+        mtime = repr(os.stat(physical_file(file)).st_mtime)
+        if cached is not None and cached[1] == mtime:
+            return cached
+        return cls.read_num_samples(file), mtime
+
+    @classmethod
+    def read_num_samples(cls,file):
+        # segments of an archive are counted from the scp line, without touching the archive
+        frames = segment(file)
+        if frames is not None:
+            return frames[1] - frames[0] + 1
+
+        return ParamHeader.read(physical_file(file)).num_frames
+
+
+def _jump_hash(key, num_buckets):
+    # jump consistent hash (Lamping and Veach): changing num_buckets moves as few keys as possible
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xffffffffffffffff
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
@@ -17,7 +17,7 @@ if len(args) < 2:
 
 mlf,trn = args[:2]
 
-tr = HTK_transcription()
+tr = HTK_transcription(compact=True)
 tr.read_mlf(mlf,HTK_transcription.WORD)
 tr.write_trn(trn,options.numspeakerchars)
 
@@ -40,6 +40,8 @@ parser.add_option("-V", "--verbosity", type="int", dest="verbosity", help="Verbo
 parser.add_option("-D", "--no-wav-delete", action="store_false", dest="delete_wav", default=True, help="Do not delete intermediate wav files")
 parser.add_option("-p", "--priority", type="int", dest="priority", help="priority (more is worse)",     default=0)
 parser.add_option('-x', '--exclude-nodes', dest="exclude_nodes", help="Triton nodes to exclude", default="")
+parser.add_option("-N", "--native", action="store_true", dest="native", default=False, help="Compute the features in a local process pool instead of HCopy tasks")
+parser.add_option("-S", "--static-only", action="store_true", dest="static_only", default=False, help="Store only the static coefficients, config.train gets the TARGETKIND that computes the rest on load")
 
 options, configs = parser.parse_args()
 
@@ -133,7 +135,18 @@ if current_step >= options.step:
     logger.info("Start step: %d (%s)" % (current_step, 'HCopying everything'))
     if not os.path.exists('config.hcopy'):
         sys.exit('File config.hcopy missing!')    
-    htk.HCopy(current_step, wav_to_mfc_list, 'config.hcopy')
+    hcopy_config = 'config.hcopy'
+    if options.static_only:
+        from htk2.feature_store import split_target_kind
+        split_target_kind('config.hcopy', 'config.hcopy.static', 'config.train')
+        hcopy_config = 'config.hcopy.static'
+
+    if options.native:
+        from htk2.mfcc import extract_scp, read_pairs
+        num_files, num_frames, seconds = extract_scp(hcopy_config, read_pairs(wav_to_mfc_list))
+        logger.info("%d files, %d frames in %.1f s" % (num_files, num_frames, seconds))
+    else:
+        htk.HCopy(current_step, wav_to_mfc_list, hcopy_config)
 
     os.unlink('raw2wav.scp')
     os.unlink('wav2mfc.scp')
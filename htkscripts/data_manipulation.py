@@ -1,5 +1,6 @@
 #!/usr/bin/env python2.6
 # -*- coding: utf-8 -*-
+import copy
 import glob
 import itertools
 import os
@@ -115,6 +116,13 @@ def import_corpora(corpora, max_speaker_name_width):
                     print >> scp_file, new_link
     
 
+    # corpora stored with create_mfccs.py --static-only bring the TARGETKIND that computes their derivatives
+    train_configs = [location + '/config.train' for location, _, _, _ in corpora if os.path.exists(location + '/config.train')]
+    if len(train_configs) > 0:
+        if len(train_configs) != len(corpora) or any(open(c).read() != open(train_configs[0]).read() for c in train_configs):
+            sys.exit("Corpora with different feature kinds: " + ', '.join(train_configs))
+        shutil.copyfile(train_configs[0], 'corpora/config.train')
+
     if os.path.exists('corpora/words.mlf'):
         os.remove('corpora/words.mlf')
     for location, prefix, word_suffix, speaker_name_width in corpora:
@@ -131,25 +139,22 @@ def import_corpora(corpora, max_speaker_name_width):
 
 def make_model_from_proto(hmm_dir, monophones):
     #Make a monophone model from the proto file generated by HCompV
-    model_def = ""
-    phone_def = ""
-    in_model_def = True
-    
-    for line in open(hmm_dir + '/proto'):
-        if line[0:2] == '~h': in_model_def = False
-        if in_model_def: model_def += line
-        else: phone_def += line
-        
+    from htk2.mmf import MMF
+    proto = MMF.read(hmm_dir + '/proto', hmm_dir + '/vFloors')
+
     #Write the macros file
-    with open(hmm_dir + '/macros', 'w') as macros:
-        print >> macros, model_def
-        for line in open(hmm_dir + '/vFloors'):
-            print >> macros, line
-            
-    #Write the hmmdefs file (replacing for each monophone, proto with the monophone)
-    with open(hmm_dir + '/hmmdefs', 'w') as hmmdefs:
-        for line in open(monophones):
-            print >> hmmdefs, phone_def.replace('proto', line.rstrip())
+    macros = MMF()
+    macros.options = proto.options
+    for name, variance in proto.macros['v'].iteritems():
+        macros.add('v', name, variance)
+    macros.write(hmm_dir + '/macros')
+
+    #Write the hmmdefs file (a copy of proto for each monophone)
+    hmmdefs = MMF()
+    for line in open(monophones):
+        if len(line.strip()) > 0:
+            hmmdefs.add_hmm(line.strip(), proto.hmms['proto'].copy())
+    hmmdefs.write(hmm_dir + '/hmmdefs')
 
 def add_sp_to_phonelist(orig_phone_list, new_phone_list):
     with open(new_phone_list, 'w') as npl:
@@ -158,32 +163,13 @@ def add_sp_to_phonelist(orig_phone_list, new_phone_list):
         print >> npl, 'sp'
     
 def copy_sil_to_sp(source_hmm_dir, target_hmm_dir):
-    in_sil = False
-    in_state3 = False
-    
-    state = ""
-    
-    with open(target_hmm_dir + '/hmmdefs', 'w') as new_hmmdefs:
-        for line in open(source_hmm_dir + '/hmmdefs'):
-            print >> new_hmmdefs, line
-            
-            if line.startswith('~h'):
-                if line.startswith('~h "sil"'): in_sil = True
-                else: in_sil = False
-            elif line.startswith('<STATE>'):
-                if line.startswith('<STATE> 3'): in_state3 = True
-                else: in_state3 = False
-            elif in_sil and in_state3:
-                state += line
-    
-        print >> new_hmmdefs, "~h \"sp\" <BEGINHMM> <NUMSTATES> 3"
-        print >> new_hmmdefs, "<STATE> 2"
-        print >> new_hmmdefs, state
-        print >> new_hmmdefs, """<TRANSP> 3
-         0.000000e+00 5.000000e-01 5.000000e-01
-         0.000000e+00 5.000000e-01 5.000000e-01
-         0.000000e+00 0.000000e+00 0.000000e+00
-        <ENDHMM>"""
+    from htk2 import htk_file_strings
+    from htk2.mmf import HMM, MMF, TransP
+
+    hmmdefs = MMF.read(source_hmm_dir + '/hmmdefs')
+    sp_state = copy.deepcopy(hmmdefs.hmms['sil'].states[3])
+    hmmdefs.add_hmm('sp', HMM(3, {2: sp_state}, TransP(htk_file_strings.TRANSP3)))
+    hmmdefs.write(target_hmm_dir + '/hmmdefs')
     
     shutil.copy(source_hmm_dir + '/macros', target_hmm_dir + '/macros')
 
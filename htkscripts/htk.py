@@ -103,9 +103,16 @@ def lattice_rescore(log_id, lat_dir, lat_dir_out, lm, lm_scale):
     merge_split_dir(lat_dir_out)
     clean_split_file(lattice_scp)
 
-def lattice_decode(log_id ,lat_dir, out_mlf, lm_scale):
+def lattice_decode(log_id ,lat_dir, out_mlf, lm_scale, native=False):
     global num_tasks
 
+    if native:
+        from htk2.lattice import decode_dir
+        failed = decode_dir(lat_dir, out_mlf, float(lm_scale))
+        if len(failed) > 0:
+            raise Exception("Lattice decoding failed for %s" % ', '.join(file for file, _ in failed))
+        return
+
     decode = ["lattice-tool"]
 
     lattice_scp = lat_dir+'/lattices.scp'
@@ -136,6 +136,11 @@ configfile = 'config/config'
 if not os.path.exists(scpfile): sys.exit("Not Found: " + scpfile)
 if not os.path.exists(configfile): sys.exit("Not Found: " + configfile)
 
+if os.path.exists('corpora/config.train'):
+    from htk2.feature_store import apply_train_config
+    apply_train_config(configfile, 'corpora/config.train', 'files/config')
+    configfile = 'files/config'
+
 htk.default_config_file = configfile
 htk.default_HERest_pruning = config.get("DEFAULT", "HERest_pruning").split(None, 2)
 
@@ -399,11 +404,11 @@ for number_sat_round in range(0,4):
 
         logger.info("Start step: %d (%s)" % (current_step, 'Estimate transform'))
 
-        htk.HERest_estimate_transform(current_step, scpfile, source_hmm_dir, source_hmm_dir + '/cmllr', phones_list, transcriptions, None, ['config/config', cmllr_config],
+        htk.HERest_estimate_transform(current_step, scpfile, source_hmm_dir, source_hmm_dir + '/cmllr', phones_list, transcriptions, None, [configfile, cmllr_config],
                                       speaker_name_width, 'cmllr', [(source_hmm_dir + '/cmllr', '')])
 
         logger.info("Start step: %d (%s)" % (current_step, 'Re-estimate model with HERest (SAT)'))
-        htk.HERest(current_step, scpfile, source_hmm_dir, target_hmm_dir, phones_list, transcriptions, True, ['config/config', cmllr_config], source_hmm_dir + '/cmllr',  speaker_name_width)
+        htk.HERest(current_step, scpfile, source_hmm_dir, target_hmm_dir, phones_list, transcriptions, True, [configfile, cmllr_config], source_hmm_dir + '/cmllr',  speaker_name_width)
 
 os.symlink(target_hmm_dir, 'hmm_sat')
 if os.path.exists('hmm_sat'):
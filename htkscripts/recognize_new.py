@@ -66,6 +66,9 @@ class Experiment(object):
         'num_tokens': 32,
         'max_pruning': 40000,
         'recognize_scp': '_',
+        'endpoint': 0,
+        'endpoint_threshold': 0.3,
+        'native_lattice_decode': 0,
     }
 
     launch_options = {}
@@ -103,6 +106,9 @@ class Experiment(object):
         if not self.configuration['recognize_scp'].startswith('_'):
             rscp = self.configuration['recognize_scp']
         data_manipulation.copy_scp_file(rscp, recog_scp)
+        if self.configuration['endpoint']:
+            from htk2.endpoint import endpoint_scp
+            print "Endpointing %s: %s" % (recog_scp, endpoint_scp(recog_scp, recog_scp, self.configuration['endpoint_threshold']))
         #shutil.copyfile(self.model.configuration['recognize_scp'], recog_scp)
         #dict_hvite = self.model.configuration['dict_hvite']
         dict_hdecode = self.model.configuration['dict_hdecode']
@@ -158,7 +164,8 @@ class Experiment(object):
 
 
                 print "Start step: %d (%s)" % (0, 'Decoding lattices with lattice-tool')
-                htk.lattice_decode(log_dir, rescore_lat_dir, rescore_mlf, lm_scale)
+                htk.lattice_decode(log_dir, rescore_lat_dir, rescore_mlf, lm_scale,
+                                   native=bool(self.configuration['native_lattice_decode']))
                 data_manipulation.mlf_to_trn(rescore_mlf, recog_trn, self.model.configuration['speaker_name_width'])
 
             else:
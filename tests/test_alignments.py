@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.alignments import StateAlignments
+
+# as HVite -f -o S writes it: the first state of every model also carries the model name and its score
+MLF = """#!MLF!#
+"*/spa01.rec"
+0 300000 sil[2] -210.50 sil -600.25
+300000 500000 sil[3] -150.00
+500000 600000 sil[4] -80.75
+600000 1200000 a[2] -400.00 a -700.00
+1200000 1300000 a[3] -60.00
+1300000 1500000 a[4] -140.00
+.
+"/data/spb02.rec"
+0 200000 sil[2] -100.00 sil -300.00
+200000 300000 sil[3] -50.00
+300000 400000 sil[4] -50.00
+.
+"""
+
+
+class StateAlignmentsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.mlf_file = os.path.join(self.dir, 'aligned.mlf')
+        with open(self.mlf_file, 'w') as mlf_desc:
+            mlf_desc.write(MLF)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, alignments):
+        self.assertEqual(alignments.utterances, ['spa01', 'spb02'])
+        # state ids are in no particular order
+        self.assertEqual(sorted(alignments.states), ['a[2]', 'a[3]', 'a[4]', 'sil[2]', 'sil[3]', 'sil[4]'])
+        ids = alignments.state_ids
+        self.assertEqual(list(alignments.offsets), [0, 6, 9])
+
+        first = alignments.utterance(0)
+        self.assertEqual(list(first['start']), [0, 300000, 500000, 600000, 1200000, 1300000])
+        self.assertEqual(list(first['end']), [300000, 500000, 600000, 1200000, 1300000, 1500000])
+        self.assertEqual([alignments.states[s] for s in alignments.utterance(1)['state']], ['sil[2]', 'sil[3]', 'sil[4]'])
+
+        occupancy = alignments.state_occupancy()
+        self.assertEqual(dict((s, occupancy[i]) for s, i in ids.iteritems()),
+                         {'sil[2]': 5, 'sil[3]': 3, 'sil[4]': 2, 'a[2]': 6, 'a[3]': 1, 'a[4]': 2})
+        histogram = alignments.duration_histogram(max_duration=4)
+        self.assertEqual(list(histogram[ids['sil[2]']]), [0, 0, 1, 1, 0])
+        self.assertEqual(list(histogram[ids['a[2]']]), [0, 0, 0, 0, 1])
+
+    def test_read_mlf(self):
+        self.check(StateAlignments.read_mlf(self.mlf_file))
+
+    def test_read_mlf_in_small_blocks(self):
+        # blocks end in the middle of lines and utterances
+        default = StateAlignments.block_size
+        try:
+            for block_size in (7, 64, 100):
+                StateAlignments.block_size = block_size
+                self.check(StateAlignments.read_mlf(self.mlf_file))
+        finally:
+            StateAlignments.block_size = default
+
+    def test_save_load(self):
+        file_name = os.path.join(self.dir, 'aligned.npz')
+        StateAlignments.read_mlf(self.mlf_file).save(file_name)
+        self.check(StateAlignments.load(file_name))
+
+    def test_empty(self):
+        with open(self.mlf_file, 'w') as mlf_desc:
+            mlf_desc.write('#!MLF!#\n')
+        alignments = StateAlignments.read_mlf(self.mlf_file)
+        self.assertEqual((alignments.utterances, len(alignments.segments), list(alignments.offsets)), ([], 0, [0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.feature_archive import ArchiveError, pack, unpack, verify
+from htk2.param_file import ParamFile, compress, parse_kind, read_scp_entry, write_compressed, write_param_file
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.rng = np.random.RandomState(3)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, *names):
+        return os.path.join(self.dir, *names)
+
+    def write_list(self, name, lines):
+        with open(self.path(name), 'w') as scp_desc:
+            scp_desc.write('\n'.join(lines) + '\n')
+        return self.path(name)
+
+    def utterances(self, write):
+        os.mkdir(self.path('features'))
+        lines = []
+        for u in xrange(3):
+            for speaker in ('spa', 'spb'):
+                file_name = self.path('features', '{0:>s}{1:02d}.mfc'.format(speaker, u))
+                write(file_name, self.rng.randn(5 + u, 3).astype(np.float32))
+                lines.append(file_name)
+        return self.write_list('list.scp', lines)
+
+    def round_trip(self, scp_file):
+        pack(scp_file, self.path('archives'), self.path('packed.scp'), 3, 2)
+        packed = [line.strip() for line in open(self.path('packed.scp'))]
+        self.assertEqual(sorted(set(line.split('=')[1].split('[')[0] for line in packed)),
+                         [self.path('archives', 'spa.mfc'), self.path('archives', 'spb.mfc')])
+        self.assertEqual(verify(scp_file, self.path('packed.scp'), 0.0, 2), [])
+
+        unpack(self.path('packed.scp'), self.path('unpacked'), self.path('unpacked.scp'), 2)
+        self.assertEqual(verify(scp_file, self.path('unpacked.scp'), 0.0, 2), [])
+        return packed
+
+    def test_float_round_trip(self):
+        scp_file = self.utterances(lambda f, x: write_param_file(f, x, 100000, parse_kind('MFCC')))
+        packed = self.round_trip(scp_file)
+        self.assertTrue(np.array_equal(read_scp_entry(packed[2]), read_scp_entry(open(scp_file).readlines()[2])))
+
+    def test_compressed_payloads_are_copied(self):
+        scale, offset, _ = compress(np.array([[-4.0] * 3, [4.0] * 3]))
+
+        def write(file_name, features):
+            write_compressed(file_name, scale, offset, compress(features)[2], 100000, parse_kind('MFCC_C'))
+
+        scp_file = self.utterances(write)
+        self.round_trip(scp_file)
+
+        archive = ParamFile(self.path('archives', 'spa.mfc'))
+        self.assertTrue(archive.header.compressed)
+        self.assertTrue(np.array_equal(archive.scale, scale))
+        original = ParamFile(self.path('features', 'spa01.mfc'))
+        unpacked = ParamFile(self.path('unpacked', 'spa01.mfc'))
+        self.assertTrue(np.array_equal(archive.data[5:11], original.data))
+        self.assertTrue(np.array_equal(unpacked.data, original.data))
+        self.assertEqual(open(self.path('unpacked', 'spa01.mfc'), 'rb').read(),
+                         open(self.path('features', 'spa01.mfc'), 'rb').read())
+
+    def test_compressed_with_different_scales_are_not_requantized(self):
+        scp_file = self.utterances(lambda f, x: write_param_file(f, x, 100000, parse_kind('MFCC_C')))
+        self.round_trip(scp_file)
+        self.assertFalse(ParamFile(self.path('archives', 'spa.mfc')).header.compressed)
+
+    def test_unpack_refuses_colliding_names(self):
+        file_name = self.path('archive.mfc')
+        write_param_file(file_name, np.zeros((4, 2), dtype=np.float32), 100000, parse_kind('MFCC'))
+        scp_file = self.write_list('packed.scp', ['a/u1.mfc={0:>s}[0,1]'.format(file_name),
+                                                  'b/u1.mfc={0:>s}[2,3]'.format(file_name)])
+        self.assertRaises(ArchiveError, unpack, scp_file, self.path('unpacked'), self.path('unpacked.scp'), 1)
+        self.assertFalse(os.path.exists(self.path('unpacked')))
+
+
+if __name__ == '__main__':
+    unittest.main()
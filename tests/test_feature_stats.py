@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.feature_stats import FeatureStats, NativeHCompV
+from htk2.param_file import parse_kind, write_param_file
+from htk2.tools import htk_config
+
+PROTO = """~o <VecSize> 2 <MFCC>
+~h "proto"
+<BeginHMM>
+<NumStates> 3
+<State> 2
+<Mean> 2
+ 0.0 0.0
+<Variance> 2
+ 1.0 1.0
+<TransP> 3
+ 0.0 1.0 0.0
+ 0.0 0.5 0.5
+ 0.0 0.0 0.0
+<EndHMM>
+"""
+
+
+class NativeHCompVTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(2)
+        self.features = [rng.randn(5 + i, 2).astype(np.float32) * [1.0, 3.0] + [2.0, -1.0] for i in xrange(3)]
+        lines = []
+        for i, features in enumerate(self.features):
+            lines.append(os.path.join(self.dir, 'u{0:d}.mfc'.format(i)))
+            write_param_file(lines[-1], features, 100000, parse_kind('MFCC'))
+        self.scp_file = self.write('list.scp', '\n'.join(lines) + '\n')
+        self.proto_file = self.write('proto', PROTO)
+        self.config = htk_config()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        with open(os.path.join(self.dir, name), 'w') as file_desc:
+            file_desc.write(text)
+        return os.path.join(self.dir, name)
+
+    def test_stats_merge(self):
+        all_frames = np.vstack(self.features).astype(np.float64)
+        stats = FeatureStats(2)
+        for features in self.features:
+            stats.add(features)
+        self.assertTrue(np.allclose(stats.mean, all_frames.mean(axis=0)))
+        self.assertTrue(np.allclose(stats.variance, all_frames.var(axis=0)))
+
+    def test_run(self):
+        native = NativeHCompV(self.config, self.scp_file, self.proto_file, 0.1)
+        self.assertTrue(native.applicable())
+        stats = native.run(2)
+        self.assertEqual(stats.n, sum(len(f) for f in self.features))
+        proto = open(self.proto_file).read()
+        self.assertTrue('<GConst>' in proto)
+        floors = open(os.path.join(self.dir, 'vFloors')).read().split('\n')
+        self.assertTrue(np.allclose([float(x) for x in floors[2].split()], stats.variance * 0.1, rtol=1e-5))
+
+    def test_not_applicable_to_normalised_features(self):
+        self.config.add_config_file(self.write('config', 'TARGETKIND = MFCC\n'))
+        self.assertTrue(NativeHCompV(self.config, self.scp_file, self.proto_file).applicable())
+
+        self.config.add_config_file(self.write('norm.config', 'HPARM: CMEANDIR = {0:>s}\n'.format(self.dir)))
+        self.assertFalse(NativeHCompV(self.config, self.scp_file, self.proto_file).applicable())
+
+        config = htk_config()
+        config.speaker_normalisation = 1
+        self.assertFalse(NativeHCompV(config, self.scp_file, self.proto_file).applicable())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.feature_store import FeatureStoreCompressor, FeatureStoreStripper, apply_train_config, split_target_kind
+from htk2.param_file import ParamFile, convert_features, kind_name, parse_kind, write_param_file
+
+
+class TrainConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def test_static_hcopy_config_and_training_config(self):
+        with open(self.path('config.hcopy'), 'w') as config_desc:
+            config_desc.write("SOURCEFORMAT = WAV\nTARGETKIND = MFCC_0_D_A_Z\nDELTAWINDOW = 3\nNUMCEPS = 12\n")
+        split_target_kind(self.path('config.hcopy'), self.path('config.hcopy.static'), self.path('config.train'))
+        self.assertTrue('TARGETKIND = MFCC_Z_0\n' in open(self.path('config.hcopy.static')).read())
+
+        with open(self.path('config'), 'w') as config_desc:
+            config_desc.write("HPARM: TARGETKIND = MFCC_0_D_A_Z\nDELTAWINDOW = 2\nHMODEL:SAVEBINARY = F\n")
+        apply_train_config(self.path('config'), self.path('config.train'), self.path('config.merged'))
+        self.assertEqual(open(self.path('config.merged')).read().split('\n'),
+                         ["HMODEL:SAVEBINARY = F", "TARGETKIND = MFCC_D_A_Z_0", "DELTAWINDOW = 3", ""])
+
+
+class FeatureStoreTest(unittest.TestCase):
+    kind = parse_kind('MFCC_0_D_A')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        statics = np.cumsum(rng.randn(50, 13), axis=0).astype(np.float32)
+        self.features = convert_features(statics, parse_kind('MFCC_0'), self.kind).astype(np.float32)
+        self.file = os.path.join(self.dir, 'in', 'a.mfc')
+        os.mkdir(os.path.dirname(self.file))
+        write_param_file(self.file, self.features, 100000, self.kind)
+        self.scp = os.path.join(self.dir, 'list.scp')
+        with open(self.scp, 'w') as scp_desc:
+            print >> scp_desc, self.file
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_stripped_features_give_the_derivatives_back(self):
+        store = FeatureStoreStripper([self.scp], os.path.join(self.dir, 'out'))
+        self.assertEqual(store.run(1), [])
+        stored = ParamFile(store.output_file(self.file))
+        self.assertEqual(kind_name(stored.header.parm_kind), 'MFCC_0')
+        self.assertEqual(stored.header.vector_size, 13)
+        np.testing.assert_allclose(convert_features(stored.features(), stored.header.parm_kind, self.kind),
+                                   self.features, atol=1e-4)
+
+    def test_compressed_features_stay_close(self):
+        store = FeatureStoreCompressor([self.scp], os.path.join(self.dir, 'out'))
+        self.assertEqual(store.run(1), [])
+        self.assertTrue(store.errors[self.file] <= store.max_error)
+        self.assertTrue(ParamFile(store.output_file(self.file)).header.compressed)
+
+
+if __name__ == '__main__':
+    unittest.main()
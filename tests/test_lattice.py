@@ -0,0 +1,114 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.lattice import Lattice, decode_dir, unescape
+
+# two words per position, words on the nodes
+NODE_LATTICE = """VERSION=1.0
+UTTERANCE=u1
+lmscale=10.0 wdpenalty=-1.0
+start=0 end=5
+N=6 L=8
+I=0 t=0.00 W=!NULL
+I=1 t=0.20 W=a
+I=2 t=0.20 W=b
+I=3 t=0.50 W="c\\344"
+I=4 t=0.50 W=d
+I=5 t=0.60 W=!NULL
+J=0 S=0 E=1 a=-100.0 l=-1.0
+J=1 S=0 E=2 a=-90.0 l=-2.5
+J=2 S=1 E=3 a=-200.0 l=-1.0
+J=3 S=1 E=4 a=-196.0 l=-1.5
+J=4 S=2 E=3 a=-210.0 l=-0.5
+J=5 S=2 E=4 a=-190.0 l=-2.0
+J=6 S=3 E=5 a=0.0 l=0.0
+J=7 S=4 E=5 a=0.0 l=0.0
+"""
+
+
+class LatticeTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        file_name = os.path.join(self.dir, name)
+        with (gzip.open if name.endswith('.gz') else open)(file_name, 'wb') as lattice_desc:
+            lattice_desc.write(text)
+        return file_name
+
+    def brute_force(self, lattice, lm_scale, word_penalty):
+        # the best of all paths from node 0, enumerated depth first
+        best = None
+        paths = [(0, [])]
+        while len(paths) > 0:
+            node, path = paths.pop()
+            arcs = np.flatnonzero(lattice.arc_start == node)
+            if len(arcs) == 0:
+                score = sum(lattice.acoustic[a] + lm_scale * lattice.language[a] +
+                            word_penalty * (lattice.arc_word[a] >= 0) for a in path)
+                if best is None or score > best[0]:
+                    best = score, [lattice.words[lattice.arc_word[a]] for a in path if lattice.arc_word[a] >= 0]
+            paths.extend((lattice.arc_end[a], path + [a]) for a in arcs)
+        return best[1]
+
+    def test_unescape(self):
+        self.assertEqual(unescape('"c\\344"'), 'c\xe4')
+        self.assertEqual(unescape('it\\\'s'), "it's")
+        self.assertEqual(unescape('plain'), 'plain')
+
+    def test_read(self):
+        lattice = Lattice.read(self.write('u1.lat', NODE_LATTICE))
+        self.assertEqual(lattice.words, ['a', 'b', 'c\xe4', 'd'])
+        self.assertEqual(lattice.num_nodes, 6)
+        self.assertEqual(list(lattice.arc_word), [0, 1, 2, 3, 2, 3, -1, -1])
+        self.assertEqual(list(lattice.levels()), [0, 1, 1, 2, 2, 3])
+
+    def test_words_on_arcs_and_gzip(self):
+        arcs = []
+        node_words = {}
+        for line in NODE_LATTICE.splitlines():
+            if line.startswith('I='):
+                node, word = line.split()[0][2:], line.split()[2][2:]
+                node_words[node] = word
+                arcs.append('I={0:>s}'.format(node))
+            elif line.startswith('J='):
+                end = line.split()[2][2:]
+                arcs.append('{0:>s} W={1:>s}'.format(line, node_words[end]))
+            else:
+                arcs.append(line)
+        on_nodes = Lattice.read(self.write('u1.lat', NODE_LATTICE))
+        on_arcs = Lattice.read(self.write('u2.lat.gz', '\n'.join(arcs) + '\n'))
+        self.assertEqual(on_arcs.words, on_nodes.words)
+        self.assertTrue(np.array_equal(on_arcs.arc_word, on_nodes.arc_word))
+        self.assertEqual(on_arcs.best_path(), on_nodes.best_path())
+
+    def test_best_path(self):
+        lattice = Lattice.read(self.write('u1.lat', NODE_LATTICE))
+        paths = []
+        for lm_scale, word_penalty in ((10.0, -1.0), (0.0, 0.0), (1.0, 0.0), (30.0, 5.0)):
+            paths.append(lattice.best_path(lm_scale, word_penalty))
+            self.assertEqual(paths[-1], self.brute_force(lattice, lm_scale, word_penalty))
+        self.assertEqual(paths, [['a', 'c\xe4'], ['b', 'd'], ['b', 'd'], ['a', 'c\xe4']])
+        self.assertEqual(lattice.best_path(), paths[0])
+
+    def test_decode_dir(self):
+        self.write('u1.lat', NODE_LATTICE)
+        self.write('u2.lat.gz', NODE_LATTICE)
+        self.write('u3.lat', NODE_LATTICE.replace('N=6 L=8', 'N=6 L=9'))
+        out_mlf = os.path.join(self.dir, 'out.mlf')
+        failed = decode_dir(self.dir, out_mlf, 0.0, 0.0, 2)
+
+        self.assertEqual([os.path.basename(f) for f, _ in failed], ['u3.lat'])
+        self.assertEqual(open(out_mlf).read(), '#!MLF!#\n"*/u1.rec"\nb\nd\n.\n"*/u2.rec"\nb\nd\n.\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
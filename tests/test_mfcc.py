@@ -0,0 +1,177 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+import wave
+
+import numpy as np
+
+from htk2.mfcc import MFCCExtractor, read_config
+from htk2.param_file import kind_name, read_features
+
+CONFIG = """SOURCEFORMAT = WAV
+TARGETKIND = MFCC_0
+TARGETRATE = 100000.0
+WINDOWSIZE = 250000.0
+USEHAMMING = T
+PREEMCOEF = 0.97
+NUMCHANS = 26
+CEPLIFTER = 22
+NUMCEPS = 12
+"""
+
+# largest difference to the frame by frame reference, relative to the range of a coefficient; both are computed in
+# double precision, the measured difference is about 1e-13
+TOLERANCE = 1e-9
+
+
+def htk_reference(samples, num_chans=26, num_ceps=12, cep_lifter=22, preem_coef=0.97, source_rate=625.0,
+                  window_size=250000.0, target_rate=100000.0):
+    # MFCC_0 and log energy frame by frame, following HSigP (InitFBank, PreEmphasise, Ham, Wave2FBank, FBank2MFCC,
+    # WeightCepstrum, FBank2C0) loop for loop, with a plain DFT in place of the FFT
+    frame_size = int(window_size / source_rate)
+    frame_rate = int(target_rate / source_rate)
+    fft_n = 2
+    while fft_n < frame_size:
+        fft_n *= 2
+    n_by_2 = fft_n // 2
+    fres = 1.0e7 / (source_rate * fft_n * 700.0)
+
+    def mel(k):
+        return 1127.0 * math.log(1.0 + (k - 1) * fres)
+
+    klo, khi = 2, n_by_2
+    mlo, mhi = 0.0, mel(n_by_2 + 1)
+    max_chan = num_chans + 1
+    cf = [0.0] + [float(chan) / max_chan * (mhi - mlo) + mlo for chan in xrange(1, max_chan + 1)]
+    lo_chan = [0] * (n_by_2 + 1)
+    lo_wt = [0.0] * (n_by_2 + 1)
+    chan = 1
+    for k in xrange(1, n_by_2 + 1):
+        melk = mel(k)
+        if k < klo or k > khi:
+            lo_chan[k] = -1
+            continue
+        while chan <= max_chan and cf[chan] < melk:
+            chan += 1
+        lo_chan[k] = chan - 1
+    for k in xrange(1, n_by_2 + 1):
+        chan = lo_chan[k]
+        if k < klo or k > khi:
+            lo_wt[k] = 0.0
+        elif chan > 0:
+            lo_wt[k] = (cf[chan + 1] - mel(k)) / (cf[chan + 1] - cf[chan])
+        else:
+            lo_wt[k] = (cf[1] - mel(k)) / (cf[1] - mlo)
+
+    dft = np.exp(-2j * math.pi * np.outer(np.arange(frame_size), np.arange(n_by_2)) / fft_n)
+    rows = []
+    for start in xrange(0, len(samples) - frame_size + 1, frame_rate):
+        s = [float(x) for x in samples[start:start + frame_size]]
+        energy = math.log(sum(x * x for x in s))
+        for i in xrange(frame_size - 1, 0, -1):
+            s[i] -= preem_coef * s[i - 1]
+        s[0] *= 1.0 - preem_coef
+        for i in xrange(frame_size):
+            s[i] *= 0.54 - 0.46 * math.cos(2 * math.pi * i / (frame_size - 1))
+        spectrum = np.abs(np.dot(s, dft))
+
+        fbank = [0.0] * (num_chans + 1)
+        for k in xrange(klo, khi + 1):
+            ek = spectrum[k - 1]
+            bin = lo_chan[k]
+            t1 = lo_wt[k] * ek
+            if bin > 0:
+                fbank[bin] += t1
+            if bin < num_chans:
+                fbank[bin + 1] += ek - t1
+        fbank = [math.log(max(x, 1.0)) for x in fbank]
+
+        c = []
+        for j in xrange(1, num_ceps + 1):
+            value = math.sqrt(2.0 / num_chans) * sum(fbank[k] * math.cos(math.pi * j / num_chans * (k - 0.5))
+                                                     for k in xrange(1, num_chans + 1))
+            c.append(value * (1.0 + cep_lifter / 2.0 * math.sin(math.pi * j / cep_lifter)))
+        c.append(math.sqrt(2.0 / num_chans) * sum(fbank[1:]))
+        rows.append(c + [energy])
+    return np.array(rows)
+
+
+class MFCCTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.config_file = self.write('config.hcopy', CONFIG)
+        t = np.arange(8000) / 16000.0
+        rng = np.random.RandomState(5)
+        self.samples = np.round(3000 * np.sin(2 * math.pi * 1000 * t) * np.hanning(len(t)) +
+                                200 * rng.randn(len(t))).astype(np.int16)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        with open(os.path.join(self.dir, name), 'w') as file_desc:
+            file_desc.write(text)
+        return os.path.join(self.dir, name)
+
+    def write_wav(self, name, samples):
+        wav = wave.open(os.path.join(self.dir, name), 'wb')
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(samples.astype('<i2').tostring())
+        wav.close()
+        return os.path.join(self.dir, name)
+
+    def assertClose(self, ours, reference):
+        self.assertEqual(ours.shape, reference.shape)
+        span = np.maximum(reference.max(axis=0) - reference.min(axis=0), 1.0)
+        self.assertTrue(np.all(np.abs(ours - reference) / span < TOLERANCE), np.abs(ours - reference).max())
+
+    def test_matches_the_frame_by_frame_reference(self):
+        reference = htk_reference(self.samples)
+        # (8000 - 400) // 160 + 1 frames, as HTK counts them
+        self.assertEqual(len(reference), 48)
+        extractor = MFCCExtractor(read_config(self.config_file))
+        self.assertClose(extractor.statics(self.samples.astype(np.float64), 625.0), reference[:, :13])
+
+        config = read_config(self.config_file)
+        config.update({'TARGETKIND': 'MFCC_E', 'ENORMALISE': 'F'})
+        statics = MFCCExtractor(config).statics(self.samples.astype(np.float64), 625.0)
+        self.assertClose(statics, np.hstack([reference[:, :12], reference[:, 13:]]))
+
+    def test_known_values(self):
+        extractor = MFCCExtractor(read_config(self.config_file))
+        frame_size, frame_rate, fft_n, window, weights, dct = extractor.analysis(625.0)
+        self.assertEqual((frame_size, frame_rate, fft_n), (400, 160, 512))
+
+        # between the first and the last centre frequency every spectrum bin is split over two channels
+        inner = (weights[:, 0] == 0) & (weights[:, -1] == 0) & (weights.sum(axis=1) > 0)
+        self.assertTrue(np.allclose(weights[inner].sum(axis=1), 1.0))
+        # the channel of a 1 kHz tone (bin 32 of 512 at 16 kHz) has its centre closest to 1 kHz in mel
+        mel = 1127.0 * math.log(1 + 1000 / 700.0)
+        centres = (np.arange(1, 27) / 27.0) * 1127.0 * np.log(1.0 + 256 * 16000 / 512.0 / 700.0)
+        self.assertEqual(np.argmax(weights[32]), np.argmin(np.abs(centres - mel)))
+
+        # a constant log filterbank has no cepstrum apart from C0; silence is all zeros
+        self.assertTrue(np.allclose(np.dot(np.ones(26) * 3.0, dct), 0.0))
+        silence = extractor.statics(np.zeros(1600), 625.0)
+        self.assertEqual(silence.shape, (8, 13))
+        self.assertTrue(np.all(silence == 0.0))
+
+    def test_extract(self):
+        config = CONFIG.replace('TARGETKIND = MFCC_0', 'TARGETKIND = MFCC_0_D_A_Z')
+        extractor = MFCCExtractor(read_config(self.write('config.full', config)))
+        output_file = os.path.join(self.dir, 'u1.mfc')
+        self.assertEqual(extractor.extract(self.write_wav('u1.wav', self.samples), output_file), 48)
+
+        features = read_features(output_file)
+        self.assertEqual(features.shape, (48, 39))
+        self.assertEqual(kind_name(extractor.target_kind), 'MFCC_D_A_Z_0')
+        self.assertTrue(np.allclose(features[:, :13].mean(axis=0), 0.0, atol=1e-4))
+        self.assertTrue(np.allclose(features, extractor.features(os.path.join(self.dir, 'u1.wav')), atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.mmf import MMF, BINARY_SYMBOLS
+
+
+def symbol(name):
+    return ':' + chr(BINARY_SYMBOLS.index(name))
+
+
+def short(n):
+    return struct.pack('>h', n)
+
+
+def floats(values):
+    return struct.pack('>%df' % len(values), *values)
+
+
+class BinaryMMFTest(unittest.TestCase):
+    # a binary MMF as HERest -B writes it: one HMM with one emitting state and the <NULLD> duration option
+    mean = [0.5, -1.25]
+    variance = [2.0, 0.25]
+    transp = [0.0, 1.0, 0.0, 0.0, 0.6, 0.4, 0.0, 0.0, 0.0]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.binary_file = os.path.join(self.dir, 'hmmdefs.bin')
+        with open(self.binary_file, 'wb') as mmf_desc:
+            mmf_desc.write('~o\n' + symbol('STREAMINFO') + short(1) + short(2) + symbol('VECSIZE') + short(2) +
+                           symbol('NULLD') + '<MFCC_0>' + symbol('DIAGC') + '\n')
+            mmf_desc.write('~h "a"\n' + symbol('BEGINHMM') + symbol('NUMSTATES') + short(3) +
+                           symbol('STATE') + short(2) +
+                           symbol('MEAN') + short(2) + floats(self.mean) +
+                           symbol('VARIANCE') + short(2) + floats(self.variance) +
+                           symbol('GCONST') + floats([3.5]) +
+                           symbol('TRANSP') + short(3) + floats(self.transp) +
+                           symbol('ENDHMM') + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_options_use_text_keywords(self):
+        mmf = MMF.read(self.binary_file)
+        self.assertEqual(mmf.options, ['<STREAMINFO>', '1', '2', '<VECSIZE>', '2', '<NULLD>', '<MFCC_0>', '<DIAGC>'])
+
+    def test_binary_to_text_round_trip(self):
+        text_file = os.path.join(self.dir, 'hmmdefs')
+        MMF.read(self.binary_file).write(text_file)
+
+        text = open(text_file).read()
+        self.assertTrue('<NULLD>' in text)
+        self.assertFalse('<NDUR>' in text)
+
+        binary, mmf = MMF.read(self.binary_file), MMF.read(text_file)
+        self.assertEqual(mmf.options, binary.options)
+        state = mmf.resolve(mmf.hmms['a'].states[2])
+        pdf = state.mixtures[0].pdf
+        np.testing.assert_allclose(pdf.mean, self.mean)
+        np.testing.assert_allclose(pdf.variance, self.variance)
+        self.assertAlmostEqual(pdf.gconst, 3.5)
+        np.testing.assert_allclose(mmf.hmms['a'].transp.matrix, np.reshape(self.transp, (3, 3)), rtol=1e-6)
+
+        # and text written from the text model is the same again
+        again = os.path.join(self.dir, 'hmmdefs.again')
+        mmf.write(again)
+        self.assertEqual(open(again).read(), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
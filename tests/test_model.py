@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from htk2.model import MLFFilter, last_transcriptions
+from htk2.units import HTK_transcription, iter_mlf, write_mlf_iter
+
+
+class WordMLFTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def filter(self, mlfs, known_words, scp_ids):
+        results = []
+        for i, transcriptions in enumerate(mlfs):
+            mlf = os.path.join(self.dir, 'words{0:d}.mlf'.format(i))
+            write_mlf_iter(mlf, transcriptions, HTK_transcription.WORD)
+            results.append(MLFFilter(set(known_words), set(scp_ids))((mlf, mlf + '.filtered')))
+        return results
+
+    def test_last_transcription_wins(self):
+        results = self.filter([[('u1', ['a']), ('u2', ['a']), ('u3', ['oov']), ('u4', ['a']), ('u5', ['b'])],
+                               [('u1', ['b']), ('u2', ['oov']), ('u3', ['a']), ('u5', ['a']), ('u5', ['b', 'a'])]],
+                              ['a', 'b'], ['u1', 'u2', 'u3', 'u4', 'u5'])
+        source, missing = last_transcriptions(results)
+
+        self.assertEqual(source, {'u1': (1, 1), 'u3': (1, 1), 'u4': (0, 1), 'u5': (1, 2)})
+        self.assertEqual(missing, {'u2': 'oov'})
+        self.assertEqual(list(iter_mlf(os.path.join(self.dir, 'words1.mlf.filtered'), HTK_transcription.WORD))[-1],
+                         ('u5', ['b', 'a']))
+
+    def test_utterances_outside_the_list_are_dropped(self):
+        results = self.filter([[('u1', ['a']), ('u2', ['a'])]], ['a'], ['u2'])
+        self.assertEqual(last_transcriptions(results), ({'u2': (0, 1)}, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
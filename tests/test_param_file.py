@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.param_file import ParamFile, ParamHeader, convert_features, kind_name, logical_file, parse_kind, \
+    physical_file, read_scp_entry, regression, replace_physical, segment, write_param_file
+
+
+class ParamFileTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.dir, 'u1.mfc')
+        self.features = np.random.RandomState(1).randn(7, 4).astype(np.float32)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_kind_names(self):
+        self.assertEqual(parse_kind('MFCC_0_D_A_Z'), 6 | 0x2000 | 0x100 | 0x200 | 0x800)
+        for name in ('MFCC_0_D_A_Z', 'PLP_E_D_A_T', 'FBANK_C_K', 'USER'):
+            self.assertEqual(parse_kind(kind_name(parse_kind(name))), parse_kind(name))
+
+    def test_round_trip(self):
+        write_param_file(self.file_name, self.features, 100000, 'MFCC_0')
+        param = ParamFile(self.file_name)
+        self.assertEqual((param.header.num_frames, param.header.vector_size, param.header.samp_period),
+                         (7, 4, 100000))
+        self.assertEqual(param.header.kind_name, 'MFCC_0')
+        self.assertTrue(np.array_equal(param.features(), self.features))
+        self.assertEqual(os.path.getsize(self.file_name), ParamHeader.layout.size + self.features.nbytes)
+
+    def test_compressed_round_trip(self):
+        write_param_file(self.file_name, self.features, 100000, 'MFCC_0_C_K')
+        param = ParamFile(self.file_name)
+        self.assertTrue(param.header.compressed)
+        self.assertEqual((param.header.num_samples, param.header.num_frames), (11, 7))
+        self.assertTrue(param.check_crc())
+        span = self.features.max(axis=0) - self.features.min(axis=0)
+        self.assertTrue(np.all(np.abs(param.features() - self.features) <= span / 32767.))
+
+        # the stored values decode to themselves
+        copy = os.path.join(self.dir, 'copy.mfc')
+        write_param_file(copy, param.features(), 100000, 'MFCC_0_C_K')
+        self.assertTrue(np.array_equal(ParamFile(copy).data, param.data))
+
+    def test_scp_entries(self):
+        write_param_file(self.file_name, self.features, 100000, 'MFCC_0')
+        entry = 'spk/u1.mfc={0:>s}[2,4]'.format(self.file_name)
+        self.assertEqual((logical_file(entry), physical_file(entry), segment(entry)),
+                         ('spk/u1.mfc', self.file_name, (2, 4)))
+        self.assertEqual((logical_file(self.file_name), segment(self.file_name)), (self.file_name, None))
+        self.assertEqual(replace_physical(entry, 'other.mfc'), 'spk/u1.mfc=other.mfc[2,4]')
+        self.assertTrue(np.array_equal(read_scp_entry(entry), self.features[2:5]))
+
+    def test_derivatives(self):
+        # the regression of a linear ramp is its slope, except near the repeated edge frames
+        ramp = np.arange(10, dtype=np.float64)[:, None] * [1.0, -2.0]
+        self.assertTrue(np.allclose(regression(ramp)[2:-2], [[1.0, -2.0]]))
+
+        converted = convert_features(self.features, parse_kind('MFCC_0'), parse_kind('MFCC_0_D_A'))
+        self.assertEqual(converted.shape, (7, 12))
+        self.assertTrue(np.allclose(converted[:, :4], self.features))
+        self.assertTrue(np.allclose(converted[:, 4:8], regression(self.features)))
+        self.assertTrue(np.allclose(converted[:, 8:], regression(regression(self.features))))
+        self.assertRaises(ValueError, convert_features, self.features, parse_kind('MFCC_0'), parse_kind('PLP_0_D'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.mmf import MMF
+from htk2.param_file import convert_features, parse_kind, write_param_file
+from htk2.scoring import GMMScorer, model_kind, score_scp
+
+# two HMMs that share their first state through ~s, a three component mixture with a zero weight component and a
+# single Gaussian state without <NUMMIXES>
+MODEL = """~o <STREAMINFO> 1 4 <VECSIZE> 4 <NULLD> <MFCC_0_D> <DIAGC>
+~s "shared"
+<NUMMIXES> 2
+<MIXTURE> 1 0.7
+<MEAN> 4
+ 0.0 0.0 0.0 0.0
+<VARIANCE> 4
+ 1.0 1.0 1.0 1.0
+<MIXTURE> 2 0.3
+<MEAN> 4
+ 1.0 -1.0 0.5 0.0
+<VARIANCE> 4
+ 0.5 2.0 1.0 1.0
+~h "a"
+<BEGINHMM>
+<NUMSTATES> 4
+<STATE> 2
+~s "shared"
+<STATE> 3
+<NUMMIXES> 3
+<MIXTURE> 1 0.4
+<MEAN> 4
+ 2.0 2.0 0.0 0.0
+<VARIANCE> 4
+ 1.0 1.0 0.5 0.5
+<MIXTURE> 2 0.6
+<MEAN> 4
+ -1.0 0.0 0.0 1.0
+<VARIANCE> 4
+ 2.0 1.0 1.0 0.5
+<MIXTURE> 3 0.0
+<MEAN> 4
+ 9.0 9.0 9.0 9.0
+<VARIANCE> 4
+ 1.0 1.0 1.0 1.0
+<TRANSP> 4
+ 0.0 1.0 0.0 0.0
+ 0.0 0.5 0.5 0.0
+ 0.0 0.0 0.5 0.5
+ 0.0 0.0 0.0 0.0
+<ENDHMM>
+~h "b"
+<BEGINHMM>
+<NUMSTATES> 4
+<STATE> 2
+~s "shared"
+<STATE> 3
+<MEAN> 4
+ 0.0 3.0 0.0 0.0
+<VARIANCE> 4
+ 3.0 1.0 1.0 1.0
+<TRANSP> 4
+ 0.0 1.0 0.0 0.0
+ 0.0 0.5 0.5 0.0
+ 0.0 0.0 0.5 0.5
+ 0.0 0.0 0.0 0.0
+<ENDHMM>
+"""
+
+
+def log_gaussian(x, mean, variance):
+    return -0.5 * (len(x) * math.log(2 * math.pi) + sum(math.log(v) for v in variance) +
+                   sum((xi - m) ** 2 / v for xi, m, v in zip(x, mean, variance)))
+
+
+def log_mixture(x, components):
+    # log sum_m w_m N(x) over the components with a weight, term by term
+    return math.log(sum(w * math.exp(log_gaussian(x, mean, variance)) for w, mean, variance in components if w > 0))
+
+
+SHARED = [(0.7, [0.0] * 4, [1.0] * 4), (0.3, [1.0, -1.0, 0.5, 0.0], [0.5, 2.0, 1.0, 1.0])]
+A3 = [(0.4, [2.0, 2.0, 0.0, 0.0], [1.0, 1.0, 0.5, 0.5]), (0.6, [-1.0, 0.0, 0.0, 1.0], [2.0, 1.0, 1.0, 0.5]),
+      (0.0, [9.0] * 4, [1.0] * 4)]
+B3 = [(1.0, [0.0, 3.0, 0.0, 0.0], [3.0, 1.0, 1.0, 1.0])]
+
+
+class GMMScorerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.mmf_file = os.path.join(self.dir, 'hmmdefs')
+        with open(self.mmf_file, 'w') as mmf_desc:
+            mmf_desc.write(MODEL)
+        self.frames = np.random.RandomState(6).randn(20, 4) * 1.5
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_model_kind(self):
+        mmf = MMF.read(self.mmf_file)
+        self.assertEqual(model_kind(mmf), parse_kind('MFCC_0_D'))
+        mmf.options = ['<VECSIZE>', '4', '<NULLD>', '<DIAGC>']
+        self.assertEqual(model_kind(mmf), None)
+
+    def test_states(self):
+        scorer = GMMScorer(MMF.read(self.mmf_file))
+        # the shared state is scored once, under the first HMM that uses it; the zero weight component is left out
+        self.assertEqual(scorer.state_names, ['a.state[2]', 'a.state[3]', 'b.state[3]'])
+        self.assertEqual(scorer.num_gaussians, 5)
+        self.assertEqual(scorer.vector_size, 4)
+
+    def test_state_loglik(self):
+        scorer = GMMScorer(MMF.read(self.mmf_file))
+        expected = np.array([[log_mixture(x, SHARED), log_mixture(x, A3), log_mixture(x, B3)] for x in self.frames])
+        np.testing.assert_allclose(scorer.state_loglik(self.frames), expected, rtol=1e-10)
+        np.testing.assert_allclose(scorer.frame_loglik(self.frames), expected.max(axis=1), rtol=1e-10)
+
+        # the same in blocks of a few frames
+        scorer.max_block_elements = 3 * scorer.num_gaussians
+        np.testing.assert_allclose(scorer.state_loglik(self.frames), expected, rtol=1e-10)
+        self.assertEqual(len(scorer.frame_loglik(np.zeros((0, 4)))), 0)
+
+    def test_score_scp(self):
+        # statics on disk, the derivatives of the model kind computed on load
+        statics = [np.random.RandomState(i).randn(6 + i, 2).astype(np.float32) for i in xrange(3)]
+        lines = []
+        for i, features in enumerate(statics):
+            lines.append(os.path.join(self.dir, 'u{0:d}.mfc'.format(i)))
+            write_param_file(lines[-1], features, 100000, parse_kind('MFCC_0'))
+        write_param_file(os.path.join(self.dir, 'bad.mfc'), np.zeros((5, 3), dtype=np.float32), 100000,
+                         parse_kind('MFCC_0_D'))
+        lines.append(os.path.join(self.dir, 'bad.mfc'))
+        scp_file = os.path.join(self.dir, 'list.scp')
+        with open(scp_file, 'w') as scp_desc:
+            scp_desc.write('\n'.join(lines) + '\n\n')
+
+        results = list(score_scp([self.mmf_file], scp_file, 2, 2))
+        self.assertEqual([entry for entry, _, _, _ in results], lines)
+
+        scorer = GMMScorer(MMF.read(self.mmf_file))
+        for (entry, frames, loglik, error), features in zip(results, statics):
+            self.assertEqual(error, None)
+            self.assertEqual(frames, len(features))
+            full = convert_features(features, parse_kind('MFCC_0'), parse_kind('MFCC_0_D'))
+            self.assertAlmostEqual(loglik, scorer.frame_loglik(full).mean(), places=6)
+
+        entry, frames, loglik, error = results[-1]
+        self.assertTrue(error is not None and math.isnan(loglik))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.param_file import convert_features, parse_kind, write_param_file
+from htk2.speaker_norm import SpeakerNormalisation
+from htk2.tools import htk_config
+
+
+class SpeakerNormalisationTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(4)
+        self.features = {}
+        lines = []
+        for speaker in ('spa', 'spb'):
+            for u in xrange(2):
+                file_name = os.path.join(self.dir, '{0:>s}{1:d}.mfc'.format(speaker, u))
+                self.features.setdefault(speaker, []).append(rng.randn(8, 2).astype(np.float32))
+                write_param_file(file_name, self.features[speaker][-1], 100000, parse_kind('MFCC_0'))
+                lines.append(file_name)
+        self.scp_file = os.path.join(self.dir, 'list.scp')
+        with open(self.scp_file, 'w') as scp_desc:
+            scp_desc.write('\n'.join(lines) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self, file_name):
+        lines = open(file_name).read().split('\n')
+        return lines[0], np.array([float(x) for x in lines[2].split()])
+
+    def run_norm(self, config_files):
+        norm = SpeakerNormalisation(htk_config(config_files), self.scp_file, os.path.join(self.dir, 'norm'), 3, 2)
+        self.assertEqual(norm.run(2), 2)
+        return norm
+
+    def test_stored_kind(self):
+        self.run_norm(None)
+        kind, mean = self.read(os.path.join(self.dir, 'norm', 'cmn', 'spa'))
+        self.assertEqual(kind, '<CEPSNORM> <MFCC_0>')
+        self.assertTrue(np.allclose(mean, np.vstack(self.features['spa']).mean(axis=0)))
+
+    def test_target_kind_of_the_configs(self):
+        config_file = os.path.join(self.dir, 'config')
+        with open(config_file, 'w') as config_desc:
+            config_desc.write('TARGETKIND = MFCC_0_D_A\nDELTAWINDOW = 1\n')
+        norm = self.run_norm([config_file])
+
+        expanded = np.vstack([convert_features(f, parse_kind('MFCC_0'), parse_kind('MFCC_0_D_A'), 1, 2)
+                              for f in self.features['spb']]).astype(np.float64)
+        kind, mean = self.read(os.path.join(self.dir, 'norm', 'cmn', 'spb'))
+        self.assertEqual(parse_kind(kind.split()[1][1:-1]), parse_kind('MFCC_0_D_A'))
+        self.assertTrue(np.allclose(mean, expanded.mean(axis=0)))
+        kind, variance = self.read(os.path.join(self.dir, 'norm', 'cvn', 'spb'))
+        self.assertTrue(np.allclose(variance, expanded.var(axis=0)))
+        self.assertEqual(open(os.path.join(self.dir, 'norm', 'globalvar')).readline().split(), ['<VARSCALE>', '6'])
+        self.assertTrue('VARSCALEDIR' in open(norm.config_file()).read())
+
+
+if __name__ == '__main__':
+    unittest.main()
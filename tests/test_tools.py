@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from htk2.tools import ShardCache, htk_config
+
+
+class HTKConfigTest(unittest.TestCase):
+    def test_add_config_file(self):
+        config = htk_config()
+        config.add_config_file('a')
+        self.assertEqual(config.get_flags(), ['-C', 'a'])
+        config.add_config_file('b')
+        config.add_config_file('a')
+        config.add_config_file('b')
+        self.assertEqual(config.get_flags(), ['-C', 'a', '-C', 'b'])
+
+    def test_add_config_file_leaves_the_callers_list_alone(self):
+        config_files = ['a']
+        config = htk_config(config_files)
+        config.add_config_file('b')
+        self.assertEqual(config_files, ['a'])
+        self.assertEqual(config.config_file, ['a', 'b'])
+
+
+class ShardCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.xforms = self.path('xforms1')
+        self.cmn = self.path('cmn')
+        os.mkdir(self.xforms)
+        os.mkdir(self.cmn)
+        self.write('xforms1/spa.cmllr', 'a')
+        self.write('cmn/spa', 'a')
+        self.write('norm.config', 'CMEANDIR = {0:>s}\n'.format(self.cmn))
+        self.write('u1.mfc', 'a')
+        self.scp_file = self.write('task.scp', 'u1.mfc={0:>s}[0,9]\n'.format(self.path('u1.mfc')))
+        self.command = ['HDecode', '-C', self.path('norm.config'), '-J', self.xforms, 'cmllr']
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def write(self, name, text, mtime=1000):
+        with open(self.path(name), 'w') as file_desc:
+            file_desc.write(text)
+        os.utime(self.path(name), (mtime, mtime))
+        return self.path(name)
+
+    def key(self):
+        return ShardCache(self.path('cache'), self.command)._cache_file(self.scp_file)
+
+    def test_key_follows_inputs(self):
+        key = self.key()
+        self.assertEqual(self.key(), key)
+        for name in ('xforms1/spa.cmllr', 'cmn/spa', 'u1.mfc'):
+            self.write(name, 'b', 2000)
+            self.assertNotEqual(self.key(), key, name)
+            key = self.key()
+
+        # a transform directory recreated at the same path
+        shutil.rmtree(self.xforms)
+        os.mkdir(self.xforms)
+        self.write('xforms1/spb.cmllr', 'b', 2000)
+        self.assertNotEqual(self.key(), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
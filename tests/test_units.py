@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htk2.param_file import write_param_file, parse_kind
+from htk2.units import SCPFile, HTK_dictionary, HTK_transcription, IndexedMLF, iter_mlf, merge_mlfs, write_mlf_iter
+
+
+class SCPSplitTest(unittest.TestCase):
+    speakers = ['spa', 'spb', 'spc', 'spd', 'spe']
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # utterances of the speakers interleaved, as lists often are
+        self.lines = []
+        for u in xrange(4):
+            for s, speaker in enumerate(self.speakers):
+                file_name = os.path.join(self.dir, '{0:>s}{1:02d}.mfc'.format(speaker, u))
+                write_param_file(file_name, np.zeros((10 * (s + 1), 2), dtype=np.float32), 100000,
+                                 parse_kind('MFCC'))
+                self.lines.append(file_name)
+        self.scp_file = os.path.join(self.dir, 'list.scp')
+        with open(self.scp_file, 'w') as scp_desc:
+            scp_desc.write('\n'.join(self.lines) + '\n')
+        self.split_dir = os.path.join(self.dir, 'split')
+        os.mkdir(self.split_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def parts(self, scp_files):
+        return [[line.strip() for line in open(scp_file)] for scp_file in scp_files]
+
+    def test_parts_are_sorted_and_keep_speakers_together(self):
+        for mode in (SCPFile.ROUND_ROBIN, SCPFile.BALANCED, SCPFile.HASHED):
+            parts = self.parts(SCPFile(self.scp_file).split(3, self.split_dir, 3, mode))
+
+            self.assertEqual(sorted(sum(parts, [])), sorted(self.lines))
+            for part in parts:
+                self.assertEqual(part, sorted(part))
+            part_of_speaker = {}
+            for i, part in enumerate(parts):
+                for line in part:
+                    self.assertEqual(part_of_speaker.setdefault(os.path.basename(line)[:3], i), i)
+
+    def test_keep_order(self):
+        for mode in (SCPFile.ROUND_ROBIN, SCPFile.BALANCED, SCPFile.HASHED):
+            for part in self.parts(SCPFile(self.scp_file).split(3, self.split_dir, -1, mode, keep_order=True)):
+                self.assertEqual(part, [line for line in self.lines if line in part])
+
+    def test_balanced_parts_have_similar_lengths(self):
+        parts = self.parts(SCPFile(self.scp_file).split(2, self.split_dir, 3, SCPFile.BALANCED))
+        frames = [sum(10 * (self.speakers.index(os.path.basename(l)[:3]) + 1) for l in part) for part in parts]
+        self.assertTrue(abs(frames[0] - frames[1]) <= 4 * 10)
+
+    def test_read_num_samples(self):
+        self.assertEqual(SCPFile.read_num_samples(self.lines[1]), 20)
+        self.assertEqual(SCPFile.read_num_samples('u1=' + self.lines[1] + '[3,7]'), 5)
+        write_param_file(self.lines[1], np.zeros((20, 2), dtype=np.float32), 100000, parse_kind('MFCC_C'))
+        self.assertEqual(SCPFile.read_num_samples(self.lines[1]), 20)
+
+    def test_blank_lines(self):
+        with open(self.scp_file, 'a') as scp_desc:
+            scp_desc.write('\n  \n')
+        for mode in (SCPFile.ROUND_ROBIN, SCPFile.BALANCED, SCPFile.HASHED):
+            self.assertEqual(sorted(sum(self.parts(SCPFile(self.scp_file).split(3, self.split_dir, 3, mode)), [])),
+                             sorted(self.lines))
+
+    def test_num_samples_follow_regenerated_features(self):
+        scp = SCPFile(self.scp_file)
+        self.assertEqual(scp.num_samples()[self.lines[0]], 10)
+        write_param_file(self.lines[0], np.zeros((35, 2), dtype=np.float32), 100000, parse_kind('MFCC'))
+        os.utime(self.lines[0], (1, 1))
+        self.assertEqual(scp.num_samples()[self.lines[0]], 35)
+        self.assertEqual(scp.num_samples(), SCPFile(self.scp_file).num_samples())
+
+
+class MLFTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write_read_round_trip(self):
+        transcriptions = [('utt1', ['a', 'b']), ('utt2', []), ('utt3', ['c'])]
+        mlf = os.path.join(self.dir, 'words.mlf')
+        write_mlf_iter(mlf, transcriptions, HTK_transcription.WORD)
+        self.assertEqual(list(iter_mlf(mlf, HTK_transcription.WORD)), transcriptions)
+
+    def test_index_follows_rewrites_within_a_second(self):
+        mlf = os.path.join(self.dir, 'words.mlf')
+        write_mlf_iter(mlf, [('utt1', ['a', 'b']), ('utt2', ['c'])], HTK_transcription.WORD)
+        os.utime(mlf, (1000.25, 1000.25))
+        self.assertEqual(IndexedMLF(mlf, HTK_transcription.WORD)['utt2'], ['c'])
+
+        # same size, same second
+        write_mlf_iter(mlf, [('utt1', ['a']), ('utt2', ['ddd'])], HTK_transcription.WORD)
+        os.utime(mlf, (1000.5, 1000.5))
+        self.assertEqual(dict(IndexedMLF(mlf, HTK_transcription.WORD)), {'utt1': ['a'], 'utt2': ['ddd']})
+        self.assertEqual([f for f in os.listdir(self.dir) if f.endswith('.tmp')], [])
+
+    def test_merge_in_scp_order(self):
+        names = ['s{0:02d}'.format(i) for i in xrange(9)]
+        scp_file = os.path.join(self.dir, 'list.scp')
+        with open(scp_file, 'w') as scp_desc:
+            for name in names:
+                print >> scp_desc, '{0:>s}.mfc=/data/{0:>s}.mfc[0,9]'.format(name)
+
+        # three task outputs, each in scp order, one utterance lost
+        mlf_files = []
+        for t in xrange(3):
+            mlf_files.append(os.path.join(self.dir, 'task{0:d}.mlf'.format(t)))
+            write_mlf_iter(mlf_files[-1], [(name, [name.upper()]) for name in names[t::3] if name != 's04'],
+                           HTK_transcription.WORD)
+
+        merged = os.path.join(self.dir, 'merged.mlf')
+        missing = merge_mlfs(scp_file, mlf_files, merged, HTK_transcription.WORD,
+                             manifest_file=merged + '.manifest')
+        self.assertEqual(missing, ['s04'])
+        self.assertEqual(list(iter_mlf(merged, HTK_transcription.WORD)),
+                         [(name, [name.upper()]) for name in names if name != 's04'])
+        self.assertTrue('s04 missing' in open(merged + '.manifest').read())
+
+
+class DictionaryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dict_file = os.path.join(self.dir, 'dict')
+        with open(self.dict_file, 'w') as dict_desc:
+            dict_desc.write('<unk>\tspn\nkissa\tk i s s a sp\nkoira\tk o i r a\n')
+        self.dictionary = HTK_dictionary()
+        self.dictionary.use_cache = False
+        self.dictionary.read_dict(self.dict_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_filter_sentences_agrees_with_word_in_dict(self):
+        self.assertTrue(self.dictionary.word_in_dict('<unk>'))
+        sentences = ['<s> kissa <unk> </s>', '<s> koira hevonen </s>']
+        self.assertEqual(list(self.dictionary.filter_sentences(sentences)),
+                         [(sentences[0], ()), (sentences[1], ['hevonen'])])
+
+    def test_index(self):
+        index = self.dictionary.get_index()
+        self.assertEqual(index.words, ['<unk>', 'kissa', 'koira'])
+        self.assertEqual(index.words_with_prefix('ko'), ['koira'])
+        self.assertEqual(index.words_with_phone('spn'), ['<unk>'])
+        self.assertEqual(index.phones, frozenset(['spn', 'k', 'i', 's', 'a', 'o', 'r']))
+
+        # write_dict adds the sentence boundaries to the dictionary itself
+        self.dictionary.write_dict(os.path.join(self.dir, 'out.dict'))
+        self.dictionary._index = None
+        self.assertEqual(self.dictionary.get_index().phones, index.phones)
+
+
+if __name__ == '__main__':
+    unittest.main()